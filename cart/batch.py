@@ -0,0 +1,121 @@
+"""
+Batch cart mutations.
+
+A list of add/update/remove operations is validated against product and
+variant stock, then applied to the cart's locked lines in one transaction
+with a bulk delete, bulk_create and bulk_update. Restoring a saved cart or
+reordering a past order costs the same handful of queries whatever its size.
+"""
+from django.db import IntegrityError
+from django.utils import timezone
+
+from core.transactions import write_transaction
+from products.models import Product, ProductVariant
+
+from .models import CartItem
+from .summary import get_cart_summary, invalidate_cart_summary
+
+
+class CartBatchError(Exception):
+    """Raised with {operation index: message} when operations are invalid"""
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def apply_cart_operations(cart, operations):
+    """
+    Apply validated operations (see CartBatchSerializer) to a cart and return
+    its new CartSummary. Nothing is written if any operation is invalid.
+    """
+    product_ids = {operation["product_id"] for operation in operations}
+    variant_ids = {
+        operation["variant_id"]
+        for operation in operations
+        if operation.get("variant_id")
+    }
+    products = Product.objects.in_bulk(product_ids)
+    variants = ProductVariant.objects.in_bulk(variant_ids) if variant_ids else {}
+    try:
+        write_cart_operations(cart, operations, products, variants)
+    except IntegrityError:
+        # A line was added (by CartItem.objects.add_quantity) after the cart's
+        # lines were locked; the second attempt reads and locks it too
+        write_cart_operations(cart, operations, products, variants)
+
+    invalidate_cart_summary(cart.id)
+    return get_cart_summary(cart.id)
+
+
+def write_cart_operations(cart, operations, products, variants):
+    # The lines are read under lock, so concurrent changes to the cart wait
+    # for the new quantities instead of being overwritten by them
+    with write_transaction(CartItem):
+        lines = {
+            (item.product_id, item.variant_id): item
+            for item in CartItem.objects.filter(cart=cart).select_for_update()
+        }
+
+        quantities = {key: item.quantity for key, item in lines.items()}
+        errors = {}
+        for index, operation in enumerate(operations):
+            action = operation["action"]
+            product = products.get(operation["product_id"])
+            variant = variants.get(operation.get("variant_id"))
+            if product is None:
+                errors[index] = "Product not found"
+                continue
+            if operation.get("variant_id"):
+                if variant is None or variant.product_id != product.id:
+                    errors[index] = "Invalid variant for this product"
+                    continue
+            elif product.has_variants and action != "remove":
+                errors[index] = "Please select product variant"
+                continue
+
+            key = (product.id, variant.id if variant else None)
+            if action == "add" and operation["quantity"] < 1:
+                errors[index] = "Quantity must be at least 1"
+                continue
+            if action == "add":
+                quantities[key] = quantities.get(key, 0) + operation["quantity"]
+            elif action == "update":
+                quantities[key] = operation["quantity"]
+            else:
+                quantities[key] = 0
+
+            stock = variant.stock if variant else product.stock
+            if quantities[key] > stock:
+                errors[index] = f"Only {stock} items available in stock"
+
+        if errors:
+            raise CartBatchError(errors)
+
+        now = timezone.now()
+        created, updated, removed = [], [], []
+        for (product_id, variant_id), quantity in quantities.items():
+            item = lines.get((product_id, variant_id))
+            if item is None:
+                if quantity > 0:
+                    created.append(
+                        CartItem(
+                            cart=cart,
+                            product=products[product_id],
+                            variant=variants.get(variant_id),
+                            quantity=quantity,
+                        )
+                    )
+            elif quantity < 1:
+                removed.append(item.id)
+            elif quantity != item.quantity:
+                item.quantity = quantity
+                item.modified = now
+                updated.append(item)
+
+        if removed:
+            CartItem.objects.filter(id__in=removed).delete()
+        if created:
+            CartItem.objects.bulk_create(created)
+        if updated:
+            CartItem.objects.bulk_update(updated, ["quantity", "modified"])
@@ -0,0 +1,50 @@
+# Generated by Django 5.0.8 on 2026-10-18 17:26
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_lines(apps, schema_editor):
+    """Fold duplicate cart lines into the oldest one before adding the constraints"""
+    CartItem = apps.get_model("cart", "CartItem")
+    duplicates = (
+        CartItem.objects.values("cart_id", "product_id", "variant_id")
+        .annotate(lines=Count("id"), keep=Min("id"), total=Sum("quantity"))
+        .filter(lines__gt=1)
+    )
+    for line in duplicates:
+        group = CartItem.objects.filter(
+            cart_id=line["cart_id"],
+            product_id=line["product_id"],
+            variant_id=line["variant_id"],
+        )
+        group.filter(id=line["keep"]).update(quantity=line["total"])
+        group.exclude(id=line["keep"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cart", "0002_cartitem_variant"),
+        ("products", "0004_product_search_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="cartitem",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("variant__isnull", False)),
+                fields=("cart", "product", "variant"),
+                name="unique_cart_product_variant",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="cartitem",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("variant__isnull", True)),
+                fields=("cart", "product"),
+                name="unique_cart_product_without_variant",
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.8 on 2026-10-18 20:36
+
+from django.db import migrations, models
+
+
+def delete_empty_lines(apps, schema_editor):
+    """Drop lines left at quantity 0 before adding the constraint"""
+    CartItem = apps.get_model("cart", "CartItem")
+    CartItem.objects.filter(quantity__lt=1).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cart", "0003_cartitem_unique_line"),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_empty_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="cartitem",
+            constraint=models.CheckConstraint(
+                check=models.Q(("quantity__gte", 1)),
+                name="cart_item_quantity_positive",
+            ),
+        ),
+    ]
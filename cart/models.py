@@ -1,27 +1,57 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Q
+from django.utils import timezone
 from products.models import Product, ProductVariant
 from decimal import Decimal
 from django.core.exceptions import ValidationError
 from django_extensions.db.models import TimeStampedModel
 
 from users.models import User
+from .summary import get_cart_summary
 
 
 class Cart(TimeStampedModel):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
 
+    @property
+    def summary(self):
+        """Cached item count and subtotal, see cart.summary"""
+        return get_cart_summary(self.pk)
+
     @property
     def total_items(self):
-        return sum(item.quantity for item in self.items.all())
+        return self.summary.total_items
 
     @property
     def total_price(self):
-        return sum(item.subtotal for item in self.items.all())
+        return self.summary.total_price
 
     def get_total(self):
         return self.total_price + Decimal("50.00")
 
 
+class CartItemQuerySet(models.QuerySet):
+    def add_quantity(self, cart, product, variant, quantity):
+        """
+        Add quantity of a product (variant) to a cart as one increment, or an
+        insert when the line doesn't exist yet. Safe under concurrent adds: a
+        racing insert hits the unique constraint and falls back to the update.
+        """
+        if quantity < 1:
+            raise ValueError("Quantity must be at least 1")
+        line = self.filter(cart=cart, product=product, variant=variant)
+        increment = {"quantity": F("quantity") + quantity, "modified": timezone.now()}
+        if line.update(**increment):
+            return
+        try:
+            with transaction.atomic():
+                self.create(
+                    cart=cart, product=product, variant=variant, quantity=quantity
+                )
+        except IntegrityError:
+            line.update(**increment)
+
+
 class CartItem(TimeStampedModel):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name="items")
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -33,6 +63,8 @@ class CartItem(TimeStampedModel):
     )
     quantity = models.PositiveIntegerField(default=1)
 
+    objects = CartItemQuerySet.as_manager()
+
     @property
     def total_price(self):
         # Use variant price if variant exists, otherwise use product price
@@ -46,6 +78,24 @@ class CartItem(TimeStampedModel):
     class Meta:
         verbose_name = "Cart Item"
         verbose_name_plural = "Cart Items"
+        constraints = [
+            # One line per product (variant) in a cart; NULL variants need
+            # their own constraint since NULLs never compare equal
+            models.UniqueConstraint(
+                fields=["cart", "product", "variant"],
+                condition=Q(variant__isnull=False),
+                name="unique_cart_product_variant",
+            ),
+            models.UniqueConstraint(
+                fields=["cart", "product"],
+                condition=Q(variant__isnull=True),
+                name="unique_cart_product_without_variant",
+            ),
+            # Emptied lines are deleted, not kept at 0
+            models.CheckConstraint(
+                check=Q(quantity__gte=1), name="cart_item_quantity_positive"
+            ),
+        ]
 
     @property
     def subtotal(self):
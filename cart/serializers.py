@@ -37,3 +37,14 @@ class CartSerializer(serializers.ModelSerializer):
     class Meta:
         model = Cart
         fields = ["id", "items", "total_items", "total_price"]
+
+
+class CartOperationSerializer(serializers.Serializer):
+    action = serializers.ChoiceField(choices=["add", "update", "remove"])
+    product_id = serializers.IntegerField()
+    variant_id = serializers.IntegerField(required=False, allow_null=True)
+    quantity = serializers.IntegerField(min_value=0, default=1)
+
+
+class CartBatchSerializer(serializers.Serializer):
+    operations = CartOperationSerializer(many=True, allow_empty=False, max_length=100)
@@ -0,0 +1,26 @@
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from products.models import Product, ProductVariant
+
+from .models import CartItem
+from .summary import invalidate_cart_summary
+
+
+@receiver(post_save, sender=Product)
+@receiver(pre_delete, sender=Product)
+def invalidate_product_carts(sender, instance, raw=False, **kwargs):
+    # Cart subtotals use the current selling price
+    if raw:
+        return
+    cart_ids = CartItem.objects.filter(product=instance).values_list("cart_id", flat=True)
+    invalidate_cart_summary(*set(cart_ids))
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(pre_delete, sender=ProductVariant)
+def invalidate_variant_carts(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    cart_ids = CartItem.objects.filter(variant=instance).values_list("cart_id", flat=True)
+    invalidate_cart_summary(*set(cart_ids))
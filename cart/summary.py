@@ -0,0 +1,78 @@
+"""
+Cached cart totals.
+
+Each cart's item count and subtotal (in paise/cents) are kept as two cache
+counters. The cart views adjust them in place on every mutation with
+cache.incr, so reading the totals never re-scans the cart. On a miss both are
+aggregated in a single query. Price changes and product/variant deletes drop
+the cached totals of the affected carts.
+
+The counters live in the default cache, which may be local to each worker
+process, so a worker can miss another worker's adjustments. They therefore
+expire after CART_SUMMARY_TIMEOUT seconds and are only used for display in
+the cart badge and cart page; checkout and payment amounts always come from
+compute_cart_summary.
+"""
+from collections import namedtuple
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import DecimalField, F, Sum
+from django.db.models.functions import Coalesce
+
+CART_SUMMARY_TIMEOUT = getattr(settings, "CART_SUMMARY_TIMEOUT", 300)
+
+CartSummary = namedtuple("CartSummary", ["total_items", "total_price"])
+
+
+def summary_keys(cart_id):
+    return f"cart:{cart_id}:items", f"cart:{cart_id}:cents"
+
+
+def to_cents(amount):
+    return int(Decimal(amount) * 100)
+
+
+def compute_cart_summary(cart_id):
+    """Aggregate item count and subtotal of a cart in the database"""
+    from .models import CartItem
+
+    unit_price = Coalesce("variant__selling_price", "product__selling_price")
+    totals = CartItem.objects.filter(cart_id=cart_id).aggregate(
+        total_items=Coalesce(Sum("quantity"), 0),
+        total_price=Coalesce(
+            Sum(F("quantity") * unit_price, output_field=DecimalField()),
+            Decimal("0"),
+            output_field=DecimalField(),
+        ),
+    )
+    return totals["total_items"], to_cents(totals["total_price"])
+
+
+def get_cart_summary(cart_id):
+    items_key, cents_key = summary_keys(cart_id)
+    cached = cache.get_many([items_key, cents_key])
+    if len(cached) == 2:
+        items, cents = cached[items_key], cached[cents_key]
+    else:
+        items, cents = compute_cart_summary(cart_id)
+        cache.set_many(
+            {items_key: items, cents_key: cents}, timeout=CART_SUMMARY_TIMEOUT
+        )
+    return CartSummary(items, Decimal(cents).scaleb(-2))
+
+
+def adjust_cart_summary(cart_id, quantity, amount):
+    """Apply a change of quantity items worth amount to the cached totals"""
+    items_key, cents_key = summary_keys(cart_id)
+    try:
+        cache.incr(items_key, quantity)
+        cache.incr(cents_key, to_cents(amount))
+    except ValueError:
+        # Not cached (or evicted); recomputed on the next read
+        invalidate_cart_summary(cart_id)
+
+
+def invalidate_cart_summary(*cart_ids):
+    cache.delete_many([key for cart_id in cart_ids for key in summary_keys(cart_id)])
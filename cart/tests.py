@@ -1,3 +1,421 @@
-from django.test import TestCase
+import threading
+import time
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from categories.models import Category
+from inventory.models import StockReservation
+from orders.models import Order
+from products.models import Product, ProductVariant
+from users.models import Address, User
+
+from .batch import apply_cart_operations
+from .models import Cart, CartItem
+from .summary import CART_SUMMARY_TIMEOUT, compute_cart_summary
+from .views import CheckoutView, PaymentIntentView
+
+
+class CartSummaryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="shopper@example.com", password="password"
+        )
+        self.client.force_login(self.user)
+        category = Category.objects.create(
+            name="Fruits", slug="fruits", image="categories/fruits.png"
+        )
+        self.product = Product.objects.create(
+            name="Apple",
+            description="Description",
+            original_price="12.00",
+            selling_price="10.50",
+            category=category,
+            stock=50,
+            stock_unit=Product.StockUnitChoices.UNIT,
+            sku="SKU-APPLE",
+            slug="apple",
+        )
+        self.cart = Cart.objects.create(user=self.user)
+
+    def add(self, quantity):
+        return self.client.post(
+            reverse("cart:add"),
+            {"product_id": self.product.id, "quantity": quantity},
+        )
+
+    def test_mutations_adjust_cached_totals(self):
+        self.assertEqual(self.cart.summary, (0, Decimal("0")))
+
+        response = self.add(2)
+        self.assertEqual(response.json()["cart_total"], 2)
+        self.add(3)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cart.summary, (5, Decimal("52.50")))
+
+        item = CartItem.objects.get(cart=self.cart)
+        response = self.client.post(
+            reverse("cart:update"), {"item_id": item.id, "quantity": 1}
+        )
+        self.assertEqual(response.json()["cart_total_price"], 10.5)
+        self.assertEqual(self.cart.summary, (1, Decimal("10.50")))
+        self.assertEqual(compute_cart_summary(self.cart.id), (1, 1050))
+
+        self.client.post(reverse("cart:update"), {"item_id": item.id, "quantity": 0})
+        self.assertEqual(self.cart.summary, (0, Decimal("0")))
+
+    def test_price_change_invalidates_totals(self):
+        self.add(2)
+        self.assertEqual(self.cart.total_price, Decimal("21.00"))
+
+        self.product.selling_price = Decimal("9.00")
+        self.product.save()
+        self.assertEqual(self.cart.total_price, Decimal("18.00"))
+
+    def test_lines_are_never_left_empty(self):
+        for quantity in (0, -2, "two"):
+            response = self.add(quantity)
+            self.assertEqual(response.status_code, 400, quantity)
+        self.assertFalse(CartItem.objects.exists())
+        with self.assertRaisesMessage(ValueError, "Quantity must be at least 1"):
+            CartItem.objects.add_quantity(self.cart, self.product, None, 0)
+
+        # Updating to 0 removes the line
+        self.add(2)
+        item = CartItem.objects.get()
+        self.client.post(reverse("cart:update"), {"item_id": item.id, "quantity": 0})
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_variant_lines_update_at_the_variant_price(self):
+        variant = ProductVariant.objects.create(
+            product=self.product,
+            size="L",
+            stock=5,
+            stock_unit=Product.StockUnitChoices.UNIT,
+            selling_price="12.00",
+            sku="SKU-APPLE-L",
+        )
+        item = CartItem.objects.create(
+            cart=self.cart, product=self.product, variant=variant, quantity=1
+        )
+        self.assertEqual(self.cart.total_price, Decimal("12.00"))
+
+        response = self.client.post(
+            reverse("cart:update"), {"item_id": item.id, "quantity": 3}
+        )
+        self.assertEqual(response.json()["cart_total_price"], 36.0)
+        self.assertEqual(compute_cart_summary(self.cart.id), (3, 3600))
+
+    def test_cached_totals_expire(self):
+        self.add(2)
+        # A write this worker's cache never heard of
+        CartItem.objects.update(quantity=4)
+        self.assertEqual(self.cart.total_items, 2)
+
+        later = time.time() + CART_SUMMARY_TIMEOUT + 1
+        with mock.patch("time.time", return_value=later):
+            self.assertEqual(self.cart.summary, (4, Decimal("42.00")))
+
+
+class AddToCartConcurrencyTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="shopper@example.com", password="password"
+        )
+        category = Category.objects.create(
+            name="Fruits", slug="fruits", image="categories/fruits.png"
+        )
+        self.product = Product.objects.create(
+            name="Apple",
+            description="Description",
+            original_price="12.00",
+            selling_price="10.00",
+            category=category,
+            stock=50,
+            stock_unit=Product.StockUnitChoices.UNIT,
+            sku="SKU-APPLE",
+            slug="apple",
+        )
+        self.cart = Cart.objects.create(user=self.user)
+
+    def test_add_is_a_single_statement_for_existing_lines(self):
+        CartItem.objects.add_quantity(self.cart, self.product, None, 1)
+        with self.assertNumQueries(1):
+            CartItem.objects.add_quantity(self.cart, self.product, None, 2)
+        self.assertEqual(CartItem.objects.get().quantity, 3)
+
+    def add_in_parallel(self, *adders, adds=5):
+        """Run each adder adds times, all in their own thread at once"""
+        barrier = threading.Barrier(len(adders))
+        errors = []
+
+        def add(adder):
+            try:
+                barrier.wait()
+                for _ in range(adds):
+                    adder()
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=add, args=[adder]) for adder in adders]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(CartItem.objects.count(), 1)
+        self.assertEqual(CartItem.objects.get().quantity, len(adders) * adds)
+
+    def add_one(self):
+        CartItem.objects.add_quantity(self.cart, self.product, None, 1)
+
+    def add_one_in_a_batch(self):
+        apply_cart_operations(
+            self.cart,
+            [{"action": "add", "product_id": self.product.id, "quantity": 1}],
+        )
+
+    def test_parallel_adds_do_not_lose_updates(self):
+        self.add_in_parallel(*[self.add_one] * 8)
+
+    def test_batches_and_adds_in_parallel_do_not_lose_updates(self):
+        self.add_in_parallel(*[self.add_one, self.add_one_in_a_batch] * 4)
+
+
+class CartBatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="shopper@example.com", password="password"
+        )
+        self.client.force_login(self.user)
+        self.category = Category.objects.create(
+            name="Fruits", slug="fruits", image="categories/fruits.png"
+        )
+        self.products = [self.create_product(index) for index in range(12)]
+        self.cart = Cart.objects.create(user=self.user)
+
+    def create_product(self, index):
+        return Product.objects.create(
+            name=f"Product {index}",
+            description="Description",
+            original_price="12.00",
+            selling_price="10.00",
+            category=self.category,
+            stock=5,
+            stock_unit=Product.StockUnitChoices.UNIT,
+            sku=f"SKU-{index}",
+            slug=f"product-{index}",
+        )
+
+    def batch(self, *operations):
+        return self.client.post(
+            reverse("cart:batch"),
+            {
+                "operations": [
+                    {"action": action, "product_id": product_id, "quantity": quantity}
+                    for action, product_id, quantity in operations
+                ]
+            },
+            content_type="application/json",
+        )
+
+    def cart_lines(self):
+        return dict(CartItem.objects.values_list("product_id", "quantity"))
+
+    def test_batch_applies_operations_with_constant_queries(self):
+        first, second, third = self.products[:3]
+        CartItem.objects.create(cart=self.cart, product=first, quantity=1)
+        CartItem.objects.create(cart=self.cart, product=second, quantity=1)
+
+        # session, user, cart, products, then inside a savepoint the locked
+        # lines and one delete/insert/update, and the summary aggregate
+        with self.assertNumQueries(11):
+            response = self.batch(
+                ("add", first.id, 2), ("remove", second.id, 0), ("add", third.id, 1)
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["cart_total"], 4)
+        self.assertEqual(self.cart_lines(), {first.id: 3, third.id: 1})
+
+        # Reordering a dozen lines costs the same as a few
+        with self.assertNumQueries(11):
+            response = self.batch(
+                ("update", first.id, 0),
+                *[("add", product.id, 2) for product in self.products[1:]],
+            )
+        self.assertEqual(response.json()["cart_total"], 23)
+        self.assertEqual(self.cart.summary, (23, Decimal("230.00")))
+
+    def test_invalid_operations_leave_cart_untouched(self):
+        first, second = self.products[:2]
+        CartItem.objects.create(cart=self.cart, product=first, quantity=4)
+
+        response = self.batch(
+            ("add", second.id, 1), ("add", first.id, 2), ("add", 999999, 1)
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json()["errors"],
+            {"1": "Only 5 items available in stock", "2": "Product not found"},
+        )
+        self.assertEqual(self.cart_lines(), {first.id: 4})
+
+        response = self.batch(("explode", first.id, 1))
+        self.assertEqual(response.status_code, 400)
+
+        response = self.batch(("add", second.id, 0))
+        self.assertEqual(
+            response.json()["errors"], {"0": "Quantity must be at least 1"}
+        )
+        self.assertEqual(self.cart_lines(), {first.id: 4})
+
+
+class PaidCheckoutTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="shopper@example.com", password="password"
+        )
+        self.client.force_login(self.user)
+        self.address = Address.objects.create(
+            user=self.user, phone="1", address="Street", city="Pune", postal_code="1"
+        )
+        category = Category.objects.create(
+            name="Fruits", slug="fruits", image="categories/fruits.png"
+        )
+        self.product = Product.objects.create(
+            name="Apple",
+            description="Description",
+            original_price="12.00",
+            selling_price="10.00",
+            category=category,
+            stock=3,
+            stock_unit=Product.StockUnitChoices.UNIT,
+            sku="SKU-APPLE",
+            slug="apple",
+        )
+        self.cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=3)
+
+    def post(self, name, data):
+        return self.client.post(
+            reverse(name), data, content_type="application/json"
+        )
+
+    def test_checkout_shows_the_cart_lines_not_the_cached_totals(self):
+        self.assertEqual(self.cart.total_price, Decimal("30.00"))
+        Product.objects.update(selling_price="11.00")
+
+        with mock.patch.object(CheckoutView, "get_stripe_context", return_value={}):
+            response = self.client.get(reverse("cart:checkout"))
+
+        self.assertEqual(response.context["total_items"], 3)
+        self.assertEqual(response.context["total_price"], Decimal("33.00"))
+        self.assertEqual(response.context["grand_total"], Decimal("83.00"))
+
+    def test_stripe_charges_the_cart_lines_not_the_cached_totals(self):
+        self.assertEqual(self.cart.total_price, Decimal("30.00"))
+        # The price went up behind the cache's back
+        Product.objects.update(selling_price="11.00")
+
+        with mock.patch.object(PaymentIntentView, "setup_stripe"), mock.patch(
+            "cart.views.stripe"
+        ) as stripe:
+            stripe.PaymentIntent.create.return_value = mock.Mock(
+                status="requires_action", client_secret="secret", id="pi_1"
+            )
+            response = self.post(
+                "cart:create_payment_intent",
+                {"payment_method_id": "pm_1", "shipping_address": self.address.id},
+            )
+
+        self.assertTrue(response.json()["requires_action"])
+        self.assertEqual(stripe.PaymentIntent.create.call_args.kwargs["amount"], 8300)
+
+    def test_stripe_payment_is_refunded_when_stock_ran_out(self):
+        def charge(**kwargs):
+            # The hold expires and the stock sells while the customer pays
+            StockReservation.objects.update(expires_at=timezone.now())
+            call_command("release_expired_reservations", stdout=StringIO())
+            Product.objects.update(stock=0)
+            return mock.Mock(status="succeeded", id="pi_1")
+
+        with mock.patch.object(PaymentIntentView, "setup_stripe"), mock.patch(
+            "cart.views.stripe"
+        ) as stripe:
+            stripe.PaymentIntent.create.side_effect = charge
+            response = self.post(
+                "cart:create_payment_intent",
+                {"payment_method_id": "pm_1", "shipping_address": self.address.id},
+            )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("refunded", response.json()["error"])
+        stripe.Refund.create.assert_called_once_with(payment_intent="pi_1")
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.cart.items.count(), 1)
+
+    def test_razorpay_payment_is_refunded_when_stock_ran_out(self):
+        with mock.patch("cart.views.client") as client:
+            client.order.create.return_value = {"id": "order_1"}
+            response = self.post("cart:create_razorpay_order", {})
+            self.assertEqual(response.status_code, 200)
+            self.product.refresh_from_db()
+            self.assertEqual(self.product.stock, 0)
+
+            StockReservation.objects.update(expires_at=timezone.now())
+            call_command("release_expired_reservations", stdout=StringIO())
+            Product.objects.update(stock=0)
+            response = self.post(
+                "cart:verify_razorpay_payment",
+                {
+                    "order_id": "order_1",
+                    "payment_id": "pay_1",
+                    "signature": "signature",
+                    "shipping_address": self.address.id,
+                },
+            )
+
+        self.assertEqual(response.status_code, 400)
+        client.payment.refund.assert_called_once_with("pay_1")
+        self.assertFalse(Order.objects.exists())
+
+    def test_razorpay_orders_are_placed_under_their_receipt(self):
+        with mock.patch("cart.views.client") as client:
+            client.order.create.return_value = {"id": "order_1"}
+            self.post("cart:create_razorpay_order", {"receipt": "ORD-1"})
+            receipt = client.order.create.call_args.args[0]["receipt"]
+            response = self.post(
+                "cart:verify_razorpay_payment",
+                {
+                    "order_id": "order_1",
+                    "payment_id": "pay_1",
+                    "signature": "signature",
+                    "shipping_address": self.address.id,
+                },
+            )
+
+        self.assertTrue(response.json()["success"])
+        self.assertRegex(receipt, r"^ORD-\d{8}-\d{7}$")
+        self.assertEqual(Order.objects.get().order_number, receipt)
+
+    def test_nothing_is_charged_for_a_cart_out_of_stock(self):
+        Product.objects.update(stock=2)
+        with mock.patch("cart.views.client") as client:
+            response = self.post("cart:create_razorpay_order", {})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Only 2 of Apple", response.json()["error"])
+        client.order.create.assert_not_called()
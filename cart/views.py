@@ -9,25 +9,38 @@ from django.shortcuts import redirect
 from django.views.generic import TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
-from django.utils.crypto import get_random_string
 from django.urls import reverse
-from django.utils import timezone
-import random
 from decimal import Decimal
 import stripe
 from django.http import JsonResponse
+from django.db import IntegrityError
 from django.views.decorators.http import require_POST
 from djstripe.models import APIKey
 import json
 import logging
-from products.models import Product, ProductVariant
-from orders.models import Order, OrderItem
+from products.models import Product, ProductVariant, primary_image_prefetch
+from orders.models import Order
+from orders.numbers import generate_order_number
+from orders.placement import (
+    DELIVERY_CHARGE,
+    EmptyCartError,
+    OrderPlacementError,
+    place_order_from_cart,
+)
+from inventory.stock import OutOfStockError, reserve_cart
 from users.models import Address
 
 from core.mixins import StripeMixin, RazorpayMixin
 
+from .batch import CartBatchError, apply_cart_operations
 from .models import Cart, CartItem
-from .serializers import CartSerializer
+from .serializers import CartBatchSerializer, CartSerializer
+from .summary import (
+    adjust_cart_summary,
+    compute_cart_summary,
+    get_cart_summary,
+    to_cents,
+)
 
 from django.views import View
 from django.utils.decorators import method_decorator
@@ -47,7 +60,9 @@ class CartListAPIView(ListAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        cart = Cart.objects.filter(user=self.request.user)
+        cart = Cart.objects.filter(user=self.request.user).prefetch_related(
+            "items__variant", primary_image_prefetch("items__product__images")
+        )
         if not cart.exists():
             # Create an empty cart if none exists
             cart = Cart.objects.create(user=self.request.user)
@@ -60,13 +75,21 @@ class CartListAPIView(ListAPIView):
 def add_to_cart(request):
     product_id = request.data.get("product_id")
     variant_id = request.data.get("variant_id")
-    quantity = int(request.data.get("quantity", 1))
+    try:
+        quantity = int(request.data.get("quantity", 1))
+    except (TypeError, ValueError):
+        quantity = 0
 
     if not product_id:
         return Response(
             {"error": "Product ID is required"}, 
             status=status.HTTP_400_BAD_REQUEST
         )
+    if quantity < 1:
+        return Response(
+            {"error": "Quantity must be at least 1"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
 
     product = get_object_or_404(Product, id=product_id)
     
@@ -102,26 +125,14 @@ def add_to_cart(request):
     # Get or create cart
     cart, _ = Cart.objects.get_or_create(user=request.user)
 
-    # Check if item already exists
-    try:
-        cart_item = CartItem.objects.get(
-            cart=cart, 
-            product=product,
-            variant=variant
-        )
-        cart_item.quantity += quantity
-        cart_item.save()
-    except CartItem.DoesNotExist:
-        cart_item = CartItem.objects.create(
-            cart=cart,
-            product=product,
-            variant=variant,
-            quantity=quantity
-        )
+    CartItem.objects.add_quantity(cart, product, variant, quantity)
+
+    unit_price = variant.selling_price if variant else product.selling_price
+    adjust_cart_summary(cart.id, quantity, unit_price * quantity)
 
     return Response({
         "message": "Item added to cart",
-        "cart_total": cart.total_items
+        "cart_total": get_cart_summary(cart.id).total_items
     })
 
 
@@ -129,7 +140,13 @@ def add_to_cart(request):
 @permission_classes([IsAuthenticated])
 def update_cart_item(request):
     item_id = request.data.get("item_id")
-    quantity = int(request.data.get("quantity", 1))
+    try:
+        quantity = int(request.data.get("quantity", 1))
+    except (TypeError, ValueError):
+        return Response(
+            {"error": "Quantity must be a whole number"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
 
     if not item_id:
         return Response(
@@ -137,39 +154,78 @@ def update_cart_item(request):
         )
 
     try:
-        cart_item = CartItem.objects.select_related("product").get(
+        cart_item = CartItem.objects.select_related("product", "variant").get(
             id=item_id, cart__user=request.user
         )
     except CartItem.DoesNotExist:
         return Response({"error": "Item not found"}, status=status.HTTP_404_NOT_FOUND)
 
     # Validate stock
-    if quantity > cart_item.product.stock:
+    stock = (cart_item.variant or cart_item.product).stock
+    if quantity > stock:
         return Response(
-            {"error": f"Only {cart_item.product.stock} items available in stock"},
+            {"error": f"Only {stock} items available in stock"},
             status=status.HTTP_400_BAD_REQUEST,
         )
 
+    unit_price = (cart_item.variant or cart_item.product).selling_price
+
+    # A quantity below 1 removes the line; no line is ever stored empty
     if quantity < 1:
         cart_item.delete()
-        cart = Cart.objects.get(user=request.user)
+        adjust_cart_summary(
+            cart_item.cart_id, -cart_item.quantity, -cart_item.subtotal
+        )
+        summary = get_cart_summary(cart_item.cart_id)
         return Response(
             {
                 "message": "Item removed from cart",
-                "cart_total": cart.total_items,
-                "cart_total_price": cart.total_price,
+                "cart_total": summary.total_items,
+                "cart_total_price": summary.total_price,
             }
         )
 
+    delta = quantity - cart_item.quantity
     cart_item.quantity = quantity
     cart_item.save()
+    adjust_cart_summary(cart_item.cart_id, delta, unit_price * delta)
+    summary = get_cart_summary(cart_item.cart_id)
 
     return Response(
         {
             "message": "Quantity updated",
             "item_subtotal": cart_item.subtotal,
-            "cart_total": cart_item.cart.total_items,
-            "cart_total_price": cart_item.cart.total_price,
+            "cart_total": summary.total_items,
+            "cart_total_price": summary.total_price,
+        }
+    )
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def batch_update_cart(request):
+    """Apply many add/update/remove operations to the cart in one request"""
+    serializer = CartBatchSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    cart, _ = Cart.objects.get_or_create(user=request.user)
+    try:
+        summary = apply_cart_operations(cart, serializer.validated_data["operations"])
+    except CartBatchError as error:
+        return Response({"errors": error.errors}, status=status.HTTP_400_BAD_REQUEST)
+    except IntegrityError:
+        # A concurrent request added one of the lines first
+        return Response(
+            {"error": "Cart was modified, please retry"},
+            status=status.HTTP_409_CONFLICT,
+        )
+
+    return Response(
+        {
+            "message": "Cart updated",
+            "cart_total": summary.total_items,
+            "cart_total_price": summary.total_price,
         }
     )
 
@@ -186,13 +242,17 @@ class CheckoutView(LoginRequiredMixin, TemplateView, StripeMixin, RazorpayMixin)
             context.update(stripe_context)
             context.update(razorpay_context)
 
-            cart = Cart.objects.prefetch_related("items__product").get(
-                user=self.request.user
-            )
+            cart = Cart.objects.prefetch_related(
+                "items__product", "items__variant"
+            ).get(user=self.request.user)
 
-            if cart.items.count() == 0:
+            # Totals straight from the database: the cached summary may be
+            # stale in this worker
+            total_items, cents = compute_cart_summary(cart.id)
+            if not total_items:
                 context["cart"] = None
                 return context
+            total_price = Decimal(cents).scaleb(-2)
 
             # Get user's addresses
             addresses = self.request.user.addresses.all()
@@ -201,10 +261,10 @@ class CheckoutView(LoginRequiredMixin, TemplateView, StripeMixin, RazorpayMixin)
                 {
                     "cart": cart,
                     "cart_items": cart.items.all(),
-                    "total_price": cart.total_price,
-                    "total_items": cart.total_items,
-                    "delivery_charge": 50,
-                    "grand_total": cart.total_price + 50,
+                    "total_price": total_price,
+                    "total_items": total_items,
+                    "delivery_charge": DELIVERY_CHARGE,
+                    "grand_total": total_price + DELIVERY_CHARGE,
                     "addresses": addresses,
                 }
             )
@@ -226,26 +286,12 @@ class CheckoutView(LoginRequiredMixin, TemplateView, StripeMixin, RazorpayMixin)
         return super().get(request, *args, **kwargs)
 
 
-def generate_order_number():
-    """Generate a unique order number"""
-    return get_random_string(length=10, allowed_chars="0123456789")
-
-
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def place_order(request):
     """Handle order placement"""
-    print("Place order")
     try:
         cart = request.user.cart
-        if not cart.items.exists():
-            return Response(
-                {
-                    "error": "Your cart is empty!",
-                    "redirect_url": reverse("cart:cart_detail"),
-                },
-                status=status.HTTP_400_BAD_REQUEST,
-            )
 
         # Get selected addresses
         shipping_address_id = request.data.get("shipping_address")
@@ -272,30 +318,16 @@ def place_order(request):
                 id=billing_address_id, user=request.user
             )
 
-        # Create order
-        order = Order.objects.create(
+        # Create order from the cart and clear it
+        order = place_order_from_cart(
+            cart,
             user=request.user,
             shipping_address=shipping_address,
             billing_address=billing_address,
-            order_number=f"ORD-{timezone.now().strftime('%Y%m%d')}-{random.randint(1000, 9999)}",
-            total_amount=cart.get_total(),
-            delivery_charge=Decimal("50.00"),
             payment_method=request.data.get("payment_method", "cash_on_delivery"),
             notes=request.data.get("notes", ""),
         )
 
-        # Create order items
-        for cart_item in cart.items.all():
-            OrderItem.objects.create(
-                order=order,
-                product=cart_item.product,
-                quantity=cart_item.quantity,
-                price=cart_item.product.selling_price,
-            )
-
-        # Clear cart
-        cart.items.all().delete()
-
         messages.success(request, "Order placed successfully!")
         return Response(
             {
@@ -309,11 +341,26 @@ def place_order(request):
         return Response(
             {"error": "Invalid address selected"}, status=status.HTTP_400_BAD_REQUEST
         )
+    except (OrderPlacementError, OutOfStockError) as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         traceback.print_exc()
         return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
+def place_paid_order(cart, refund, **order_fields):
+    """
+    place_order_from_cart for a payment that has been captured. Stock is held
+    before payment, but a hold can expire; when the stock is gone by now the
+    payment is refunded (with refund()) rather than kept without an order.
+    """
+    try:
+        return place_order_from_cart(cart, **order_fields)
+    except OutOfStockError as e:
+        refund()
+        raise OutOfStockError(f"{e}. Your payment has been refunded.") from e
+
+
 class PaymentIntentView(View, StripeMixin):
     @method_decorator(require_POST)
     def dispatch(self, request, *args, **kwargs):
@@ -328,9 +375,16 @@ class PaymentIntentView(View, StripeMixin):
             payment_method_id = data.get("payment_method_id")
             shipping_address_id = data.get("shipping_address")
 
-            # Calculate amount
             cart = request.user.cart
-            amount = int((cart.total_price + 50) * 100)  # Convert to cents
+            # Hold the stock before charging, so a paid cart can be ordered
+            reserve_cart(cart)
+
+            # Charge what the order will be placed for: the cart lines in the
+            # database, not the cached totals
+            total_items, cents = compute_cart_summary(cart.id)
+            if not total_items:
+                raise EmptyCartError()
+            amount = cents + to_cents(DELIVERY_CHARGE)
 
             # Create PaymentIntent
             intent = stripe.PaymentIntent.create(
@@ -342,10 +396,9 @@ class PaymentIntentView(View, StripeMixin):
                 return_url=request.build_absolute_uri(reverse("cart:confirm_payment")),
             )
 
-            # Store shipping address in session for later use
-            request.session["shipping_address_id"] = shipping_address_id
-
             if intent.status == "requires_action":
+                # Store shipping address in session for PaymentConfirmView
+                request.session["shipping_address_id"] = shipping_address_id
                 return JsonResponse(
                     {
                         "requires_action": True,
@@ -355,7 +408,7 @@ class PaymentIntentView(View, StripeMixin):
                 )
             elif intent.status == "succeeded":
                 # Create order and clear cart
-                order = self.create_order(request, intent.id)
+                order = self.create_order(request, intent.id, shipping_address_id)
                 return JsonResponse(
                     {
                         "success": True,
@@ -367,38 +420,22 @@ class PaymentIntentView(View, StripeMixin):
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=400)
 
-    def create_order(self, request, payment_intent_id):
-        shipping_address_id = request.session.get("shipping_address_id")
+    def create_order(self, request, payment_intent_id, shipping_address_id=None):
+        if shipping_address_id is None:
+            shipping_address_id = request.session.get("shipping_address_id")
         shipping_address = Address.objects.get(id=shipping_address_id)
 
-        cart = request.user.cart
-        total_amount = cart.total_price
-        delivery_charge = Decimal("50.00")
-
-        order = Order.objects.create(
+        order = place_paid_order(
+            request.user.cart,
+            lambda: stripe.Refund.create(payment_intent=payment_intent_id),
             user=request.user,
             shipping_address=shipping_address,
             billing_address=shipping_address,
             payment_method="stripe",
             payment_intent_id=payment_intent_id,
-            total_amount=total_amount,
-            delivery_charge=delivery_charge,
             status="processing",
-            order_number=f"ORD-{timezone.now().strftime('%Y%m%d')}-{random.randint(1000, 9999)}",
         )
 
-        # Create order items
-        for cart_item in cart.items.all():
-            OrderItem.objects.create(
-                order=order,
-                product=cart_item.product,
-                quantity=cart_item.quantity,
-                price=cart_item.product.selling_price,
-            )
-
-        # Clear cart
-        cart.items.all().delete()
-
         # Clear session
         if "shipping_address_id" in request.session:
             del request.session["shipping_address_id"]
@@ -439,6 +476,10 @@ class PaymentConfirmView(View, StripeMixin):
     
 client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
 
+def razorpay_receipt_key(razorpay_order_id):
+    return f"razorpay_receipt:{razorpay_order_id}"
+
+
 def create_razorpay_order(request):
     print("Create order")
     try:
@@ -447,15 +488,20 @@ def create_razorpay_order(request):
         print(options)
         amount = int(float(options.get("amount", 0))) * 100
         currency = options.get("currency", "INR")
-        receipt = data.get("receipt", f"ORD-{timezone.now().strftime('%Y%m%d')}-{random.randint(1000, 9999)}")
+        # The receipt is the number the order will be placed under
+        receipt = generate_order_number()
         notes = data.get("notes", {})
 
+        # Hold the stock before the customer pays, so a paid cart can be ordered
+        reserve_cart(request.user.cart)
+
         order = client.order.create({
             "amount": amount,
             "currency": currency,
             "receipt": receipt,
             "notes": notes
         })
+        request.session[razorpay_receipt_key(order["id"])] = receipt
         print (order)
         return JsonResponse(order)
     except Exception as e:
@@ -477,16 +523,28 @@ def verify_razorpay_payment(request):
         })
 
         # Create order in your system
-        order = Order.objects.create(
+        shipping_address = Address.objects.get(
+            id=data.get("shipping_address"), user=request.user
+        )
+        # Placed under the receipt number the Razorpay order was created with
+        receipt = request.session.pop(razorpay_receipt_key(order_id), None)
+        order_number = {"order_number": receipt} if receipt else {}
+        order = place_paid_order(
+            request.user.cart,
+            lambda: client.payment.refund(payment_id),
             user=request.user,
+            shipping_address=shipping_address,
+            billing_address=shipping_address,
             payment_method='razorpay',
-            payment_id=data['payment_id'],
-            # Add other necessary fields
+            payment_intent_id=payment_id,
+            payment_status=Order.PaymentStatusChoices.PAID,
+            status=Order.StatusChoices.PROCESSING,
+            **order_number,
         )
-        
+
         return JsonResponse({
             'success': True,
-            'redirect_url': reverse('orders:order_success', args=[order.id])
+            'redirect_url': reverse('orders:success', args=[order.order_number])
         })
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=400)
\ No newline at end of file
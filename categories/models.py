@@ -3,6 +3,7 @@ from time import strftime
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+from core.site_data import bump_site_data_version
 from utils.common_utils import generate_file_name
 
 
@@ -33,3 +34,13 @@ class Category(models.Model):
 
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Categories are cached for every page by core.context_processors
+        bump_site_data_version()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        bump_site_data_version()
+        return result
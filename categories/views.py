@@ -1,10 +1,15 @@
 from django.shortcuts import render
 from django.views.generic import ListView
 
+from core.page_cache import CachedPageMixin
+
 from .models import Category
 
 
-class CategoriesListView(ListView):
+class CategoriesListView(CachedPageMixin, ListView):
     model = Category
     template_name = 'categories.html'
     context_object_name = 'categories'
+
+    def get_page_tags(self, context):
+        return ["categories", *(f"category:{c.pk}" for c in context["object_list"])]
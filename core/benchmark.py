@@ -0,0 +1,515 @@
+"""
+End-to-end HTTP benchmarks of the storefront and checkout flows.
+
+The benchmark drives the real URL routes, either in-process through Django's
+test client or over HTTP against a threaded WSGI server running in the same
+process, and reports latency percentiles, queries per request and throughput
+for every route. It runs against whatever is in the database, normally a
+dataset from the generate_dataset command, and it writes to it: wishlists
+and carts change and orders are placed, so point it at a disposable copy.
+
+Stripe and Razorpay are replaced by local fakes for the duration of a run.
+Results are plain JSON so runs of different commits can be compared with
+compare_results().
+"""
+import json
+import statistics
+import subprocess
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from itertools import count
+from unittest import mock
+
+import requests
+import stripe
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.servers.basehttp import ThreadedWSGIServer
+from django.db import connection
+from django.test import Client
+from django.test.testcases import QuietWSGIRequestHandler
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from cart.models import CartItem
+from categories.models import Category
+from orders.models import Order
+from products.models import Product, ProductVariant
+from users.models import User
+
+from .mixins import StripeMixin
+from .query_budget import count_queries
+
+# Must be in ALLOWED_HOSTS
+BENCHMARK_HOST = "127.0.0.1"
+QUERY_COUNT_HEADER = "X-Query-Count"
+SAMPLE_SIZE = 50
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+class FakePaymentIntent:
+    ids = count(1)
+
+    def __init__(self, id, status="succeeded"):
+        self.id = id
+        self.status = status
+        self.client_secret = f"{id}_secret"
+
+    @classmethod
+    def create(cls, **kwargs):
+        return cls(f"pi_fake_{next(cls.ids)}")
+
+    @classmethod
+    def retrieve(cls, id, **kwargs):
+        return cls(id)
+
+
+class FakeRazorpayClient:
+    """The parts of razorpay.Client used by the cart views"""
+
+    def __init__(self):
+        self.ids = count(1)
+        self.order = self
+        self.utility = self
+
+    def create(self, data):
+        return {"id": f"order_fake_{next(self.ids)}", "status": "created", **data}
+
+    def verify_payment_signature(self, params):
+        return True
+
+
+@contextmanager
+def fake_payment_providers():
+    with ExitStack() as stack:
+        stack.enter_context(
+            mock.patch.object(
+                StripeMixin,
+                "setup_stripe",
+                return_value=("pk_test_fake", "sk_test_fake"),
+            )
+        )
+        for name in ("create", "retrieve"):
+            stack.enter_context(
+                mock.patch.object(
+                    stripe.PaymentIntent, name, getattr(FakePaymentIntent, name)
+                )
+            )
+        stack.enter_context(mock.patch("cart.views.client", FakeRazorpayClient()))
+        yield
+
+
+class ClientTransport:
+    """Requests through Django's test client, in this thread"""
+
+    def __init__(self, user=None):
+        self.client = Client(HTTP_HOST=BENCHMARK_HOST)
+        if user is not None:
+            self.client.force_login(user)
+
+    def request(self, method, path, data=None):
+        with count_queries() as counter:
+            start = time.perf_counter()
+            if method == "GET":
+                response = self.client.get(path, data)
+            else:
+                response = self.client.post(
+                    path, json.dumps(data), content_type="application/json"
+                )
+            elapsed = time.perf_counter() - start
+        return response.status_code, elapsed, counter.queries
+
+
+class HTTPTransport:
+    """Requests over HTTP to a BenchmarkServer"""
+
+    def __init__(self, base_url, user=None):
+        self.base_url = base_url
+        self.session = requests.Session()
+        if user is not None:
+            client = Client()
+            client.force_login(user)
+            name = settings.SESSION_COOKIE_NAME
+            self.session.cookies.set(name, client.cookies[name].value)
+        token = get_random_string(32)
+        self.session.cookies.set(settings.CSRF_COOKIE_NAME, token)
+        self.session.headers["X-CSRFToken"] = token
+
+    def request(self, method, path, data=None):
+        url = self.base_url + path
+        start = time.perf_counter()
+        if method == "GET":
+            response = self.session.get(url, params=data)
+        else:
+            response = self.session.post(url, json=data)
+        elapsed = time.perf_counter() - start
+        return (
+            response.status_code,
+            elapsed,
+            int(response.headers.get(QUERY_COUNT_HEADER, 0)),
+        )
+
+
+def counting_application(application):
+    """Wrap a WSGI application to report its query count in a header"""
+
+    def wrapped(environ, start_response):
+        started = []
+
+        def deferred_start_response(status, headers, exc_info=None):
+            started[:] = [status, headers, exc_info]
+
+        with count_queries() as counter:
+            response = application(environ, deferred_start_response)
+        status, headers, exc_info = started
+        start_response(
+            status, [*headers, (QUERY_COUNT_HEADER, str(counter.queries))], exc_info
+        )
+        return response
+
+    return wrapped
+
+
+class BenchmarkServer:
+    """A threaded WSGI server for this project on a free local port"""
+
+    def __enter__(self):
+        self.server = ThreadedWSGIServer(
+            (BENCHMARK_HOST, 0), QuietWSGIRequestHandler, allow_reuse_address=False
+        )
+        self.server.set_app(counting_application(WSGIHandler()))
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return f"http://{BENCHMARK_HOST}:{self.server.server_address[1]}"
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+class Catalogue:
+    """The slice of the dataset the routes are exercised with"""
+
+    def __init__(self, size=SAMPLE_SIZE):
+        self.products = list(
+            Product.objects.filter(is_active=True, has_variants=False, stock__gt=0)
+            .select_related("category")
+            .order_by("-stock", "id")[:size]
+        )
+        if not self.products:
+            raise BenchmarkError(
+                "No products in stock, fill the database with generate_dataset"
+            )
+        self.categories = sorted(
+            {
+                product.category.slug
+                for product in self.products
+                if product.category.status == Category.StatusChoices.ACTIVE
+            }
+        )
+        self.variants = list(
+            ProductVariant.objects.order_by("id").values_list(
+                "product_id", "size", "color"
+            )[:size]
+        )
+        self.search_terms = sorted(
+            {product.name.split()[0] for product in self.products}
+        )
+
+    def cycle(self, items, n):
+        return items[n % len(items)]
+
+
+class Shopper:
+    """A signed in customer plus an anonymous visitor, one per worker"""
+
+    def __init__(self, index, user, transport):
+        self.index = index
+        self.user = user
+        self.address_id = user.addresses.values_list("id", flat=True).first()
+        self.customer = transport(user)
+        self.guest = transport(None)
+        self.cart_item_id = None
+
+
+class Route:
+    def __init__(self, name, build, signed_in=False, setup=None, prepare=None):
+        self.name = name
+        # build(shopper, n) -> (method, path, data) of the timed request
+        self.build = build
+        self.signed_in = signed_in
+        # setup(shopper) runs once before the route, in the main thread
+        self.setup = setup
+        # prepare(shopper, n) -> untimed requests to make before request n
+        self.prepare = prepare
+
+
+def storefront_routes(catalogue):
+    """The benchmarked routes, in the order a shopper goes through them"""
+
+    def get(name, *args, data=None):
+        return "GET", reverse(name, args=args), data
+
+    def post(name, data):
+        return "POST", reverse(name), data
+
+    def product(shopper, n):
+        return catalogue.cycle(catalogue.products, shopper.index + n)
+
+    def category(shopper, n):
+        return get("products:category", catalogue.cycle(catalogue.categories, n))
+
+    def variant(shopper, n):
+        product_id, size, color = catalogue.cycle(catalogue.variants, n)
+        data = {"product_id": product_id, "size": size, "color": color}
+        return get("products:get_variant_details", data=data)
+
+    def find_cart_line(shopper):
+        shopper.cart_item_id = (
+            CartItem.objects.filter(cart__user=shopper.user)
+            .values_list("id", flat=True)
+            .first()
+        )
+
+    def add_to_cart(shopper, n):
+        return post("cart:add", {"product_id": product(shopper, n).id, "quantity": 1})
+
+    routes = [
+        Route("core:home", lambda shopper, n: get("core:home")),
+        Route(
+            "products:detail",
+            lambda shopper, n: get("products:detail", product(shopper, n).slug),
+        ),
+        Route(
+            "core:search",
+            lambda shopper, n: get(
+                "core:search",
+                data={"query": catalogue.cycle(catalogue.search_terms, n)},
+            ),
+        ),
+        Route(
+            "users:toggle_wishlist",
+            lambda shopper, n: post(
+                "users:toggle_wishlist", {"product_id": product(shopper, n).id}
+            ),
+            signed_in=True,
+        ),
+        Route(
+            "cart:add",
+            lambda shopper, n: add_to_cart(shopper, 0),
+            signed_in=True,
+        ),
+        Route(
+            "cart:update",
+            lambda shopper, n: post(
+                "cart:update", {"item_id": shopper.cart_item_id, "quantity": 1 + n % 3}
+            ),
+            signed_in=True,
+            setup=find_cart_line,
+        ),
+        Route(
+            "cart:checkout",
+            lambda shopper, n: get("cart:checkout"),
+            signed_in=True,
+        ),
+        Route(
+            "cart:place_order",
+            lambda shopper, n: post(
+                "cart:place_order",
+                {
+                    "shipping_address": shopper.address_id,
+                    "payment_method": "cash_on_delivery",
+                },
+            ),
+            signed_in=True,
+            prepare=lambda shopper, n: [add_to_cart(shopper, n)],
+        ),
+    ]
+    if catalogue.variants:
+        routes.insert(2, Route("products:get_variant_details", variant))
+    if catalogue.categories:
+        routes.insert(1, Route("products:category", category))
+    return routes
+
+
+def percentile(quantiles, latencies, p):
+    return quantiles[p - 1] if quantiles else latencies[0]
+
+
+def summarize(samples, elapsed):
+    """Latency percentiles (ms), queries and throughput of (status, s, queries)"""
+    latencies = sorted(seconds * 1000 for _, seconds, _ in samples)
+    quantiles = (
+        statistics.quantiles(latencies, n=100, method="inclusive")
+        if len(latencies) > 1
+        else []
+    )
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for status, _, _ in samples if status >= 400),
+        "p50_ms": round(percentile(quantiles, latencies, 50), 2),
+        "p95_ms": round(percentile(quantiles, latencies, 95), 2),
+        "p99_ms": round(percentile(quantiles, latencies, 99), 2),
+        "mean_ms": round(statistics.fmean(latencies), 2),
+        "queries_per_request": round(
+            statistics.fmean(queries for _, _, queries in samples), 2
+        ),
+        "throughput_rps": round(len(samples) / elapsed, 1) if elapsed else None,
+    }
+
+
+class Benchmark:
+    """
+    Request every route iterations times per worker, after warmup untimed
+    requests.
+    transport is "client" (in-process, one worker) or "wsgi" (over HTTP, one
+    thread per worker).
+    """
+
+    def __init__(
+        self,
+        transport="client",
+        iterations=100,
+        warmup=5,
+        concurrency=1,
+        routes=None,
+        log=None,
+    ):
+        if transport == "client":
+            # The test client isn't thread-safe
+            concurrency = 1
+        self.transport = transport
+        self.iterations = iterations
+        self.warmup = warmup
+        self.concurrency = concurrency
+        self.route_names = routes
+        self.log = log or (lambda message: None)
+
+    def shoppers(self, transport):
+        users = list(
+            User.objects.filter(
+                is_staff=False, is_active=True, addresses__isnull=False
+            )
+            .distinct()
+            .order_by("id")[: self.concurrency]
+        )
+        if len(users) < self.concurrency:
+            raise BenchmarkError(
+                f"{self.concurrency} customers with an address are needed, "
+                f"found {len(users)}"
+            )
+        return [Shopper(index, user, transport) for index, user in enumerate(users)]
+
+    def run(self):
+        with fake_payment_providers(), ExitStack() as stack:
+            if self.transport == "wsgi":
+                base_url = stack.enter_context(BenchmarkServer())
+
+                def transport(user):
+                    return HTTPTransport(base_url, user)
+
+            else:
+                transport = ClientTransport
+
+            routes = storefront_routes(Catalogue())
+            if self.route_names:
+                routes = [route for route in routes if route.name in self.route_names]
+            shoppers = self.shoppers(transport)
+            results = {}
+            for route in routes:
+                results[route.name] = self.run_route(route, shoppers)
+                self.log(f"{route.name}: {results[route.name]}")
+        return {
+            "commit": git_commit(),
+            "created": timezone.now().isoformat(),
+            "transport": self.transport,
+            "concurrency": self.concurrency,
+            "requests_per_worker": self.iterations,
+            "database": connection.vendor,
+            "dataset": {
+                "products": Product.objects.count(),
+                "customers": User.objects.count(),
+                "orders": Order.objects.count(),
+            },
+            "routes": results,
+        }
+
+    def run_route(self, route, shoppers):
+        if route.setup:
+            for shopper in shoppers:
+                route.setup(shopper)
+        samples = [[] for _ in shoppers]
+        errors = []
+
+        def work(shopper):
+            transport = shopper.customer if route.signed_in else shopper.guest
+            try:
+                for n in range(self.warmup + self.iterations):
+                    for request in route.prepare(shopper, n) if route.prepare else []:
+                        transport.request(*request)
+                    sample = transport.request(*route.build(shopper, n))
+                    if n >= self.warmup:
+                        samples[shopper.index].append(sample)
+            except Exception as error:
+                errors.append(error)
+
+        start = time.perf_counter()
+        if self.transport == "client":
+            work(shoppers[0])
+        else:
+            threads = [
+                threading.Thread(target=work, args=(shopper,)) for shopper in shoppers
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        elapsed = time.perf_counter() - start
+        if errors:
+            raise BenchmarkError(f"{route.name} failed: {errors[0]!r}") from errors[0]
+        # Warmup requests are part of the elapsed time, count them out
+        timed = self.iterations / (self.warmup + self.iterations)
+        return summarize([s for worker in samples for s in worker], elapsed * timed)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare_results(previous, current, tolerance=0.1):
+    """
+    Regressions of current against previous results: routes whose p95 grew by
+    more than tolerance, that run more queries or that started failing.
+    """
+    regressions = []
+    for name, now in current["routes"].items():
+        before = previous["routes"].get(name)
+        if before is None:
+            continue
+        if now["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p95 {before['p95_ms']}ms -> {now['p95_ms']}ms"
+            )
+        if now["queries_per_request"] > before["queries_per_request"]:
+            regressions.append(
+                f"{name}: queries {before['queries_per_request']} -> "
+                f"{now['queries_per_request']}"
+            )
+        if now["errors"] > before["errors"]:
+            regressions.append(f"{name}: errors {before['errors']} -> {now['errors']}")
+    return regressions
@@ -1,10 +1,22 @@
+from django.utils.functional import SimpleLazyObject
+
 from products.models import Category
 from core.models import SiteSettings
+from core.site_data import get_site_data, get_site_data_version
+
+
+def load_categories():
+    return list(Category.objects.all().order_by("name").reverse())
 
 
 def common_data(request):
-    categories = Category.objects.all().order_by("name").reverse()
+    version = get_site_data_version()
     return {
-        "categories": categories,
-        "settings": SiteSettings.load()
+        # Only loaded when a template actually uses them
+        "categories": SimpleLazyObject(
+            lambda: get_site_data("categories", load_categories, version)
+        ),
+        "settings": SimpleLazyObject(
+            lambda: get_site_data("settings", SiteSettings.load, version)
+        ),
     }
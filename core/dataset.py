@@ -0,0 +1,451 @@
+"""
+Synthetic shop data for load and performance testing.
+
+DatasetGenerator fills the database with categories, products (with images
+and variants), customers with addresses, wishlists and carts, offers and a
+history of orders. Everything is drawn from one random.Random(seed) and
+anchored at a fixed end date, so the same arguments always produce the same
+dataset; rows are written with bulk_create in batches, which makes a
+million-order dataset a matter of minutes.
+
+Product popularity follows a Zipf-like curve and order volume grows over
+the period with a weekly rhythm, so top-seller and reporting queries see
+realistic skew. Order numbers are drawn from each day's
+OrderNumberSequence, so orders placed later never collide with them.
+Generated rows are marked by a prefix in their slugs, SKUs and emails.
+"""
+import itertools
+import random
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from io import BytesIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image
+
+from cart.models import Cart, CartItem
+from categories.models import Category
+from offers.models import Offer
+from orders.models import Order, OrderItem, OrderNumberSequence
+from orders.numbers import format_order_number
+from orders.rollups import rebuild_sales_rollups
+from orders.placement import DELIVERY_CHARGE
+from products.models import Product, ProductImage, ProductVariant
+from users.models import Address, User
+from wishlist.models import Wishlist
+
+from .site_data import bump_site_data_version
+
+PLACEHOLDER_IMAGES = 8
+COLORS = ["Red", "Green", "Blue", "Black", "White", "Yellow"]
+CITIES = ["Pune", "Mumbai", "Delhi", "Bengaluru", "Chennai", "Kolkata", "Jaipur"]
+WORDS = (
+    "fresh organic crunchy sweet ripe classic premium farm spicy golden "
+    "wild roasted smooth tangy creamy crisp juicy rustic"
+).split()
+PAYMENT_METHODS = ["cash_on_delivery", "stripe", "razorpay"]
+FREE_DELIVERY_OVER = Decimal("500.00")
+
+
+@contextmanager
+def explicit_creation_times(model):
+    """Let bulk_create keep the given created times (auto_now_add overwrites
+    them otherwise)"""
+    field = model._meta.get_field("created")
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class DatasetGenerator:
+    def __init__(
+        self,
+        seed=0,
+        categories=10,
+        products=1000,
+        users=1000,
+        orders=10000,
+        offers=10,
+        days=365,
+        end_date=None,
+        batch_size=5000,
+        log=None,
+    ):
+        self.rng = random.Random(seed)
+        self.prefix = f"syn{seed}"
+        self.counts = {
+            "categories": categories,
+            "products": products,
+            "users": users,
+            "orders": orders,
+            "offers": offers,
+        }
+        self.days = days
+        self.end = timezone.make_aware(
+            datetime.combine(end_date or datetime(2025, 6, 30).date(), time.max)
+        )
+        self.start = self.end - timedelta(days=days)
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+
+    def exists(self):
+        return Category.objects.filter(slug__startswith=f"{self.prefix}-").exists()
+
+    def generate(self):
+        self.placeholders = self.create_placeholder_images()
+        with ExitStack() as stack:
+            for model in (Product, Address, Order, OrderItem):
+                stack.enter_context(explicit_creation_times(model))
+            self.create_categories()
+            self.create_products()
+            self.create_users()
+            self.create_wishlists_and_carts()
+            self.create_offers()
+            self.create_orders()
+        # Bulk inserts send no signals; every page shows categories
+        bump_site_data_version()
+        rebuild_sales_rollups()
+
+    def bulk_create(self, model, objects):
+        """bulk_create an iterable in batches, returning the created objects"""
+        created = []
+        objects = iter(objects)
+        while batch := list(itertools.islice(objects, self.batch_size)):
+            for obj in batch:
+                if getattr(obj, "modified", None):
+                    # Keep the generated time (see ModificationDateTimeField)
+                    obj.update_modified = False
+            created.extend(model.objects.bulk_create(batch))
+        return created
+
+    def moment(self, earliest=None):
+        earliest = earliest or self.start
+        span = int((self.end - earliest).total_seconds())
+        return earliest + timedelta(seconds=self.rng.randrange(max(span, 1)))
+
+    def words(self, count):
+        return " ".join(self.rng.choice(WORDS) for _ in range(count))
+
+    def create_placeholder_images(self):
+        names = []
+        for index in range(PLACEHOLDER_IMAGES):
+            name = f"synthetic/placeholder-{index}.png"
+            if not default_storage.exists(name):
+                color = tuple((index * 67 + offset * 89) % 256 for offset in range(3))
+                buffer = BytesIO()
+                Image.new("RGB", (300, 300), color).save(buffer, "PNG")
+                name = default_storage.save(name, ContentFile(buffer.getvalue()))
+            names.append(name)
+        return names
+
+    def create_categories(self):
+        self.categories = self.bulk_create(
+            Category,
+            (
+                Category(
+                    name=f"{self.words(1).title()} {index}",
+                    slug=f"{self.prefix}-category-{index}",
+                    image=self.rng.choice(self.placeholders),
+                )
+                for index in range(self.counts["categories"])
+            ),
+        )
+        self.log(f"{len(self.categories)} categories")
+
+    def create_products(self):
+        def product(index):
+            price = Decimal(round(self.rng.lognormvariate(4.5, 0.8), 2))
+            price = max(price, Decimal("1.00")).quantize(Decimal("0.01"))
+            created = self.moment(self.start - timedelta(days=self.days))
+            return Product(
+                name=f"{self.words(2).title()} {index}",
+                description=self.words(30),
+                original_price=(price * Decimal("1.2")).quantize(Decimal("0.01")),
+                selling_price=price,
+                category=self.rng.choice(self.categories),
+                is_active=self.rng.random() > 0.05,
+                stock=self.rng.randrange(0, 500),
+                stock_unit=Product.StockUnitChoices.UNIT,
+                top_featured=self.rng.random() < 0.1,
+                has_variants=self.rng.random() < 0.2,
+                sku=f"{self.prefix}-sku-{index}",
+                slug=f"{self.prefix}-product-{index}",
+                created=created,
+                modified=created,
+            )
+
+        self.products = self.bulk_create(
+            Product, (product(index) for index in range(self.counts["products"]))
+        )
+        self.prices = [product.selling_price for product in self.products]
+
+        images = self.bulk_create(
+            ProductImage,
+            (
+                ProductImage(
+                    product=product,
+                    image=self.rng.choice(self.placeholders),
+                    is_primary=(position == 0),
+                )
+                for product in self.products
+                for position in range(self.rng.randint(1, 3))
+            ),
+        )
+        covers = {}
+        for image in images:
+            covers.setdefault(image.product_id, image)
+        for product in self.products:
+            product.cover_image = covers[product.id]
+            product.thumbnail = covers[product.id].image.name
+        Product.objects.bulk_update(
+            self.products, ["cover_image", "thumbnail"], batch_size=self.batch_size
+        )
+
+        sizes = ProductVariant.SizeChoices.values
+        variants = self.bulk_create(
+            ProductVariant,
+            (
+                ProductVariant(
+                    product=product,
+                    size=size,
+                    color=self.rng.choice(COLORS),
+                    stock=self.rng.randrange(0, 100),
+                    stock_unit=Product.StockUnitChoices.UNIT,
+                    selling_price=product.selling_price,
+                    sku=f"{product.sku}-{size}",
+                )
+                for product in self.products
+                if product.has_variants
+                for size in self.rng.sample(sizes, self.rng.randint(2, 4))
+            ),
+        )
+
+        # Zipf-like popularity over a shuffled ranking of the products
+        ranking = list(range(len(self.products)))
+        self.rng.shuffle(ranking)
+        weights = [0.0] * len(ranking)
+        for rank, index in enumerate(ranking, 1):
+            weights[index] = 1 / rank**1.1
+        self.popularity = list(itertools.accumulate(weights))
+        self.log(
+            f"{len(self.products)} products, {len(images)} images, "
+            f"{len(variants)} variants"
+        )
+
+    def popular_products(self, count):
+        """Distinct product indexes, weighted by popularity"""
+        picks = self.rng.choices(
+            range(len(self.products)), cum_weights=self.popularity, k=count
+        )
+        return list(dict.fromkeys(picks))
+
+    def create_users(self):
+        # One hash for everyone keeps this fast; every password is "password"
+        password = make_password("password", salt=self.prefix)
+
+        def user(index):
+            return User(
+                email=f"{self.prefix}-user-{index}@example.com",
+                name=f"{self.words(1).title()} Shopper {index}",
+                phone=f"9{self.rng.randrange(10**9):09d}",
+                password=password,
+                date_joined=self.moment(self.start - timedelta(days=self.days)),
+            )
+
+        self.users = self.bulk_create(
+            User, (user(index) for index in range(self.counts["users"]))
+        )
+
+        def addresses(user):
+            for position in range(self.rng.randint(1, 2)):
+                created = self.moment(user.date_joined)
+                yield Address(
+                    user=user,
+                    phone=user.phone,
+                    address=f"{self.rng.randint(1, 999)} {self.words(2).title()} Road",
+                    city=self.rng.choice(CITIES),
+                    postal_code=f"{self.rng.randrange(100000, 999999)}",
+                    is_default=(position == 0),
+                    created=created,
+                    modified=created,
+                )
+
+        self.addresses = {}
+        for address in self.bulk_create(
+            Address, (address for user in self.users for address in addresses(user))
+        ):
+            self.addresses.setdefault(address.user_id, address.id)
+        self.log(f"{len(self.users)} users, {len(self.addresses)} with addresses")
+
+    def create_wishlists_and_carts(self):
+        wishlists = self.bulk_create(
+            Wishlist,
+            (
+                Wishlist(user=user, product=self.products[index])
+                for user in self.users
+                for index in self.popular_products(self.rng.randint(0, 5))
+            ),
+        )
+        carts = self.bulk_create(
+            Cart,
+            (Cart(user=user) for user in self.users if self.rng.random() < 0.3),
+        )
+        lines = self.bulk_create(
+            CartItem,
+            (
+                CartItem(
+                    cart=cart,
+                    product=self.products[index],
+                    quantity=self.rng.randint(1, 3),
+                )
+                for cart in carts
+                for index in self.popular_products(self.rng.randint(1, 4))
+                if not self.products[index].has_variants
+            ),
+        )
+        self.log(
+            f"{len(wishlists)} wishlist items, {len(carts)} carts, "
+            f"{len(lines)} cart lines"
+        )
+
+    def create_offers(self):
+        offers = []
+        for index in range(self.counts["offers"]):
+            start = self.moment(self.end - timedelta(days=60))
+            offer_type = self.rng.choice(Offer.OfferType.values)
+            offers.append(
+                Offer(
+                    title=f"{self.words(2).title()} offer {index}",
+                    description=self.words(12),
+                    offer_type=offer_type,
+                    discount_value=Decimal(self.rng.choice([5, 10, 15, 20, 25])),
+                    buy_quantity=2,
+                    get_quantity=1 if offer_type == Offer.OfferType.BUY_GET else 0,
+                    start_date=start,
+                    end_date=start + timedelta(days=self.rng.randint(7, 90)),
+                )
+            )
+        offers = self.bulk_create(Offer, offers)
+        through = Offer.products.through
+        through.objects.bulk_create(
+            [
+                through(offer_id=offer.id, product_id=self.products[index].id)
+                for offer in offers
+                for index in self.popular_products(self.rng.randint(5, 20))
+            ],
+            batch_size=self.batch_size,
+        )
+        self.log(f"{len(offers)} offers")
+
+    def daily_order_counts(self):
+        """Spread the orders over the days, growing and busier at weekends"""
+        weights = []
+        for offset in range(self.days):
+            day = (self.start + timedelta(days=offset + 1)).date()
+            weekend = 1.4 if day.weekday() >= 5 else 1.0
+            weights.append((1 + offset / self.days) * weekend)
+        total = sum(weights)
+        counts = [int(self.counts["orders"] * weight / total) for weight in weights]
+        for offset in range(self.counts["orders"] - sum(counts)):
+            counts[-1 - offset % self.days] += 1
+        return counts
+
+    def reserve_order_numbers(self, day, count):
+        OrderNumberSequence.objects.get_or_create(day=day)
+        sequence = OrderNumberSequence.objects.filter(day=day)
+        sequence.update(last_value=F("last_value") + count)
+        return sequence.values_list("last_value", flat=True).get() - count + 1
+
+    def order_status(self, age):
+        if self.rng.random() < 0.05:
+            return Order.StatusChoices.CANCELLED
+        if age > timedelta(days=7):
+            return Order.StatusChoices.DELIVERED
+        return self.rng.choice(
+            [
+                Order.StatusChoices.PENDING,
+                Order.StatusChoices.PROCESSING,
+                Order.StatusChoices.SHIPPED,
+                Order.StatusChoices.DELIVERED,
+            ]
+        )
+
+    def orders_for_day(self, day_start, count):
+        day = day_start.date()
+        first_number = self.reserve_order_numbers(day, count)
+        moments = sorted(
+            day_start + timedelta(seconds=self.rng.randrange(86400))
+            for _ in range(count)
+        )
+        for sequence, created in enumerate(moments, first_number):
+            user = self.users[self.rng.randrange(len(self.users))]
+            lines = [
+                (index, self.rng.choices([1, 2, 3, 4], [60, 25, 10, 5])[0])
+                for index in self.popular_products(self.rng.randint(1, 5))
+            ]
+            total = sum(self.prices[index] * quantity for index, quantity in lines)
+            status = self.order_status(self.end - created)
+            method = self.rng.choice(PAYMENT_METHODS)
+            paid = status == Order.StatusChoices.DELIVERED or (
+                method != "cash_on_delivery"
+                and status != Order.StatusChoices.CANCELLED
+            )
+            order = Order(
+                user=user,
+                shipping_address_id=self.addresses[user.id],
+                order_number=format_order_number(day, sequence),
+                status=status,
+                payment_status=(
+                    Order.PaymentStatusChoices.PAID
+                    if paid
+                    else Order.PaymentStatusChoices.PENDING
+                ),
+                total_amount=total,
+                delivery_charge=(
+                    Decimal("0.00") if total > FREE_DELIVERY_OVER else DELIVERY_CHARGE
+                ),
+                payment_method=method,
+                created=created,
+                modified=created,
+            )
+            yield order, lines
+
+    def all_orders(self):
+        for offset, count in enumerate(self.daily_order_counts()):
+            if count:
+                day_start = self.start + timedelta(days=offset + 1)
+                day_start = day_start.replace(hour=0, minute=0, second=0, microsecond=0)
+                yield from self.orders_for_day(day_start, count)
+
+    def create_orders(self):
+        orders = self.all_orders()
+        created = items = 0
+        while batch := list(itertools.islice(orders, self.batch_size)):
+            placed = self.bulk_create(Order, [order for order, _ in batch])
+            items += len(
+                self.bulk_create(
+                    OrderItem,
+                    (
+                        OrderItem(
+                            order=order,
+                            product=self.products[index],
+                            quantity=quantity,
+                            price=self.prices[index],
+                            created=order.created,
+                            modified=order.created,
+                        )
+                        for order, (_, lines) in zip(placed, batch)
+                        for index, quantity in lines
+                    ),
+                )
+            )
+            created += len(placed)
+            self.log(f"{created} orders")
+        self.log(f"{created} orders with {items} items")
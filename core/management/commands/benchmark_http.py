@@ -0,0 +1,137 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.benchmark import Benchmark, BenchmarkError, compare_results
+
+RESULTS_DIR = Path(settings.BASE_DIR) / "benchmark-results"
+COLUMNS = {
+    "p50_ms": "p50 ms",
+    "p95_ms": "p95 ms",
+    "p99_ms": "p99 ms",
+    "queries_per_request": "queries",
+    "throughput_rps": "req/s",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the storefront and checkout routes through the test client "
+        "and a threaded WSGI server. Writes to the database: run it against a "
+        "copy filled by generate_dataset"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--transport",
+            choices=["client", "wsgi", "both"],
+            default="both",
+            help="Django's test client, HTTP to a threaded WSGI server, or both",
+        )
+        parser.add_argument(
+            "--requests", type=int, default=100, help="Timed requests per worker"
+        )
+        parser.add_argument(
+            "--warmup", type=int, default=5, help="Untimed requests per worker"
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=4,
+            help="Concurrent customers for the WSGI server",
+        )
+        parser.add_argument(
+            "--route",
+            action="append",
+            dest="routes",
+            help="Only benchmark this URL name (repeatable)",
+        )
+        parser.add_argument(
+            "--output",
+            help="Results file (default: benchmark-results/http-<commit>-<time>.json)",
+        )
+        parser.add_argument(
+            "--compare", help="Earlier results file to check for regressions"
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.1,
+            help="Allowed p95 growth against --compare, as a fraction",
+        )
+        parser.add_argument(
+            "--fail-on-regression",
+            action="store_true",
+            help="Exit with an error when --compare finds a regression",
+        )
+
+    def handle(self, *args, **options):
+        transports = (
+            ["client", "wsgi"]
+            if options["transport"] == "both"
+            else [options["transport"]]
+        )
+        results = {}
+        for transport in transports:
+            benchmark = Benchmark(
+                transport=transport,
+                iterations=options["requests"],
+                warmup=options["warmup"],
+                concurrency=options["concurrency"],
+                routes=options["routes"],
+            )
+            try:
+                results[transport] = benchmark.run()
+            except BenchmarkError as error:
+                raise CommandError(error)
+            self.report(results[transport])
+
+        output = options["output"]
+        if output is None:
+            commit = next(iter(results.values()))["commit"]
+            RESULTS_DIR.mkdir(exist_ok=True)
+            stamp = timezone.now().strftime("%Y%m%d-%H%M%S")
+            output = RESULTS_DIR / f"http-{commit}-{stamp}.json"
+        Path(output).write_text(json.dumps(results, indent=2))
+        self.stdout.write(f"Results written to {output}")
+
+        if options["compare"]:
+            self.compare(results, options)
+
+    def report(self, result):
+        self.stdout.write(
+            f"\n{result['transport']} ({result['concurrency']} concurrent, "
+            f"{result['requests_per_worker']} requests each, commit "
+            f"{result['commit']})"
+        )
+        self.stdout.write(
+            f"{'route':<30}" + "".join(f"{label:>10}" for label in COLUMNS.values())
+        )
+        for name, route in result["routes"].items():
+            errors = f"  {route['errors']} errors" if route["errors"] else ""
+            self.stdout.write(
+                f"{name:<30}"
+                + "".join(f"{route[column]!s:>10}" for column in COLUMNS)
+                + errors
+            )
+
+    def compare(self, results, options):
+        previous = json.loads(Path(options["compare"]).read_text())
+        regressions = [
+            f"{transport} {regression}"
+            for transport, result in results.items()
+            if transport in previous
+            for regression in compare_results(
+                previous[transport], result, options["tolerance"]
+            )
+        ]
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS("No regressions"))
+            return
+        for regression in regressions:
+            self.stdout.write(self.style.WARNING(regression))
+        if options["fail_on_regression"]:
+            raise CommandError(f"{len(regressions)} regressions")
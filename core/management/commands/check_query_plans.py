@@ -0,0 +1,112 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from cart.models import CartItem
+from orders.models import Order
+from products.models import Product
+from users.models import User
+from wishlist.models import Wishlist
+
+PAGE = 10
+
+
+def canonical_queries():
+    """The hot queries of the catalogue, cart, account and admin views"""
+    since = timezone.now() - timedelta(days=30)
+    wishlisted = Wishlist.objects.filter(user_id=1, product=OuterRef("pk"))
+    return {
+        "newest products": Product.objects.order_by("-created", "-id")[:PAGE],
+        "products by price": Product.objects.order_by("selling_price", "id")[:PAGE],
+        "products by name": Product.objects.order_by("name", "id")[:PAGE],
+        "featured products": Product.objects.filter(
+            is_active=True, top_featured=True
+        ).order_by("-created", "-id")[:PAGE],
+        "category listing": Product.objects.filter(category_id=1).order_by(
+            "-created", "-id"
+        )[:PAGE],
+        "similar products": Product.objects.filter(
+            category_id=1, is_active=True
+        ).exclude(id=1)[:6],
+        "wishlisted flags": Product.objects.annotate(
+            is_wishlisted=Exists(wishlisted)
+        ).order_by("-created", "-id")[:PAGE],
+        "admin orders": Order.objects.order_by("-created", "-id")[:PAGE],
+        "admin orders by status": Order.objects.filter(status="pending").order_by(
+            "-created", "-id"
+        )[:PAGE],
+        "revenue": Order.objects.filter(
+            status="delivered", created__gte=since
+        ).values_list("total_amount"),
+        "customer orders": Order.objects.filter(user_id=1).order_by(
+            "-created", "-id"
+        )[:PAGE],
+        "admin customers": User.objects.order_by("-date_joined", "-id")[:PAGE],
+        "wishlist": Wishlist.objects.filter(user_id=1).order_by("-created", "-id"),
+        "wishlist toggle": Wishlist.objects.filter(user_id=1, product_id=1),
+        "cart line": CartItem.objects.filter(cart_id=1, product_id=1, variant_id=1),
+        "cart line without variant": CartItem.objects.filter(
+            cart_id=1, product_id=1, variant__isnull=True
+        ),
+    }
+
+
+def plan_problems(plan, vendor):
+    """Lines of an EXPLAIN output showing a full scan or a separate sort"""
+    problems = []
+    for line in plan.splitlines():
+        if vendor == "sqlite":
+            # "SCAN t" reads the whole table, "SCAN t USING INDEX i" walks
+            # an index in order
+            full_scan = " SCAN " in f" {line} " and "USING" not in line
+            if full_scan or "TEMP B-TREE" in line:
+                problems.append(line.strip())
+        elif vendor == "postgresql":
+            if "Seq Scan" in line or line.strip().startswith(("Sort ", "->  Sort ")):
+                problems.append(line.strip())
+        elif "ALL" in line.split() or "filesort" in line:
+            problems.append(line.strip())
+    return problems
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN on the canonical storefront and admin queries and fail "
+        "if any of them does a full table scan or an unindexed sort"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verbose-plans",
+            action="store_true",
+            help="Print every plan, not only the failing ones",
+        )
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        failures = []
+        with transaction.atomic():
+            if vendor == "postgresql":
+                # Tiny development tables make sequential scans look cheapest
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+            for name, queryset in canonical_queries().items():
+                plan = queryset.explain()
+                problems = plan_problems(plan, vendor)
+                if problems:
+                    failures.append(name)
+                    self.stdout.write(self.style.ERROR(f"FAIL {name}"))
+                else:
+                    self.stdout.write(f"ok   {name}")
+                if problems or options["verbose_plans"]:
+                    self.stdout.write(f"     {plan}".replace("\n", "\n     "))
+
+        if failures:
+            raise CommandError(
+                f"{len(failures)} queries regressed to a full scan: "
+                + ", ".join(failures)
+            )
+        self.stdout.write(self.style.SUCCESS("All query plans use indexes"))
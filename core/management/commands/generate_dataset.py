@@ -0,0 +1,76 @@
+import time
+from datetime import date
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.dataset import DatasetGenerator
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with a deterministic synthetic shop: categories, "
+        "products, customers, wishlists, carts, offers and order history"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Random seed; the same seed and sizes give the same data",
+        )
+        parser.add_argument("--categories", type=int, default=10)
+        parser.add_argument("--products", type=int, default=1000)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--orders", type=int, default=10_000)
+        parser.add_argument("--offers", type=int, default=10)
+        parser.add_argument(
+            "--days", type=int, default=365, help="Days of order history"
+        )
+        parser.add_argument(
+            "--end-date",
+            type=date.fromisoformat,
+            default=date(2025, 6, 30),
+            help="Last day of the order history (YYYY-MM-DD)",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=5000, help="Rows per INSERT"
+        )
+
+    def handle(self, *args, **options):
+        if min(options["categories"], options["products"], options["users"]) < 1:
+            raise CommandError("At least one category, product and user is needed")
+        if options["days"] < 1:
+            raise CommandError("--days must be at least 1")
+
+        generator = DatasetGenerator(
+            seed=options["seed"],
+            categories=options["categories"],
+            products=options["products"],
+            users=options["users"],
+            orders=options["orders"],
+            offers=options["offers"],
+            days=options["days"],
+            end_date=options["end_date"],
+            batch_size=options["batch_size"],
+            log=self.stdout.write if options["verbosity"] > 1 else None,
+        )
+        if generator.exists():
+            raise CommandError(
+                f"A dataset with seed {options['seed']} already exists, "
+                "pick another seed"
+            )
+
+        start = time.perf_counter()
+        with transaction.atomic():
+            generator.generate()
+        call_command("rebuild_search_index", stdout=self.stdout)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated {options['orders']} orders for {options['users']} "
+                f"customers and {options['products']} products "
+                f"in {time.perf_counter() - start:.1f}s"
+            )
+        )
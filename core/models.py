@@ -1,6 +1,8 @@
 from django.db import models
 from django.utils import timezone
 
+from core.site_data import bump_site_data_version
+
 CURRENCY_CHOICES = [
     ("INR", "Indian Rupee"),
 ]
@@ -37,6 +39,11 @@ class SiteSettings(models.Model):
         obj, created = cls.objects.get_or_create(pk=1)
         return obj
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Refresh the cached copy used by core.context_processors
+        bump_site_data_version()
+
     def update_general_settings(self, **kwargs):
         for key, value in kwargs.items():
             if value is not None:  # Only update if value is provided
@@ -0,0 +1,151 @@
+"""
+Full-page cache for anonymous catalogue pages.
+
+Anonymous GET requests to views using CachedPageMixin are answered from
+Django's cache. Every entry records the surrogate keys ("tags" such as
+"product:12" or "category:3:products") the page was rendered from, together
+with the version each tag had at the time. purge_page_tags() drops tags, so
+every page depending on one of them is stale on its next request while
+unrelated pages stay cached. Tag versions are plain cache values, which keeps
+this working on any backend (local memory, file, memcached...).
+
+Categories and site settings appear on every page; editing them bumps the
+site data version, which is part of every page key.
+
+Responses carry an ETag and Last-Modified, and conditional requests are
+answered with a 304 without rendering anything.
+"""
+import hashlib
+import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date
+
+from .site_data import get_site_data_version
+
+PAGE_CACHE_TIMEOUT = getattr(settings, "PAGE_CACHE_TIMEOUT", 60 * 5)
+
+
+def tag_key(tag):
+    return f"page-tag:{tag}"
+
+
+def page_cache_key(request):
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return f"page:{get_site_data_version()}:{url}"
+
+
+def current_tag_versions(tags):
+    """Return {tag: version}, giving tags that have none a fresh version"""
+    keys = {tag_key(tag): tag for tag in tags}
+    versions = cache.get_many(keys)
+    for key in keys.keys() - versions.keys():
+        cache.add(key, uuid4().hex, timeout=None)
+        versions[key] = cache.get(key)
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def purge_page_tags(*tags):
+    """Invalidate every cached page depending on any of tags"""
+    if tags:
+        cache.delete_many([tag_key(tag) for tag in tags])
+
+
+def purge_page_tags_on_commit(*tags):
+    # Purging before commit would let a concurrent request cache the old data
+    transaction.on_commit(lambda: purge_page_tags(*tags))
+
+
+def is_cacheable_request(request):
+    return (
+        request.method in ("GET", "HEAD")
+        and not request.user.is_authenticated
+        # Flash messages are rendered once into the page that shows them
+        and not len(get_messages(request))
+    )
+
+
+def is_cacheable_response(request, response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        # The page contains a CSRF token tied to this visitor's cookie
+        and not request.META.get("CSRF_COOKIE_NEEDS_UPDATE")
+    )
+
+
+def get_cached_page(key):
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    tags = entry["tags"]
+    current = cache.get_many([tag_key(tag) for tag in tags])
+    if any(current.get(tag_key(tag)) != version for tag, version in tags.items()):
+        return None
+    return entry
+
+
+def cache_page(key, response, tags, timeout):
+    content = response.content
+    entry = {
+        "content": content,
+        "content_type": response["Content-Type"],
+        "etag": f'"{hashlib.md5(content).hexdigest()}"',
+        "last_modified": int(time.time()),
+        "tags": current_tag_versions(tags),
+    }
+    cache.set(key, entry, timeout)
+    return entry
+
+
+def cached_page_response(request, entry):
+    response = get_conditional_response(
+        request, etag=entry["etag"], last_modified=entry["last_modified"]
+    )
+    if response is None:
+        response = HttpResponse(entry["content"], content_type=entry["content_type"])
+    response["ETag"] = entry["etag"]
+    response["Last-Modified"] = http_date(entry["last_modified"])
+    # Signed in visitors get their own pages; browsers must revalidate
+    patch_vary_headers(response, ["Cookie"])
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+class CachedPageMixin:
+    """
+    Serve anonymous GET requests from the page cache. Views return the tags a
+    rendered page depends on from get_page_tags(context).
+    """
+
+    page_cache_timeout = PAGE_CACHE_TIMEOUT
+
+    def get_page_tags(self, context):
+        return []
+
+    def dispatch(self, request, *args, **kwargs):
+        if not is_cacheable_request(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        key = page_cache_key(request)
+        entry = get_cached_page(key)
+        if entry is None:
+            response = super().dispatch(request, *args, **kwargs)
+            if hasattr(response, "render"):
+                response.render()
+            if not is_cacheable_response(request, response):
+                return response
+            tags = self.get_page_tags(response.context_data)
+            entry = cache_page(key, response, tags, self.page_cache_timeout)
+        return cached_page_response(request, entry)
@@ -0,0 +1,242 @@
+"""
+Keyset (cursor) pagination.
+
+Offset pagination makes the database walk past every earlier row and count
+the whole table for each page, so deep pages get slower the further you go.
+CursorPaginator orders by the sort columns with the primary key as a
+tie-breaker and asks for the rows after (or before) the last row shown, so
+page 5000 costs the same single query as page 1. Cursors are opaque tokens
+holding that row's sort values; sort columns must not be nullable. They can
+be fields of the model or, through forward relations, of related models
+("category__name"); anything else is rejected with ImproperlyConfigured.
+
+There is no page count. When a total is wanted, paginator.count runs the
+COUNT once and caches it for PAGINATION_COUNT_TIMEOUT seconds.
+"""
+import base64
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import (
+    FieldDoesNotExist,
+    ImproperlyConfigured,
+    ValidationError,
+)
+from django.db.models import Q
+from django.db.models.constants import LOOKUP_SEP
+from django.http import QueryDict
+
+COUNT_TIMEOUT = getattr(settings, "PAGINATION_COUNT_TIMEOUT", 60)
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPage:
+    def __init__(
+        self, object_list, paginator, params, next_cursor, previous_cursor
+    ):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.params = params
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def query_string(self, cursor):
+        params = self.params.copy()
+        params[self.paginator.cursor_param] = cursor
+        params.pop("page", None)
+        return "?" + params.urlencode()
+
+    @property
+    def next_query(self):
+        if not self.has_next():
+            return ""
+        return self.query_string(self.next_cursor)
+
+    @property
+    def previous_query(self):
+        if not self.has_previous():
+            return ""
+        return self.query_string(self.previous_cursor)
+
+
+class CursorPaginator:
+    """
+    Paginate a queryset by its ordering (or the model's default ordering);
+    the primary key is appended when it isn't already part of it.
+    """
+
+    cursor_param = "cursor"
+
+    def __init__(self, queryset, per_page, ordering=None):
+        model = queryset.model
+        ordering = list(ordering or queryset.query.order_by or model._meta.ordering)
+        names = [name.lstrip("-") for name in ordering]
+        if "pk" not in names and model._meta.pk.name not in names:
+            descending = bool(ordering) and ordering[-1].startswith("-")
+            ordering.append("-pk" if descending else "pk")
+
+        self.model = model
+        self.per_page = per_page
+        self.ordering = ordering
+        self.fields = [self.resolve(name) for name in ordering]
+        self.queryset = queryset.order_by(*ordering)
+        relations = {
+            name.lstrip("-").rpartition(LOOKUP_SEP)[0] for name in ordering
+        } - {""}
+        if relations:
+            # Cursors read the related values off the page's rows
+            self.queryset = self.queryset.select_related(*relations)
+
+    def resolve(self, name):
+        """
+        The field an ordering name ("-created", "category__name") sorts by.
+        Raises ImproperlyConfigured for orderings cursors can't follow.
+        """
+        if not isinstance(name, str) or name == "?":
+            raise ImproperlyConfigured(
+                f"CursorPaginator can't order by {name!r}, only by field names"
+            )
+        model = self.model
+        *relations, last = name.lstrip("-").split(LOOKUP_SEP)
+        try:
+            for relation in relations:
+                field = model._meta.get_field(relation)
+                if not (field.many_to_one or field.one_to_one):
+                    raise ImproperlyConfigured(
+                        f"CursorPaginator can't order by {name!r}: {relation!r} "
+                        "isn't a relation to a single row"
+                    )
+                model = field.related_model
+            field = model._meta.pk if last == "pk" else model._meta.get_field(last)
+        except FieldDoesNotExist as error:
+            raise ImproperlyConfigured(
+                f"CursorPaginator can't order by {name!r}: {error}"
+            ) from error
+        if field.is_relation:
+            # Django would sort by the related model's ordering instead
+            raise ImproperlyConfigured(
+                f"CursorPaginator can't order by the relation {name!r}; order by "
+                f"{name}_id or a field of the related model"
+            )
+        return field
+
+    def sort_value(self, obj, name, field):
+        for relation in name.lstrip("-").split(LOOKUP_SEP)[:-1]:
+            obj = getattr(obj, relation)
+        return getattr(obj, field.attname)
+
+    def encode_cursor(self, obj, backwards):
+        values = [
+            self.sort_value(obj, name, field)
+            for name, field in zip(self.ordering, self.fields)
+        ]
+        # default=str keeps full datetime precision, unlike DjangoJSONEncoder
+        payload = json.dumps(
+            {"o": self.ordering, "v": values, "b": backwards}, default=str
+        )
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded))
+            if payload["o"] != self.ordering:
+                raise InvalidCursor("The cursor belongs to a different ordering")
+            values = [
+                field.to_python(value)
+                for field, value in zip(self.fields, payload["v"], strict=True)
+            ]
+            return values, bool(payload["b"])
+        except InvalidCursor:
+            raise
+        except (ValueError, TypeError, KeyError, ValidationError) as error:
+            raise InvalidCursor(f"Invalid cursor: {error}") from error
+
+    def keyset_filter(self, values, backwards):
+        """Rows strictly after values in the ordering (before when backwards)"""
+        condition = Q()
+        equal = Q()
+        for name, value in zip(self.ordering, values):
+            descending = name.startswith("-") != backwards
+            field = name.lstrip("-")
+            lookup = "lt" if descending else "gt"
+            condition |= equal & Q(**{f"{field}__{lookup}": value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def page(self, cursor=None, params=None):
+        """Return the page after cursor; raises InvalidCursor for bad tokens"""
+        queryset = self.queryset
+        backwards = False
+        if cursor:
+            values, backwards = self.decode_cursor(cursor)
+            queryset = queryset.filter(self.keyset_filter(values, backwards))
+        if backwards:
+            queryset = queryset.reverse()
+
+        rows = list(queryset[: self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if backwards:
+            rows.reverse()
+        # Coming from a cursor means there are rows on the side we came from
+        has_next = more if not backwards else True
+        has_previous = more if backwards else bool(cursor)
+        return CursorPage(
+            rows,
+            self,
+            params if params is not None else QueryDict(),
+            self.encode_cursor(rows[-1], False) if rows and has_next else None,
+            self.encode_cursor(rows[0], True) if rows and has_previous else None,
+        )
+
+    def get_page(self, params):
+        """Like page() but reads the cursor from request.GET, falling back to
+        the first page for invalid cursors"""
+        try:
+            return self.page(params.get(self.cursor_param), params)
+        except InvalidCursor:
+            return self.page(None, params)
+
+    @property
+    def count(self):
+        sql, params = self.queryset.order_by().query.sql_with_params()
+        digest = hashlib.md5(f"{sql}:{params!r}".encode()).hexdigest()
+        key = f"pagination-count:{digest}"
+        count = cache.get(key)
+        if count is None:
+            count = self.queryset.count()
+            cache.set(key, count, COUNT_TIMEOUT)
+        return count
+
+
+class CursorPaginationMixin:
+    """Keyset pagination for ListViews; templates link to page_obj.next_query"""
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = CursorPaginator(queryset, page_size)
+        page = paginator.get_page(self.request.GET)
+        return paginator, page, page.object_list, page.has_other_pages()
@@ -0,0 +1,103 @@
+"""
+Per-request SQL query budgets.
+
+QueryBudgetMiddleware counts the queries and the database time of every
+request and logs a structured warning when a route goes over its budget, so
+N+1 patterns show up in the logs instead of as slow pages. Budgets are keyed
+by URL name ("products:detail"); QUERY_BUDGETS in settings overrides or
+extends DEFAULT_BUDGETS and QUERY_BUDGET_DEFAULT covers every other route.
+
+The same budgets are asserted for every named route by
+core.tests.RouteQueryBudgetTests, which also POSTs to the order placement,
+payment and order status routes.
+"""
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Measured with cold caches, see core.tests.RouteQueryBudgetTests
+DEFAULT_BUDGETS = {
+    "core:home": 9,
+    "products:detail": 10,
+    "cart:checkout": 12,
+    # 15 in the steady state; the first order of a day also reserves a block
+    # of order numbers (orders.numbers)
+    "cart:place_order": 21,
+    # Holds the cart's stock and, when the card needs no further action,
+    # places the order in the same request; 22 in the steady state
+    "cart:create_payment_intent": 28,
+    # Holds the cart's stock and takes the order number (the receipt)
+    "cart:create_razorpay_order": 17,
+    # Places the order under the receipt number and drops it from the session
+    "cart:verify_razorpay_payment": 17,
+    # Cancelling or reviving an order moves the stock of its products and of
+    # its variants (reviving checks the rows first) and both sales rollups
+    "users:admin.orders.update_status": 16,
+}
+QUERY_BUDGETS = {**DEFAULT_BUDGETS, **getattr(settings, "QUERY_BUDGETS", {})}
+QUERY_BUDGET_DEFAULT = getattr(settings, "QUERY_BUDGET_DEFAULT", 15)
+
+
+def get_query_budget(url_name):
+    return QUERY_BUDGETS.get(url_name, QUERY_BUDGET_DEFAULT)
+
+
+class QueryCounter:
+    """Database execute wrapper counting queries and the time spent in them"""
+
+    def __init__(self):
+        self.queries = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.duration += time.perf_counter() - start
+
+
+@contextmanager
+def count_queries():
+    """Count the queries run on every database connection of this thread"""
+    counter = QueryCounter()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(counter))
+        yield counter
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with count_queries() as counter:
+            response = self.get_response(request)
+
+        match = request.resolver_match
+        if match and match.view_name:
+            budget = get_query_budget(match.view_name)
+            if counter.queries > budget:
+                logger.warning(
+                    "Query budget exceeded: %s ran %d queries (budget %d)",
+                    match.view_name,
+                    counter.queries,
+                    budget,
+                    extra={
+                        "url_name": match.view_name,
+                        "path": request.path,
+                        "method": request.method,
+                        "status": response.status_code,
+                        "queries": counter.queries,
+                        "budget": budget,
+                        "db_time_ms": round(counter.duration * 1000, 2),
+                    },
+                )
+        return response
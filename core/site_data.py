@@ -0,0 +1,46 @@
+"""
+Process-local cache for data every page renders (categories, site settings).
+
+Values are stored in this process together with the site data version they
+were loaded under. The version lives in Django's cache: with a cache shared
+by every process (a CACHES backend such as Redis or Memcached), bumping it
+from any process invalidates every process's copy on its next request. The
+default local-memory cache is per process, so the version also expires after
+SITE_DATA_MAX_AGE seconds and other processes catch up within that time.
+"""
+import threading
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+
+SITE_DATA_VERSION_KEY = "core:site_data_version"
+SITE_DATA_MAX_AGE = getattr(settings, "SITE_DATA_MAX_AGE", 300)
+
+_lock = threading.Lock()
+_values = {}  # key -> (version, value)
+
+
+def get_site_data_version():
+    version = cache.get(SITE_DATA_VERSION_KEY)
+    if version is None:
+        version = uuid4().hex
+        if not cache.add(SITE_DATA_VERSION_KEY, version, timeout=SITE_DATA_MAX_AGE):
+            version = cache.get(SITE_DATA_VERSION_KEY, version)
+    return version
+
+
+def bump_site_data_version():
+    cache.set(SITE_DATA_VERSION_KEY, uuid4().hex, timeout=SITE_DATA_MAX_AGE)
+
+
+def get_site_data(key, loader, version=None):
+    """Return the cached value for key, calling loader() when it is stale"""
+    version = version or get_site_data_version()
+    cached = _values.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    value = loader()
+    with _lock:
+        _values[key] = (version, value)
+    return value
@@ -1,3 +1,748 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+import time
+from contextlib import ExitStack
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import CommandError
+from django.db import transaction
+
+from django.http import QueryDict
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import URLResolver, get_resolver, reverse
+from django.utils import timezone
+
+from categories.models import Category
+from core.benchmark import compare_results
+from core.context_processors import common_data
+from core.management.commands.check_query_plans import plan_problems
+from cart.models import Cart, CartItem
+from cart.views import PaymentIntentView
+from core.models import SiteSettings
+from core.mixins import StripeMixin
+from core import query_budget, site_data
+from core.query_budget import count_queries, get_query_budget
+from core.pagination import CursorPaginator
+from products import autocomplete
+from offers.models import Offer
+from orders.models import Order, OrderItem
+from orders.numbers import generate_order_number
+from products.models import Product, ProductImage, ProductVariant
+from users.models import Address, User
+from wishlist.models import Wishlist
+
+
+class HomePageTests(TestCase):
+    def setUp(self):
+        SiteSettings.load()
+        self.categories = [
+            Category.objects.create(
+                name=f"Category {i}", slug=f"category-{i}", image="categories/c.png"
+            )
+            for i in range(6)
+        ]
+
+    def create_products(self, count, start=0):
+        for i in range(start, start + count):
+            product = Product.objects.create(
+                name=f"Product {i}",
+                description="Description",
+                original_price="120.00",
+                selling_price="100.00",
+                category=self.categories[i % len(self.categories)],
+                stock=10,
+                stock_unit=Product.StockUnitChoices.UNIT,
+                top_featured=(i % 2 == 0),
+                sku=f"SKU-{i}",
+                slug=f"product-{i}",
+            )
+            ProductImage.objects.create(product=product, image=f"products/{i}.png")
+            ProductImage.objects.create(
+                product=product, image=f"products/{i}-primary.png", is_primary=True
+            )
+
+    def test_home_page_query_count_is_constant(self):
+        self.create_products(5)
+        # Cold site data cache: categories and site settings are loaded
+        # alongside featured, new arrivals, rail categories and rail products
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse("core:home"))
+        self.assertEqual(response.status_code, 200)
+
+        self.create_products(60, start=5)
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("core:home"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_home_page_sections_are_bounded(self):
+        from core.views import HOME_CATEGORY_RAILS, HOME_SECTION_SIZE
+
+        self.create_products(100)
+        response = self.client.get(reverse("core:home"))
+        sections = response.context["sections"]
+        self.assertEqual(len(sections), 2 + HOME_CATEGORY_RAILS)
+        for section in sections:
+            self.assertLessEqual(len(section["products"]), HOME_SECTION_SIZE)
+        self.assertTrue(all(p.top_featured for p in sections[0]["products"]))
+        self.assertTrue(
+            all(
+                p.thumbnail.endswith("-primary.png")
+                for p in sections[1]["products"]
+            )
+        )
+
+
+class SearchSuggestionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.index = autocomplete.PrefixIndex()
+        patcher = mock.patch.object(autocomplete, "prefix_index", self.index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.fruits = Category.objects.create(
+            name="Fresh Fruits", slug="fresh-fruits", image="categories/f.png"
+        )
+        self.apple = Product.objects.create(
+            name="Red Apple",
+            description="Description",
+            original_price="10.00",
+            selling_price="8.00",
+            category=self.fruits,
+            brand="Appleton",
+            stock=5,
+            stock_unit=Product.StockUnitChoices.UNIT,
+            sku="SKU-APPLE",
+            slug="red-apple",
+        )
+
+    def suggest(self, query):
+        response = self.client.get(reverse("core:search_suggestions"), {"q": query})
+        return [(s["kind"], s["label"]) for s in response.json()["suggestions"]]
+
+    def test_suggestions_are_served_from_memory(self):
+        self.index.ensure_built()
+        with self.assertNumQueries(0):
+            suggestions = self.suggest("app")
+        self.assertEqual(suggestions, [("brand", "Appleton"), ("product", "Red Apple")])
+        self.assertEqual(self.suggest("FRU"), [("category", "Fresh Fruits")])
+        self.assertEqual(self.suggest(""), [])
+
+    def test_many_products_do_not_crowd_out_categories(self):
+        for index in range(40):
+            Product.objects.create(
+                name=f"Fresh Apple {index}",
+                description="Description",
+                original_price="10.00",
+                selling_price="8.00",
+                category=self.fruits,
+                stock=5,
+                stock_unit=Product.StockUnitChoices.UNIT,
+                sku=f"SKU-FRESH-{index}",
+                slug=f"fresh-apple-{index}",
+            )
+        suggestions = self.suggest("fresh")
+        self.assertEqual(len(suggestions), 8)
+        self.assertEqual(suggestions[0], ("category", "Fresh Fruits"))
+        self.assertEqual(suggestions[1], ("product", "Fresh Apple 0"))
+
+    def test_signals_refresh_suggestions(self):
+        self.index.ensure_built()
+        self.apple.name = "Green Apple"
+        self.apple.brand = ""
+        self.apple.save()
+        self.assertEqual(self.suggest("app"), [("product", "Green Apple")])
+
+        self.fruits.status = Category.StatusChoices.INACTIVE
+        self.fruits.save()
+        self.assertEqual(self.suggest("fresh"), [])
+
+        self.apple.delete()
+        self.assertEqual(self.suggest("green"), [])
+
+    def test_other_processes_changes_reload_the_index(self):
+        self.index.ensure_built()
+        # As saved by another process, or bulk loaded without signals
+        Product.objects.update(name="Green Apple")
+        self.assertEqual(self.suggest("green"), [])
+
+        call_command("rebuild_search_index", stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(self.suggest("green"), [("product", "Green Apple")])
+
+        # Without a shared cache the version expires instead
+        Product.objects.update(name="Yellow Apple")
+        later = time.time() + autocomplete.AUTOCOMPLETE_MAX_AGE + 1
+        with mock.patch("time.time", return_value=later):
+            self.assertEqual(self.suggest("yellow"), [("product", "Yellow Apple")])
+
+
+class SiteDataCacheTests(TestCase):
+    def setUp(self):
+        SiteSettings.load()
+        Category.objects.create(name="Bakery", slug="bakery", image="categories/b.png")
+
+    def test_common_data_is_cached_until_invalidated(self):
+        self.client.get(reverse("core:terms"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("core:terms"))
+        self.assertContains(response, "Bakery")
+
+        site_settings = SiteSettings.load()
+        site_settings.update_general_settings(site_name="Corner Shop")
+        Category.objects.create(name="Dairy", slug="dairy", image="categories/d.png")
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("core:terms"))
+        self.assertContains(response, "Corner Shop")
+        self.assertContains(response, "Dairy")
+
+    def test_versions_expire_for_processes_that_missed_a_bump(self):
+        self.client.get(reverse("core:terms"))
+        # Changed without a bump reaching this process's cache
+        Category.objects.update(name="Pastry")
+
+        later = time.time() + site_data.SITE_DATA_MAX_AGE + 1
+        with mock.patch("time.time", return_value=later):
+            response = self.client.get(reverse("core:terms"))
+        self.assertContains(response, "Pastry")
+
+    def test_site_data_is_loaded_lazily(self):
+        with self.assertNumQueries(0):
+            context = common_data(RequestFactory().get("/"))
+        with self.assertNumQueries(1):
+            self.assertEqual([c.name for c in context["categories"]], ["Bakery"])
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(
+            name="Fruits", slug="fruits", image="categories/fruits.png"
+        )
+        Product.objects.bulk_create(
+            [
+                Product(
+                    name=f"Product {i % 7}",
+                    description="Description",
+                    original_price="20.00",
+                    selling_price=f"{10 + i % 4}.00",
+                    category=category,
+                    stock=10,
+                    stock_unit=Product.StockUnitChoices.UNIT,
+                    sku=f"SKU-{i}",
+                    slug=f"product-{i}",
+                )
+                for i in range(23)
+            ]
+        )
+        # Plenty of ties, so the primary key has to break them
+        Product.objects.filter(pk__lte=Product.objects.all()[11].pk).update(
+            created=Product.objects.earliest("created").created
+        )
+
+    def walk(self, paginator):
+        pages, page = [], paginator.page()
+        while True:
+            pages.append([product.pk for product in page])
+            if not page.has_next():
+                return pages, page
+            page = paginator.page(page.next_cursor)
+
+    def test_pages_follow_the_ordering_without_gaps_or_repeats(self):
+        for ordering in ("-created", "selling_price", "-selling_price", "name"):
+            queryset = Product.objects.order_by(ordering)
+            paginator = CursorPaginator(queryset, 5)
+            expected = list(
+                queryset.order_by(*paginator.ordering).values_list("pk", flat=True)
+            )
+
+            pages, last = self.walk(paginator)
+            self.assertEqual(sum(pages, []), expected, ordering)
+            self.assertEqual([len(page) for page in pages], [5, 5, 5, 5, 3])
+
+            # And back again
+            backwards, page = [], last
+            while page.has_previous():
+                page = paginator.page(page.previous_cursor)
+                backwards.insert(0, [product.pk for product in page])
+            self.assertEqual(backwards, pages[:-1], ordering)
+
+    def test_deep_pages_cost_one_query(self):
+        paginator = CursorPaginator(Product.objects.all(), 2)
+        page = paginator.page()
+        for _ in range(10):
+            with self.assertNumQueries(1):
+                page = paginator.page(page.next_cursor)
+
+    def test_bad_cursors_and_query_strings(self):
+        paginator = CursorPaginator(Product.objects.order_by("name"), 5)
+        params = QueryDict("sort=name&page=3&cursor=garbage")
+        page = paginator.get_page(params)
+        self.assertFalse(page.has_previous())
+        self.assertEqual(
+            QueryDict(page.next_query[1:]),
+            QueryDict(f"sort=name&cursor={page.next_cursor}"),
+        )
+
+        # A cursor from another sort order starts over
+        other = CursorPaginator(Product.objects.order_by("-created"), 5).page()
+        page = paginator.get_page(QueryDict(f"cursor={other.next_cursor}"))
+        self.assertFalse(page.has_previous())
+
+    def test_orderings_across_relations(self):
+        vegetables = Category.objects.create(
+            name="Vegetables", slug="vegetables", image="categories/v.png"
+        )
+        Product.objects.filter(pk__in=Product.objects.all()[:8]).update(
+            category=vegetables
+        )
+        queryset = Product.objects.order_by("-category__name", "name")
+        paginator = CursorPaginator(queryset, 5)
+        pages, _ = self.walk(paginator)
+        self.assertEqual(
+            sum(pages, []),
+            list(queryset.order_by(*paginator.ordering).values_list("pk", flat=True)),
+        )
+
+        for ordering in ("category", "category__missing", "orderitem__price", "?"):
+            with self.assertRaisesMessage(ImproperlyConfigured, repr(ordering)):
+                CursorPaginator(Product.objects.order_by(ordering), 5)
+
+    def test_count_is_cached(self):
+        paginator = CursorPaginator(Product.objects.filter(stock=10), 5)
+        with self.assertNumQueries(1):
+            self.assertEqual(paginator.count, 23)
+            self.assertEqual(paginator.count, 23)
+
+
+class QueryPlanTests(TestCase):
+    def test_canonical_queries_use_indexes(self):
+        out = StringIO()
+        call_command("check_query_plans", verbose_plans=True, stdout=out)
+        self.assertIn("All query plans use indexes", out.getvalue())
+
+    def test_full_scans_and_sorts_are_reported(self):
+        plan = (
+            "3 0 0 SCAN orders_order\n"
+            "5 0 0 SEARCH orders_order USING INDEX orders_idx (status=?)\n"
+            "9 0 0 USE TEMP B-TREE FOR ORDER BY"
+        )
+        self.assertEqual(
+            plan_problems(plan, "sqlite"),
+            ["3 0 0 SCAN orders_order", "9 0 0 USE TEMP B-TREE FOR ORDER BY"],
+        )
+        plan = "Sort  (cost=1.1..1.2)\n  ->  Seq Scan on orders_order  (cost=0..1)"
+        self.assertEqual(len(plan_problems(plan, "postgresql")), 2)
+
+
+class GenerateDatasetTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+
+    def generate(self, **options):
+        options = {
+            "categories": 3,
+            "products": 40,
+            "users": 15,
+            "orders": 120,
+            "offers": 2,
+            "days": 30,
+            "batch_size": 25,
+            **options,
+        }
+        call_command("generate_dataset", stdout=StringIO(), **options)
+
+    def snapshot(self, **options):
+        """Generate a dataset, read it back and roll it away again"""
+        with transaction.atomic():
+            self.generate(**options)
+            data = (
+                list(Product.objects.order_by("sku").values_list("sku", "name")),
+                list(
+                    Order.objects.order_by("order_number").values_list(
+                        "order_number", "created", "status", "total_amount"
+                    )
+                ),
+                list(
+                    OrderItem.objects.order_by("order__order_number", "id")
+                    .values_list("product__sku", "quantity", "price")
+                ),
+            )
+            transaction.set_rollback(True)
+        return data
+
+    def test_generates_a_consistent_shop(self):
+        index = autocomplete.PrefixIndex()
+        index.rebuild()  # built before the catalogue existed
+        with mock.patch.object(autocomplete, "prefix_index", index):
+            self.generate(seed=7)
+
+        self.assertEqual(Category.objects.count(), 3)
+        self.assertEqual(Product.objects.count(), 40)
+        self.assertEqual(Order.objects.count(), 120)
+        self.assertFalse(Product.objects.filter(cover_image=None).exists())
+        self.assertFalse(
+            Product.objects.filter(has_variants=True, variants=None).exists()
+        )
+        self.assertFalse(User.objects.filter(addresses=None).exists())
+        self.assertEqual(Offer.objects.count(), 2)
+        self.assertTrue(Wishlist.objects.exists())
+        # The bulk-created catalogue is searchable and suggested right away
+        product = Product.objects.filter(is_active=True).first()
+        suggestions = index.suggest(product.name, limit=40)
+        self.assertIn(product.name, [s["label"] for s in suggestions])
+        self.assertTrue(CartItem.objects.exists())
+        for order in Order.objects.prefetch_related("items")[:20]:
+            self.assertEqual(
+                order.total_amount, sum(item.subtotal for item in order.items.all())
+            )
+            self.assertTrue(order.order_number.startswith(f"ORD-{order.created:%Y%m%d}"))
+
+    def test_same_seed_gives_the_same_data(self):
+        first = self.snapshot(seed=3)
+        self.assertEqual(self.snapshot(seed=3), first)
+        self.assertNotEqual(self.snapshot(seed=4)[1], first[1])
+
+    def test_refuses_to_generate_a_seed_twice(self):
+        self.generate(seed=1, orders=0)
+        with self.assertRaises(CommandError):
+            self.generate(seed=1, orders=0)
+
+
+class HTTPBenchmarkTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        SiteSettings.load()
+        call_command(
+            "generate_dataset",
+            products=30,
+            users=5,
+            orders=20,
+            days=10,
+            stdout=StringIO(),
+        )
+
+    def test_every_route_is_benchmarked(self):
+        output = Path(tempfile.mkdtemp()) / "results.json"
+        self.addCleanup(shutil.rmtree, output.parent)
+        call_command(
+            "benchmark_http",
+            transport="client",
+            requests=3,
+            warmup=1,
+            output=str(output),
+            stdout=StringIO(),
+        )
+
+        result = json.loads(output.read_text())["client"]
+        self.assertEqual(
+            list(result["routes"]),
+            [
+                "core:home",
+                "products:category",
+                "products:detail",
+                "products:get_variant_details",
+                "core:search",
+                "users:toggle_wishlist",
+                "cart:add",
+                "cart:update",
+                "cart:checkout",
+                "cart:place_order",
+            ],
+        )
+        for name, route in result["routes"].items():
+            self.assertEqual(route["requests"], 3, name)
+            self.assertEqual(route["errors"], 0, name)
+            self.assertLessEqual(route["p50_ms"], route["p99_ms"])
+        self.assertGreater(result["routes"]["cart:checkout"]["queries_per_request"], 0)
+        # Four orders placed with the fake payment providers in place
+        self.assertEqual(Order.objects.count(), 24)
+
+    def test_regressions_are_reported(self):
+        def result(p95, queries, errors=0):
+            route = {"p95_ms": p95, "queries_per_request": queries, "errors": errors}
+            return {"routes": {"core:home": route}}
+
+        self.assertEqual(compare_results(result(10, 4), result(10.5, 4)), [])
+        self.assertEqual(
+            compare_results(result(10, 4), result(12, 5, errors=1)),
+            [
+                "core:home: p95 10ms -> 12ms",
+                "core:home: queries 4 -> 5",
+                "core:home: errors 0 -> 1",
+            ],
+        )
+
+
+def named_routes(patterns=None, namespace=None):
+    """Yield (view name, pattern) for every named route of the URLconf"""
+    for pattern in get_resolver().url_patterns if patterns is None else patterns:
+        if isinstance(pattern, URLResolver):
+            inner = pattern.namespace
+            if namespace and inner:
+                inner = f"{namespace}:{inner}"
+            yield from named_routes(pattern.url_patterns, inner or namespace)
+        elif pattern.name:
+            name = f"{namespace}:{pattern.name}" if namespace else pattern.name
+            yield name, pattern
+
+
+class RouteQueryBudgetTests(TestCase):
+    """Every named route renders within its query budget on a seeded catalogue"""
+
+    # Django's admin and dj-stripe's webhooks are third-party code
+    skipped_namespaces = ("admin:", "djstripe:")
+    query_strings = {
+        "core:search": {"q": "Product"},
+        "core:search_suggestions": {"q": "Pro"},
+        "products:get_variant_details": {"size": "L", "color": "Red"},
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        SiteSettings.load()
+        cls.categories = [
+            Category.objects.create(
+                name=f"Category {i}", slug=f"category-{i}", image="categories/c.png"
+            )
+            for i in range(3)
+        ]
+        cls.products = []
+        for i in range(30):
+            product = Product.objects.create(
+                name=f"Product {i}",
+                description="Description",
+                original_price="120.00",
+                selling_price="100.00",
+                category=cls.categories[i % 3],
+                stock=50,
+                stock_unit=Product.StockUnitChoices.UNIT,
+                top_featured=(i % 2 == 0),
+                sku=f"SKU-{i}",
+                slug=f"product-{i}",
+            )
+            for name in ("a", "b"):
+                ProductImage.objects.create(
+                    product=product, image=f"products/{i}-{name}.png"
+                )
+            cls.products.append(product)
+        cls.product = cls.products[0]
+        cls.variant = ProductVariant.objects.create(
+            product=cls.product,
+            size="L",
+            color="Red",
+            stock=5,
+            stock_unit=Product.StockUnitChoices.UNIT,
+            selling_price="110.00",
+            sku="SKU-0-L",
+        )
+        cls.offer = Offer.objects.create(
+            title="Weekend",
+            description="Description",
+            discount_value="10.00",
+            start_date=timezone.now() - timedelta(days=1),
+            end_date=timezone.now() + timedelta(days=1),
+        )
+        cls.offer.products.set(cls.products[:5])
+
+        cls.admin = User.objects.create_superuser(
+            email="admin@example.com", password="password", name="Admin", phone="1"
+        )
+        cls.customer = User.objects.create_user(
+            email="shopper@example.com", password="password", name="Shopper"
+        )
+        address = Address.objects.create(
+            user=cls.customer, phone="1", address="Street", city="Pune", postal_code="1"
+        )
+        cart = Cart.objects.create(user=cls.customer)
+        for product in cls.products[1:6]:
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+            Wishlist.objects.create(user=cls.customer, product=product)
+        for n in range(5):
+            cls.order = Order.objects.create(
+                user=cls.customer,
+                shipping_address=address,
+                order_number=f"ORD-{n}",
+                total_amount="200.00",
+            )
+            for product in cls.products[n : n + 3]:
+                OrderItem.objects.create(
+                    order=cls.order, product=product, quantity=2, price="100.00"
+                )
+
+    def route_kwargs(self, name, pattern):
+        objects = {
+            "order_id": self.order.id,
+            "order_number": self.order.order_number,
+            "product_id": self.product.id,
+            "image_id": self.product.images.first().id,
+            "variant_id": self.variant.id,
+            "offer_id": self.offer.id,
+            "category_id": self.categories[0].id,
+            "user_id": self.customer.id,
+            "file_format": "csv",
+            "slug": (
+                self.categories[0].slug if "category" in name else self.product.slug
+            ),
+        }
+        return {key: objects[key] for key in pattern.pattern.converters}
+
+    def visitor(self, name):
+        if name.startswith("users:admin"):
+            return self.admin
+        if name.startswith(("users:dashboard", "cart:", "orders:", "users:api")):
+            return self.customer
+        return None
+
+    def test_every_route_is_within_its_budget(self):
+        routes = [
+            (name, pattern)
+            for name, pattern in named_routes()
+            if not name.startswith(self.skipped_namespaces)
+        ]
+        # Routes that delete on GET go last
+        routes.sort(key=lambda route: "delete" in route[0])
+        self.assertGreater(len(routes), 50)
+
+        # Payment gateway keys live in dj-stripe's tables, not in the seed
+        stripe = mock.patch.object(
+            StripeMixin,
+            "get_stripe_context",
+            return_value={"stripe_publishable_key": "pk_test"},
+        )
+        with stripe:
+            for name, pattern in routes:
+                url = reverse(name, kwargs=self.route_kwargs(name, pattern))
+                params = dict(self.query_strings.get(name, {}))
+                if name == "products:get_variant_details":
+                    params["product_id"] = self.product.id
+                with self.subTest(route=name):
+                    # Budgets hold with cold caches (site data, cart summary,
+                    # wishlist count, cached pages)
+                    cache.clear()
+                    self.client.logout()
+                    user = self.visitor(name)
+                    if user:
+                        self.client.force_login(user)
+                    with count_queries() as counter:
+                        response = self.client.get(url, params)
+                    self.assertLess(response.status_code, 500)
+                    self.assertLessEqual(
+                        counter.queries, get_query_budget(name), response.status_code
+                    )
+
+    def test_checkout_flow_is_within_its_budget_with_cold_caches(self):
+        """
+        The route walk above only GETs; a shopper's checkout and order (and
+        its cancellation and revival) must fit their budgets as well
+        """
+        address = self.customer.addresses.get()
+        OrderItem.objects.create(
+            order=self.order,
+            product=self.product,
+            variant=self.variant,
+            quantity=1,
+            price="110.00",
+        )
+        update_status = (
+            "users:admin.orders.update_status",
+            {"order_id": self.order.id},
+        )
+        steps = [
+            ("core:home", {}, None),
+            ("cart:checkout", {}, None),
+            ("cart:place_order", {}, {"shipping_address": address.id}),
+            (*update_status, {"status": "cancelled"}),
+            (*update_status, {"status": "pending"}),
+        ]
+        stripe = mock.patch.object(
+            StripeMixin,
+            "get_stripe_context",
+            return_value={"stripe_publishable_key": "pk_test"},
+        )
+        with stripe:
+            for name, kwargs, data in steps:
+                with self.subTest(route=name, data=data):
+                    cache.clear()
+                    self.client.force_login(self.visitor(name) or self.customer)
+                    url = reverse(name, kwargs=kwargs)
+                    with count_queries() as counter:
+                        if data is None:
+                            response = self.client.get(url)
+                        else:
+                            response = self.client.post(url, data)
+                    self.assertLess(response.status_code, 400)
+                    self.assertLessEqual(counter.queries, get_query_budget(name))
+        self.assertEqual(self.customer.orders.count(), 6)
+
+    def test_payment_routes_are_within_their_budgets(self):
+        """
+        Paying with Stripe or Razorpay reserves the cart's stock and places
+        its order; the gateways are mocked, the rest runs for real
+        """
+        address = self.customer.addresses.get()
+        cart = self.customer.cart
+        lines = list(cart.items.values_list("product_id", "quantity"))
+        steps = [
+            (
+                "cart:create_payment_intent",
+                {"payment_method_id": "pm_1", "shipping_address": address.id},
+            ),
+            ("cart:create_razorpay_order", {"options": {"amount": 550}}),
+            (
+                "cart:verify_razorpay_payment",
+                {
+                    "order_id": "order_1",
+                    "payment_id": "pay_1",
+                    "signature": "signature",
+                    "shipping_address": address.id,
+                },
+            ),
+        ]
+        self.client.force_login(self.customer)
+        with ExitStack() as stack:
+            stack.enter_context(mock.patch.object(PaymentIntentView, "setup_stripe"))
+            stripe = stack.enter_context(mock.patch("cart.views.stripe"))
+            razorpay = stack.enter_context(mock.patch("cart.views.client"))
+            stripe.PaymentIntent.create.return_value = mock.Mock(
+                status="succeeded", id="pi_1"
+            )
+            razorpay.order.create.return_value = {"id": "order_1"}
+            for name, data in steps:
+                with self.subTest(route=name):
+                    for product_id, quantity in lines:
+                        CartItem.objects.get_or_create(
+                            cart=cart, product_id=product_id, quantity=quantity
+                        )
+                    cache.clear()
+                    # As for the first order of the day, which reserves a
+                    # block of order numbers
+                    cold = mock.patch.object(generate_order_number, "day", None)
+                    with cold, count_queries() as counter:
+                        response = self.client.post(
+                            reverse(name), data, content_type="application/json"
+                        )
+                    self.assertEqual(response.status_code, 200, response.content)
+                    self.assertLessEqual(counter.queries, get_query_budget(name))
+        self.assertEqual(self.customer.orders.count(), 7)
+
+    def test_middleware_logs_requests_over_budget(self):
+        cache.clear()  # so the page has site data to load
+        with mock.patch.dict(query_budget.QUERY_BUDGETS, {"core:about": 0}):
+            with self.assertLogs("core.query_budget", "WARNING") as logs:
+                self.client.get(reverse("core:about"))
+        record = logs.records[0]
+        self.assertEqual(record.url_name, "core:about")
+        self.assertEqual(record.budget, 0)
+        self.assertGreater(record.queries, 0)
+        self.assertGreaterEqual(record.db_time_ms, 0)
@@ -0,0 +1,29 @@
+"""
+Transactions that read rows and then write them.
+
+Databases with row locks get them from select_for_update(). SQLite has
+none: a transaction that reads before it writes fails with "database is
+locked" when another one wrote in between, instead of waiting. There
+write_transaction() starts with a write that changes nothing, so SQLite
+takes its write lock before anything is read, as BEGIN IMMEDIATE would, and
+concurrent writers wait their turn.
+"""
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+from django.db.models import F
+
+
+@contextmanager
+def write_transaction(model, savepoint=True):
+    """
+    transaction.atomic() that, when it opens a new transaction on a database
+    without SELECT ... FOR UPDATE, first takes the write lock with a no-op
+    UPDATE of model's table
+    """
+    outermost = not connection.in_atomic_block
+    with transaction.atomic(savepoint=savepoint):
+        if outermost and not connection.features.has_select_for_update:
+            pk = model._meta.pk.attname
+            model.objects.filter(pk__isnull=True).update(**{pk: F(pk)})
+        yield
@@ -9,6 +9,7 @@ app_name = 'core'
 urlpatterns = [
     path('', views.index, name='home'),
     path('search/', views.search_view, name='search'),
+    path('search/suggest/', views.search_suggestions, name='search_suggestions'),
     path('about/', views.AboutView.as_view(), name='about'),
     path('contact/', views.ContactView.as_view(), name='contact'),
     path('terms/', views.TermsView.as_view(), name='terms'),
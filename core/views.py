@@ -1,50 +1,154 @@
-from django.shortcuts import render
+from urllib.parse import urlencode
+
+from django.core.paginator import Paginator
+from django.http import JsonResponse
+from django.shortcuts import redirect, render
+from django.views.decorators.http import require_GET
 from django.views.generic import TemplateView
-from django.db.models import Exists, OuterRef
+from django.db.models import Exists, OuterRef, F, Window
+from django.db.models.functions import RowNumber
 from django.db import models
+from django.urls import reverse
 
+from categories.models import Category
+from products import autocomplete
 from products.models import Product
+from products.search import search_products
 from wishlist.models import Wishlist
 
+# Home page feed limits, keeping the page bounded regardless of catalogue size
+HOME_SECTION_SIZE = 12
+HOME_CATEGORY_RAILS = 4
+
+SEARCH_PAGE_SIZE = 20
+SUGGESTION_LIMIT = 8
+MAX_SUGGESTION_LIMIT = 20
 
-def index(request):
-    products = Product.objects.all()
 
-    if request.user.is_authenticated:
-        # Annotate products with wishlist status for the current user
-        products = products.annotate(
+def annotate_wishlisted(queryset, user):
+    """Annotate products with wishlist status for the given user"""
+    if user.is_authenticated:
+        return queryset.annotate(
             is_wishlisted=Exists(
-                Wishlist.objects.filter(user=request.user, product=OuterRef("pk"))
+                Wishlist.objects.filter(user=user, product=OuterRef("pk"))
             )
         )
-    else:
-        # For unauthenticated users, set is_wishlisted to False
-        products = products.annotate(
-            is_wishlisted=models.Value(False, output_field=models.BooleanField())
+    # For unauthenticated users, set is_wishlisted to False
+    return queryset.annotate(
+        is_wishlisted=models.Value(False, output_field=models.BooleanField())
+    )
+
+
+def get_home_sections(user):
+    """
+    Build the curated home page sections (featured, new arrivals and one rail
+    per category). Each section is capped at HOME_SECTION_SIZE products and
+    the whole feed runs a fixed number of queries. Cards render from the
+    denormalized Product.thumbnail column, so no images are fetched.
+    """
+    products = annotate_wishlisted(
+        Product.objects.filter(is_active=True).select_related("category"), user
+    )
+
+    featured = list(
+        products.filter(top_featured=True).order_by("-created")[:HOME_SECTION_SIZE]
+    )
+    new_arrivals = list(products.order_by("-created")[:HOME_SECTION_SIZE])
+
+    rail_categories = list(
+        Category.objects.filter(status=Category.StatusChoices.ACTIVE).order_by(
+            "name"
+        )[:HOME_CATEGORY_RAILS]
+    )
+    # Top N newest products per category in a single windowed query
+    rail_products = products.filter(category__in=rail_categories).annotate(
+        rail_rank=Window(
+            RowNumber(),
+            partition_by=F("category_id"),
+            order_by=[F("created").desc(), F("id").desc()],
         )
+    ).filter(rail_rank__lte=HOME_SECTION_SIZE).order_by("category_id", "rail_rank")
+
+    products_by_category = {category.id: [] for category in rail_categories}
+    for product in rail_products:
+        products_by_category[product.category_id].append(product)
+
+    sections = [
+        {
+            "subtitle": "Top Picks",
+            "title": "Featured products",
+            "url": reverse("products:featured"),
+            "products": featured,
+        },
+        {
+            "subtitle": "For You",
+            "title": "Added new products",
+            "url": reverse("products:index"),
+            "products": new_arrivals,
+        },
+    ]
+    for category in rail_categories:
+        sections.append(
+            {
+                "subtitle": "Shop By Category",
+                "title": category.name,
+                "url": reverse("products:category", args=[category.slug]),
+                "products": products_by_category[category.id],
+            }
+        )
+    return sections
+
 
+def index(request):
     context = {
-        "products": products,
+        "sections": get_home_sections(request.user),
     }
     return render(request, "index.html", context)
 
 def search_view(request):
     if request.method == "POST":
-        query = request.POST.get("query", "").strip()  # Get the search query from the form
-        if query:
-            # Perform a search on the relevant models (e.g., Product)
-            results = Product.objects.filter(name__icontains=query)  # Adjust as needed
+        # Legacy form posts are redirected so results pages are linkable
+        query = request.POST.get("query", "").strip()
+        return redirect(f"{reverse('core:search')}?{urlencode({'query': query})}")
+
+    query = request.GET.get("query", "").strip()
+    products = []
+    if query:
+        results = search_products(
+            query, annotate_wishlisted(Product.objects.all(), request.user)
+        )
+        paginator = Paginator(results, SEARCH_PAGE_SIZE)
+        products = paginator.get_page(request.GET.get("page", 1))
+
+    return render(request, 'search.html', {
+        'query': query,
+        'products': products,
+        'title': f'Search results for "{query}"' if query else "Search",
+    })
+
+
+@require_GET
+def search_suggestions(request):
+    """Autocomplete for the header search box, served from memory"""
+    query = request.GET.get("q", "")
+    try:
+        limit = min(int(request.GET.get("limit", SUGGESTION_LIMIT)), MAX_SUGGESTION_LIMIT)
+    except ValueError:
+        limit = SUGGESTION_LIMIT
+
+    suggestions = []
+    for suggestion in autocomplete.prefix_index.suggest(query, limit):
+        if suggestion["kind"] == "product":
+            url = reverse("products:detail", args=[suggestion["slug"]])
+        elif suggestion["kind"] == "category":
+            url = reverse("products:category", args=[suggestion["slug"]])
         else:
-            results = []
-
-        # Render the search results
-        return render(request, 'search.html', {
-            'query': query,
-            'products': results,
-        })
-    else:
-        # Redirect to home or an error page if accessed via GET
-        return render(request, 'search.html')
+            url = f"{reverse('core:search')}?{urlencode({'query': suggestion['label']})}"
+        suggestions.append(
+            {"kind": suggestion["kind"], "label": suggestion["label"], "url": url}
+        )
+
+    return JsonResponse({"query": query, "suggestions": suggestions})
 
 
 class AboutView(TemplateView):
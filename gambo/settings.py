@@ -24,11 +24,13 @@ INSTALLED_APPS = [
     "rest_framework",
     "orders",
     "wishlist",
+    "inventory",
     "offers",
     "djstripe",
 ]
 
 MIDDLEWARE = [
+    "core.query_budget.QueryBudgetMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -36,7 +38,6 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    "users.middleware.WishlistCountMiddleware",
 ]
 
 CSRF_TRUSTED_ORIGINS = [
@@ -68,6 +69,9 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # A file, not the shared-cache in-memory database, whose table locks
+        # fail at once instead of waiting for the concurrency tests' writers
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
     }
 }
 
@@ -110,6 +114,9 @@ STATICFILES_DIRS = [
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Order snapshots for the admin reports (see orders.analytics)
+ANALYTICS_ROOT = BASE_DIR / "analytics"
+
 AUTH_USER_MODEL = "users.User"
 
 LOGIN_URL = "/users/login/"
@@ -0,0 +1,9 @@
+from django.contrib import admin
+from .models import StockReservation
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ['cart', 'product', 'variant', 'quantity', 'expires_at']
+    list_filter = ['expires_at']
+    search_fields = ['product__name', 'cart__user__email']
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from inventory.models import StockReservation
+from inventory.stock import release_reservations
+
+
+class Command(BaseCommand):
+    help = "Hand the stock of expired checkout reservations back to products"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of reservations released per transaction",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        now = timezone.now()
+
+        released = 0
+        while True:
+            batch = list(
+                StockReservation.objects.filter(expires_at__lte=now)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not batch:
+                break
+            released += release_reservations(
+                StockReservation.objects.filter(pk__in=batch)
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Released {released} reservations"))
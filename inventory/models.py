@@ -0,0 +1,27 @@
+from django.db import models
+from django_extensions.db.models import TimeStampedModel
+
+from cart.models import Cart
+from products.models import Product, ProductVariant
+
+
+class StockReservation(TimeStampedModel):
+    """Stock taken out of Product/ProductVariant.stock for a cart in checkout"""
+
+    cart = models.ForeignKey(
+        Cart, on_delete=models.CASCADE, related_name="reservations"
+    )
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    variant = models.ForeignKey(
+        ProductVariant, on_delete=models.CASCADE, null=True, blank=True
+    )
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = "Stock Reservation"
+        verbose_name_plural = "Stock Reservations"
+
+    def __str__(self):
+        variant_info = f" ({self.variant})" if self.variant else ""
+        return f"{self.quantity} x {self.product}{variant_info} for cart {self.cart_id}"
@@ -0,0 +1,12 @@
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from cart.models import Cart
+
+from .stock import release_reservations
+
+
+@receiver(pre_delete, sender=Cart)
+def release_cart_reservations(sender, instance, **kwargs):
+    # The holds would go with the cart, keeping their stock out of sale
+    release_reservations(instance.reservations.all())
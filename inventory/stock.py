@@ -0,0 +1,207 @@
+"""
+Stock keeping.
+
+Stock is only ever taken with a conditional, batched UPDATE per table
+(SET stock = stock - n WHERE stock >= n), so concurrent checkouts can't
+oversell. Where the database supports it the rows are locked in primary key
+order first, which makes concurrent orders over the same products queue up
+instead of deadlocking. SQLite has no row locks, and a transaction that reads
+before it writes fails with "database is locked" when another one wrote in
+between; there stock_transaction() takes the write lock up front instead.
+
+Carts being paid for hold their lines with StockReservation rows that expire
+after STOCK_RESERVATION_TTL; expired holds are handed back by the
+release_expired_reservations command, and the holds of a deleted cart when
+it goes (inventory.signals).
+
+Stock is changed with UPDATE statements, which send no signals, so cached
+catalogue pages showing a product are purged here when it sells out or
+stock comes back.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, F, Q, When
+from django.utils import timezone
+
+from core.page_cache import purge_page_tags_on_commit
+from core.transactions import write_transaction
+from products.models import Product, ProductVariant
+
+from .models import StockReservation
+
+RESERVATION_TTL = getattr(settings, "STOCK_RESERVATION_TTL", timedelta(minutes=15))
+
+
+class OutOfStockError(Exception):
+    pass
+
+
+def split_quantities(lines):
+    """
+    Sum (product id, variant id, quantity) lines into {pk: quantity} for
+    products and for variants; variant lines only count against the variant.
+    """
+    products, variants = {}, {}
+    for product_id, variant_id, quantity in lines:
+        if variant_id:
+            variants[variant_id] = variants.get(variant_id, 0) + quantity
+        else:
+            products[product_id] = products.get(product_id, 0) + quantity
+    return products, variants
+
+
+def stock_transaction(savepoint=True):
+    """transaction.atomic() for changing stock, see core.transactions"""
+    return write_transaction(StockReservation, savepoint=savepoint)
+
+
+def locked_rows(model, pks):
+    rows = model.objects.filter(pk__in=pks).order_by("pk")
+    if connection.features.has_select_for_update:
+        rows = rows.select_for_update()
+    return rows
+
+
+def stock_update(quantities, sign):
+    return Case(
+        *[
+            When(pk=pk, then=F("stock") + sign * quantity)
+            for pk, quantity in quantities.items()
+        ],
+        default=F("stock"),
+    )
+
+
+def take(model, quantities):
+    if not quantities:
+        return
+    rows = locked_rows(model, quantities)
+    if model is ProductVariant:
+        rows = rows.select_related("product")
+    sold_out = []
+    for item in rows:
+        if item.stock < quantities[item.pk]:
+            raise OutOfStockError(f"Only {item.stock} of {item} left in stock")
+        if item.stock == quantities[item.pk]:
+            sold_out.append(item.pk)
+
+    enough_stock = Q()
+    for pk, quantity in quantities.items():
+        enough_stock |= Q(pk=pk, stock__gte=quantity)
+    updated = model.objects.filter(enough_stock).update(
+        stock=stock_update(quantities, -1)
+    )
+    if updated != len(quantities):
+        raise OutOfStockError("Some items in your cart are no longer in stock")
+    if model is Product and sold_out:
+        purge_page_tags_on_commit(*(f"product:{pk}" for pk in sold_out))
+
+
+def give_back(model, quantities):
+    if not quantities:
+        return
+    if connection.features.has_select_for_update:
+        list(locked_rows(model, quantities).values_list("pk", flat=True))
+    model.objects.filter(pk__in=quantities).update(stock=stock_update(quantities, 1))
+    if model is Product:
+        purge_page_tags_on_commit(*(f"product:{pk}" for pk in quantities))
+
+
+@stock_transaction(savepoint=False)
+def take_stock(lines):
+    """
+    Take (product id, variant id, quantity) lines out of stock, all or
+    nothing. Raises OutOfStockError when any of them is short.
+    """
+    products, variants = split_quantities(lines)
+    take(Product, products)
+    take(ProductVariant, variants)
+
+
+@stock_transaction(savepoint=False)
+def return_stock(lines):
+    products, variants = split_quantities(lines)
+    give_back(Product, products)
+    give_back(ProductVariant, variants)
+
+
+def held_rows(reservations):
+    """Lock reservations, returning (id, product id, variant id, quantity)"""
+    return list(
+        reservations.select_for_update().values_list(
+            "id", "product_id", "variant_id", "quantity"
+        )
+    )
+
+
+def holds_match(held, lines):
+    return bool(held) and Counter(row[1:] for row in held) == Counter(lines)
+
+
+def release_rows(held):
+    if held:
+        StockReservation.objects.filter(id__in=[row[0] for row in held]).delete()
+        return_stock([row[1:] for row in held])
+
+
+@stock_transaction(savepoint=False)
+def release_reservations(reservations):
+    """Delete a queryset of reservations and hand their stock back"""
+    held = held_rows(reservations)
+    release_rows(held)
+    return len(held)
+
+
+@stock_transaction()
+def reserve_cart(cart, ttl=RESERVATION_TTL):
+    """
+    Hold stock for every line of a cart going to payment, replacing any
+    earlier holds of that cart. Raises OutOfStockError when a line is short.
+    """
+    # Reuses the cart's prefetched lines when the caller has them
+    lines = [
+        (item.product_id, item.variant_id, item.quantity) for item in cart.items.all()
+    ]
+    expires_at = timezone.now() + ttl
+    held = held_rows(cart.reservations.all())
+    if holds_match(held, lines):
+        # Retrying payment with an unchanged cart only extends the holds,
+        # without moving stock (and purging the product pages) twice
+        StockReservation.objects.filter(id__in=[row[0] for row in held]).update(
+            expires_at=expires_at
+        )
+        return
+    release_rows(held)
+    take_stock(lines)
+    StockReservation.objects.bulk_create(
+        [
+            StockReservation(
+                cart=cart,
+                product_id=product_id,
+                variant_id=variant_id,
+                quantity=quantity,
+                expires_at=expires_at,
+            )
+            for product_id, variant_id, quantity in lines
+        ]
+    )
+
+
+
+@stock_transaction(savepoint=False)
+def claim_stock(reservations, lines):
+    """
+    Take (product id, variant id, quantity) lines out of stock for good,
+    like take_stock. Holds in reservations that cover exactly those lines are
+    already out of stock and are just deleted; otherwise they are handed back
+    and the lines taken afresh.
+    """
+    held = held_rows(reservations)
+    if holds_match(held, lines):
+        StockReservation.objects.filter(id__in=[row[0] for row in held]).delete()
+        return
+    release_rows(held)
+    take_stock(lines)
@@ -0,0 +1,165 @@
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from cart.models import Cart, CartItem
+from cart.views import CheckoutView
+from categories.models import Category
+from orders.models import Order
+from orders.placement import place_order_from_cart
+from products.models import Product
+from users.models import Address, User
+
+from .models import StockReservation
+from .stock import OutOfStockError, reserve_cart
+
+
+def create_product(stock):
+    category = Category.objects.create(
+        name="Fruits", slug="fruits", image="categories/fruits.png"
+    )
+    return Product.objects.create(
+        name="Apple",
+        description="Description",
+        original_price="12.00",
+        selling_price="10.00",
+        category=category,
+        stock=stock,
+        stock_unit=Product.StockUnitChoices.UNIT,
+        sku="SKU-APPLE",
+        slug="apple",
+    )
+
+
+def create_shopper(index, product, quantity):
+    user = User.objects.create_user(
+        email=f"shopper{index}@example.com", password="password"
+    )
+    address = Address.objects.create(
+        user=user, phone="9999999999", address="Street", city="Pune", postal_code="1"
+    )
+    cart = Cart.objects.create(user=user)
+    CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+    return user, address, cart
+
+
+class ReservationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = create_product(stock=5)
+        _, _, self.cart = create_shopper(1, self.product, 3)
+
+    def stock(self):
+        self.product.refresh_from_db()
+        return self.product.stock
+
+    def test_reservations_hold_stock_until_they_expire(self):
+        reserve_cart(self.cart)
+        self.assertEqual(self.stock(), 2)
+
+        # Re-entering checkout renews the hold instead of adding to it
+        expires_at = StockReservation.objects.get().expires_at
+        reserve_cart(self.cart)
+        self.assertEqual(self.stock(), 2)
+        self.assertGreater(StockReservation.objects.get().expires_at, expires_at)
+
+        CartItem.objects.filter(cart=self.cart).update(quantity=4)
+        reserve_cart(Cart.objects.get(pk=self.cart.pk))
+        self.assertEqual(self.stock(), 1)
+        CartItem.objects.filter(cart=self.cart).update(quantity=3)
+        reserve_cart(Cart.objects.get(pk=self.cart.pk))
+        self.assertEqual(self.stock(), 2)
+        self.assertEqual(StockReservation.objects.count(), 1)
+
+        _, _, other_cart = create_shopper(2, self.product, 3)
+        with self.assertRaisesMessage(OutOfStockError, "Only 2 of Apple"):
+            reserve_cart(other_cart)
+
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(1))
+        out = StringIO()
+        call_command("release_expired_reservations", batch_size=1, stdout=out)
+        self.assertIn("Released 1 reservations", out.getvalue())
+        self.assertEqual(self.stock(), 5)
+        reserve_cart(other_cart)
+        self.assertEqual(self.stock(), 2)
+
+    def test_deleting_a_cart_releases_its_holds(self):
+        reserve_cart(self.cart)
+        self.assertEqual(self.stock(), 2)
+
+        self.cart.user.delete()
+        self.assertEqual(self.stock(), 5)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_viewing_checkout_holds_nothing(self):
+        self.client.force_login(self.cart.user)
+        with mock.patch.object(CheckoutView, "get_stripe_context", return_value={}):
+            response = self.client.get(reverse("cart:checkout"))
+
+        self.assertEqual(response.context["cart"], self.cart)
+        self.assertEqual(self.stock(), 5)
+        self.assertFalse(StockReservation.objects.exists())
+
+
+class FlashSaleStressTests(TransactionTestCase):
+    workers = 8
+    stock = 13
+    quantity = 3
+
+    def setUp(self):
+        cache.clear()
+        self.product = create_product(stock=self.stock)
+        self.shoppers = [
+            create_shopper(index, self.product, self.quantity)
+            for index in range(self.workers)
+        ]
+
+    def checkout(self, user, address, cart):
+        """Reserve at checkout then place the order, like a shopper would"""
+        reserve_cart(cart)
+        return place_order_from_cart(
+            cart, user=user, shipping_address=address, order_number=f"ORD-{user.pk}"
+        )
+
+    def test_concurrent_checkouts_never_oversell(self):
+        barrier = threading.Barrier(self.workers)
+        outcomes, errors = [], []
+
+        def shop(shopper):
+            try:
+                barrier.wait()
+                self.checkout(*shopper)
+                outcomes.append("ordered")
+            except OutOfStockError:
+                outcomes.append("sold out")
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=shop, args=(shopper,), daemon=True)
+            for shopper in self.shoppers
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=60)
+
+        self.assertFalse(any(thread.is_alive() for thread in threads), "deadlocked")
+        self.assertEqual(errors, [])
+        winners = self.stock // self.quantity
+        self.assertEqual(outcomes.count("ordered"), winners)
+        self.assertEqual(outcomes.count("sold out"), self.workers - winners)
+        self.assertEqual(Order.objects.count(), winners)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, self.stock - winners * self.quantity)
+        self.assertFalse(StockReservation.objects.exists())
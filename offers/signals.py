@@ -0,0 +1,18 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core.page_cache import purge_page_tags_on_commit
+
+from .models import Offer
+
+
+@receiver(post_save, sender=Offer)
+@receiver(post_delete, sender=Offer)
+def purge_offer_pages(sender, instance, **kwargs):
+    purge_page_tags_on_commit("offers", f"offer:{instance.pk}")
+
+
+@receiver(m2m_changed, sender=Offer.products.through)
+def purge_offer_product_pages(sender, action, **kwargs):
+    if action.startswith("post_"):
+        purge_page_tags_on_commit("offers")
@@ -2,7 +2,10 @@ from django.views.generic import ListView
 from .models import Offer
 from django.utils import timezone
 
-class OfferListView(ListView):
+from core.page_cache import CachedPageMixin
+
+
+class OfferListView(CachedPageMixin, ListView):
     template_name = 'offers/list.html'
     context_object_name = 'offers'
 
@@ -11,4 +14,15 @@ class OfferListView(ListView):
             is_active=True,
             start_date__lte=timezone.now(),
             end_date__gte=timezone.now()
-        ).select_related() 
\ No newline at end of file
+        ).select_related()
+
+    def get_page_tags(self, context):
+        offers = context["object_list"]
+        product_ids = Offer.products.through.objects.filter(
+            offer__in=offers
+        ).values_list("product_id", flat=True)
+        return [
+            "offers",
+            *(f"offer:{offer.pk}" for offer in offers),
+            *(f"product:{pk}" for pk in set(product_ids)),
+        ]
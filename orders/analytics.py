@@ -0,0 +1,219 @@
+"""
+Columnar snapshots of delivered orders for the admin reports.
+
+take_snapshot() copies every delivered order line and order into NumPy
+arrays, one .npy file per column, sorted by day:
+
+    lines:  day, product, user, quantity, price (in cents)
+    orders: day, user, total (in cents)
+
+Reports memory-map the latest snapshot and answer a date range with two
+binary searches and np.bincount over the slice between them, without
+touching the order tables. Days count from 1970-01-01 in the current time
+zone, so ranges are whole local days like TruncDate.
+
+Snapshots are only as fresh as the last snapshot_order_analytics run;
+schedule it alongside rebuild_search_index.
+"""
+import json
+import os
+import shutil
+from datetime import date, datetime
+from decimal import Decimal
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Order, OrderItem
+from .rollups import REVENUE_STATUS
+
+EPOCH = date(1970, 1, 1).toordinal()
+SNAPSHOT_CHUNK_SIZE = 100_000
+LINE_COLUMNS = {
+    "day": np.int32,
+    "product": np.int32,
+    "user": np.int32,
+    "quantity": np.int32,
+    "price": np.int64,
+}
+ORDER_COLUMNS = {
+    "day": np.int32,
+    "user": np.int32,
+    "total": np.int64,
+}
+# Snapshots memory-mapped by this process, by directory
+loaded_snapshots = {}
+
+
+def analytics_root():
+    return Path(getattr(settings, "ANALYTICS_ROOT", settings.BASE_DIR / "analytics"))
+
+
+def day_number(day):
+    return day.toordinal() - EPOCH
+
+
+def cents(amount):
+    return int(round(amount * 100))
+
+
+def to_amount(cents):
+    """Decimal amount of a whole number of cents"""
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def read_columns(rows, dtypes, convert):
+    """Columns of rows as arrays, filled SNAPSHOT_CHUNK_SIZE rows at a time"""
+    chunks = {name: [] for name in dtypes}
+    rows = iter(rows)
+    while chunk := list(islice(rows, SNAPSHOT_CHUNK_SIZE)):
+        for (name, dtype), values in zip(dtypes.items(), zip(*map(convert, chunk))):
+            chunks[name].append(np.fromiter(values, dtype=dtype, count=len(chunk)))
+    columns = {
+        name: np.concatenate(chunks[name]) if chunks[name] else np.empty(0, dtype)
+        for name, dtype in dtypes.items()
+    }
+    by_day = np.argsort(columns["day"], kind="stable")
+    return {name: column[by_day] for name, column in columns.items()}
+
+
+def take_snapshot(root=None):
+    """Write a snapshot of delivered orders and make it the current one"""
+    root = Path(root or analytics_root())
+    taken = timezone.now()
+    lines = (
+        OrderItem.objects.filter(order__status=REVENUE_STATUS)
+        .annotate(day=TruncDate("order__created"))
+        .values_list("day", "product_id", "order__user_id", "quantity", "price")
+        .order_by()
+    )
+    orders = (
+        Order.objects.filter(status=REVENUE_STATUS)
+        .annotate(day=TruncDate("created"))
+        .values_list("day", "user_id", "total_amount")
+        .order_by()
+    )
+    tables = {
+        "lines": read_columns(
+            lines.iterator(chunk_size=SNAPSHOT_CHUNK_SIZE),
+            LINE_COLUMNS,
+            lambda row: (day_number(row[0]), *row[1:4], cents(row[4])),
+        ),
+        "orders": read_columns(
+            orders.iterator(chunk_size=SNAPSHOT_CHUNK_SIZE),
+            ORDER_COLUMNS,
+            lambda row: (day_number(row[0]), row[1], cents(row[2])),
+        ),
+    }
+
+    name = taken.strftime("%Y%m%d-%H%M%S-%f")
+    path = root / name
+    path.mkdir(parents=True)
+    for table, columns in tables.items():
+        for column, values in columns.items():
+            np.save(path / f"{table}-{column}.npy", values)
+    (path / "meta.json").write_text(
+        json.dumps(
+            {
+                "taken": taken.isoformat(),
+                **{table: len(columns["day"]) for table, columns in tables.items()},
+            }
+        )
+    )
+
+    # Readers follow CURRENT, which is replaced in one step
+    (root / "CURRENT.tmp").write_text(name)
+    os.replace(root / "CURRENT.tmp", root / "CURRENT")
+    for old in root.iterdir():
+        if old.is_dir() and old.name != name:
+            shutil.rmtree(old, ignore_errors=True)
+    return load_snapshot(root)
+
+
+def load_snapshot(root=None):
+    """The current snapshot, or None before the first one is taken"""
+    root = Path(root or analytics_root())
+    try:
+        path = root / (root / "CURRENT").read_text().strip()
+    except FileNotFoundError:
+        return None
+    if path not in loaded_snapshots:
+        loaded_snapshots.clear()
+        loaded_snapshots[path] = OrderSnapshot(path)
+    return loaded_snapshots[path]
+
+
+class OrderSnapshot:
+    def __init__(self, path):
+        meta = json.loads((path / "meta.json").read_text())
+        self.taken = datetime.fromisoformat(meta["taken"])
+        self.lines = self.load(path, "lines", LINE_COLUMNS, meta["lines"])
+        self.orders = self.load(path, "orders", ORDER_COLUMNS, meta["orders"])
+
+    @staticmethod
+    def load(path, table, dtypes, length):
+        if not length:
+            # Empty files can't be memory-mapped
+            return {name: np.empty(0, dtype) for name, dtype in dtypes.items()}
+        return {
+            name: np.load(path / f"{table}-{name}.npy", mmap_mode="r")
+            for name in dtypes
+        }
+
+    @staticmethod
+    def between(table, start=None, end=None):
+        """The rows of table from day start to day end, both included"""
+        days = table["day"]
+        low = 0 if start is None else np.searchsorted(days, day_number(start))
+        high = (
+            len(days)
+            if end is None
+            else np.searchsorted(days, day_number(end), side="right")
+        )
+        return {name: column[low:high] for name, column in table.items()}
+
+    @staticmethod
+    def totals(keys, *weights):
+        """Keys present in the slice and their count and weight sums"""
+        counts = np.bincount(keys)
+        present = np.flatnonzero(counts)
+        sums = [np.bincount(keys, weights=weight)[present] for weight in weights]
+        return present, counts[present], sums
+
+    def product_sales(self, start=None, end=None):
+        """
+        (product id, quantity, sales in cents) sold between two days, by
+        quantity sold
+        """
+        lines = self.between(self.lines, start, end)
+        quantity = lines["quantity"].astype(np.int64)
+        products, _, (sold, sales) = self.totals(
+            lines["product"], quantity, quantity * lines["price"]
+        )
+        order = np.argsort(-sold, kind="stable")
+        return list(
+            zip(
+                products[order].tolist(),
+                np.rint(sold[order]).astype(np.int64).tolist(),
+                np.rint(sales[order]).astype(np.int64).tolist(),
+            )
+        )
+
+    def customer_sales(self, start=None, end=None):
+        """
+        (user id, orders, spent in cents) between two days, by amount spent
+        """
+        orders = self.between(self.orders, start, end)
+        users, counts, (spent,) = self.totals(orders["user"], orders["total"])
+        order = np.argsort(-spent, kind="stable")
+        return list(
+            zip(
+                users[order].tolist(),
+                counts[order].tolist(),
+                np.rint(spent[order]).astype(np.int64).tolist(),
+            )
+        )
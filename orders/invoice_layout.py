@@ -0,0 +1,146 @@
+"""
+Invoice layout with ReportLab platypus.
+
+The invoice is a story of flowables on a letter page template: order and
+customer details, then the items as a LongTable that breaks across pages
+and repeats its header row. Every page gets the footer with its number.
+
+Styles are built once at import. Invoices use the built-in Helvetica,
+which needs no embedding but has no rupee sign; set INVOICE_FONTS to
+{"regular": path, "bold": path} of TrueType files that have one (e.g.
+DejaVu Sans) to embed those instead. They are registered once per process,
+the invoice worker processes included.
+"""
+from functools import lru_cache
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import (
+    LongTable,
+    Paragraph,
+    SimpleDocTemplate,
+    Spacer,
+    TableStyle,
+)
+
+INVOICE_FONTS = getattr(settings, "INVOICE_FONTS", None)
+if INVOICE_FONTS:
+    FONT, BOLD_FONT = "Invoice", "Invoice-Bold"
+else:
+    FONT, BOLD_FONT = "Helvetica", "Helvetica-Bold"
+MARGIN = 50
+COLUMN_WIDTHS = [250, 100, 100, 100]
+# Item names wider than this are wrapped, over the cell's default padding
+ITEM_NAME_WIDTH = COLUMN_WIDTHS[0] - 12
+ITEM_FONT_SIZE = 9
+# Rows after the items: subtotal, delivery and grand total
+TOTAL_ROWS = 3
+
+TITLE_STYLE = ParagraphStyle(
+    "InvoiceTitle", fontName=BOLD_FONT, fontSize=16, leading=20, spaceAfter=10
+)
+HEADING_STYLE = ParagraphStyle(
+    "InvoiceHeading", fontName=FONT, fontSize=12, leading=15, spaceBefore=10
+)
+TEXT_STYLE = ParagraphStyle("InvoiceText", fontName=FONT, fontSize=10, leading=15)
+DETAIL_STYLE = ParagraphStyle("InvoiceDetail", parent=TEXT_STYLE, leftIndent=20)
+ITEM_STYLE = ParagraphStyle(
+    "InvoiceItem", fontName=FONT, fontSize=ITEM_FONT_SIZE, leading=11
+)
+TABLE_STYLE = TableStyle(
+    [
+        ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
+        ("FONTNAME", (0, 0), (-1, 0), BOLD_FONT),
+        ("FONTSIZE", (0, 0), (-1, 0), 10),
+        ("BOTTOMPADDING", (0, 0), (-1, 0), 12),
+        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+        ("ALIGN", (-1, 0), (-1, -1), "RIGHT"),
+        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+        ("BACKGROUND", (0, 1), (-1, -1), colors.white),
+        ("TEXTCOLOR", (0, 1), (-1, -1), colors.black),
+        ("FONTNAME", (0, 1), (-1, -1), FONT),
+        ("FONTSIZE", (0, 1), (-1, -1), ITEM_FONT_SIZE),
+        ("GRID", (0, 0), (-1, -TOTAL_ROWS - 1), 1, colors.black),
+        ("ALIGN", (-2, -TOTAL_ROWS), (-2, -1), "RIGHT"),
+        ("FONTNAME", (-2, -TOTAL_ROWS), (-1, -1), BOLD_FONT),
+        ("LINEABOVE", (-2, -1), (-1, -1), 1, colors.black),
+    ]
+)
+
+
+@lru_cache(maxsize=None)
+def register_invoice_fonts():
+    if INVOICE_FONTS:
+        pdfmetrics.registerFont(TTFont(FONT, INVOICE_FONTS["regular"]))
+        pdfmetrics.registerFont(TTFont(BOLD_FONT, INVOICE_FONTS["bold"]))
+        pdfmetrics.registerFontFamily(FONT, normal=FONT, bold=BOLD_FONT)
+
+
+def item_name(name):
+    """Names that fit their cell stay plain text, far cheaper to lay out"""
+    if stringWidth(name, FONT, ITEM_FONT_SIZE) <= ITEM_NAME_WIDTH:
+        return name
+    return Paragraph(escape(name), ITEM_STYLE)
+
+
+def draw_footer(canvas, document):
+    canvas.saveState()
+    canvas.setFont(FONT, 8)
+    canvas.drawString(MARGIN, MARGIN, document.footer)
+    canvas.drawRightString(letter[0] - MARGIN, MARGIN, f"Page {canvas.getPageNumber()}")
+    canvas.restoreState()
+
+
+def invoice_story(data):
+    """The flowables of an invoice, from orders.invoices.invoice_data()"""
+    rows = [
+        ["Item", "Price", "Quantity", "Total"],
+        *(
+            [item_name(name), price, quantity, total]
+            for name, price, quantity, total in data["items"]
+        ),
+        ["", "", "Subtotal:", data["subtotal"]],
+        ["", "", "Delivery:", data["delivery"]],
+        ["", "", "Grand Total:", data["grand_total"]],
+    ]
+    return [
+        Paragraph(f"Order Invoice #{escape(data['order_number'])}", TITLE_STYLE),
+        Paragraph(f"Date: {escape(data['date'])}", TEXT_STYLE),
+        Paragraph(f"Status: {escape(data['status'])}", TEXT_STYLE),
+        Paragraph("Customer Information:", HEADING_STYLE),
+        Paragraph(f"Name: {escape(data['name'])}", DETAIL_STYLE),
+        Paragraph(f"Email: {escape(data['email'])}", DETAIL_STYLE),
+        Paragraph("Shipping Address:", HEADING_STYLE),
+        *(Paragraph(escape(line), DETAIL_STYLE) for line in data["address"]),
+        Spacer(0, 20),
+        LongTable(rows, colWidths=COLUMN_WIDTHS, repeatRows=1, style=TABLE_STYLE),
+    ]
+
+
+def render_invoice(data):
+    """The PDF bytes of an invoice"""
+    register_invoice_fonts()
+    buffer = BytesIO()
+    document = SimpleDocTemplate(
+        buffer,
+        pagesize=letter,
+        leftMargin=MARGIN,
+        rightMargin=MARGIN,
+        topMargin=MARGIN,
+        bottomMargin=MARGIN + 20,
+        title=f"Order Invoice #{data['order_number']}",
+    )
+    document.footer = f"Generated on: {timezone.now().strftime('%d %b %Y %H:%M:%S')}"
+    document.build(
+        invoice_story(data), onFirstPage=draw_footer, onLaterPages=draw_footer
+    )
+    return buffer.getvalue()
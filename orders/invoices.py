@@ -0,0 +1,162 @@
+"""
+Order invoices as PDFs.
+
+Rendering (orders.invoice_layout) is CPU-bound ReportLab work, so it takes
+plain data (invoice_data()) and runs in a pool of worker processes. The invoices of
+delivered orders never change: they are rendered once and kept under
+MEDIA_ROOT/invoices, named after a hash of what they show, so changing the
+layout or the order simply gives a new file.
+
+Set INVOICE_WORKERS to the number of worker processes (default: one per
+CPU, 0 renders in the calling process).
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+from io import BytesIO
+from itertools import islice
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.utils import timezone
+
+from core.exports import ChunkBuffer
+
+from .invoice_layout import render_invoice
+from .models import Order
+
+# Bump when the invoice layout changes
+INVOICE_LAYOUT_VERSION = 2
+INVOICE_BATCH_SIZE = 100
+INVOICE_DIRECTORY = "invoices"
+
+
+def invoice_workers():
+    return getattr(settings, "INVOICE_WORKERS", os.cpu_count() or 1)
+
+
+@lru_cache(maxsize=None)
+def invoice_pool(workers):
+    # Spawned, not forked: the web server's threads and connections stay behind
+    return ProcessPoolExecutor(
+        workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=django.setup,
+    )
+
+
+def invoice_orders(start=None, end=None):
+    """Orders with everything an invoice shows, created between two days"""
+    orders = Order.objects.select_related(
+        "user", "shipping_address"
+    ).prefetch_related("items__product")
+    if start:
+        orders = orders.filter(
+            created__gte=timezone.make_aware(datetime.combine(start, time.min))
+        )
+    if end:
+        orders = orders.filter(
+            created__lt=timezone.make_aware(
+                datetime.combine(end + timedelta(days=1), time.min)
+            )
+        )
+    return orders.order_by("created", "id")
+
+
+def invoice_data(order):
+    return {
+        "order_number": order.order_number,
+        "date": order.created.strftime("%d %b %Y"),
+        "status": order.status.upper(),
+        "name": order.user.name,
+        "email": order.user.email,
+        "address": str(order.shipping_address).split("\n"),
+        "items": [
+            [
+                item.product.name,
+                f"₹{item.price}",
+                str(item.quantity),
+                f"₹{item.subtotal}",
+            ]
+            for item in order.items.all()
+        ],
+        "subtotal": f"₹{order.total_amount}",
+        "delivery": f"₹{order.delivery_charge or 0}",
+        "grand_total": f"₹{order.grand_total}",
+    }
+
+
+def render_invoices(datas):
+    """PDFs of several invoices, in order, rendered in parallel"""
+    workers = invoice_workers()
+    if not workers:
+        return map(render_invoice, datas)
+    chunksize = max(1, len(datas) // (workers * 4))
+    return invoice_pool(workers).map(render_invoice, datas, chunksize=chunksize)
+
+
+def stored_invoice_path(order, data):
+    """Where the invoice of a delivered order is kept, None for other orders"""
+    if order.status != Order.StatusChoices.DELIVERED:
+        return None
+    key = hashlib.sha256(
+        json.dumps([INVOICE_LAYOUT_VERSION, data], sort_keys=True).encode()
+    ).hexdigest()
+    return Path(settings.MEDIA_ROOT) / INVOICE_DIRECTORY / key[:2] / f"{key}.pdf"
+
+
+def store_invoice(path, pdf):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Written aside and moved in place, so readers never see half a file
+    with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as file:
+        file.write(pdf)
+    os.replace(file.name, path)
+
+
+def invoices(orders, batch_size=INVOICE_BATCH_SIZE):
+    """
+    (order, PDF bytes) for each order. The invoices of a batch that aren't
+    stored yet are rendered together in the pool.
+    """
+    orders = iter(orders)
+    while batch := list(islice(orders, batch_size)):
+        datas = [invoice_data(order) for order in batch]
+        paths = [stored_invoice_path(*pair) for pair in zip(batch, datas)]
+        pdfs = [path.read_bytes() if path and path.exists() else None for path in paths]
+        missing = [n for n, pdf in enumerate(pdfs) if pdf is None]
+        for n, pdf in zip(missing, render_invoices([datas[n] for n in missing])):
+            if paths[n]:
+                store_invoice(paths[n], pdf)
+            pdfs[n] = pdf
+        yield from zip(batch, pdfs)
+
+
+def invoice_file(order):
+    """An open file with the invoice of order, stored if it is delivered"""
+    data = invoice_data(order)
+    path = stored_invoice_path(order, data)
+    if path and path.exists():
+        return path.open("rb")
+    [pdf] = render_invoices([data])
+    if path is None:
+        return BytesIO(pdf)
+    store_invoice(path, pdf)
+    return path.open("rb")
+
+
+def stream_invoice_zip(orders):
+    """A zip archive of the invoices of orders, as it is written"""
+    buffer = ChunkBuffer()
+    # PDFs are compressed already
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        for order, pdf in invoices(orders):
+            archive.writestr(f"order_{order.order_number}.pdf", pdf)
+            yield buffer.take()
+    yield buffer.take()
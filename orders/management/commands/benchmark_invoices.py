@@ -0,0 +1,78 @@
+import re
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.invoice_layout import register_invoice_fonts, render_invoice
+from orders.invoices import invoice_pool
+
+PAGE = re.compile(rb"/Type /Page\b")
+
+
+def sample_invoice(lines):
+    """Invoice data of an order with the given number of lines"""
+    return {
+        "order_number": f"BENCH-{lines}",
+        "date": "01 Jan 2025",
+        "status": "DELIVERED",
+        "name": "Benchmark Customer",
+        "email": "benchmark@example.com",
+        "address": ["221B Baker Street", "London NW1 6XE"],
+        "items": [
+            [f"Benchmark product {n} with a fairly long name", "₹12.50", "3", "₹37.50"]
+            for n in range(lines)
+        ],
+        "subtotal": f"₹{37.5 * lines:.2f}",
+        "delivery": "₹50.00",
+        "grand_total": f"₹{37.5 * lines + 50:.2f}",
+    }
+
+
+class Command(BaseCommand):
+    help = "Measure how many invoices per second orders of different sizes render at"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lines",
+            type=int,
+            action="append",
+            help="Order lines per invoice (repeatable, default: 1, 50 and 500)",
+        )
+        parser.add_argument(
+            "--seconds",
+            type=float,
+            default=5,
+            help="Time to spend rendering each invoice size",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=0,
+            help="Render in this many worker processes (default: in this one)",
+        )
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        register_invoice_fonts()
+        self.stdout.write(
+            f"{'lines':>6}{'pages':>7}{'KB':>8}{'invoices/s':>12}{'ms each':>10}"
+        )
+        for lines in options["lines"] or [1, 50, 500]:
+            data = sample_invoice(lines)
+            pdf = render_invoice(data)  # warm up
+            rendered = 0
+            started = time.perf_counter()
+            while time.perf_counter() - started < options["seconds"]:
+                if workers:
+                    batch = [data] * workers * 2
+                    pool = invoice_pool(workers)
+                    rendered += len(list(pool.map(render_invoice, batch)))
+                else:
+                    render_invoice(data)
+                    rendered += 1
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{lines:>6}{len(PAGE.findall(pdf)):>7}"
+                f"{len(pdf) / 1024:>8.1f}{rendered / elapsed:>12.1f}"
+                f"{elapsed / rendered * 1000:>10.1f}"
+            )
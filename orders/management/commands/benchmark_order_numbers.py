@@ -0,0 +1,83 @@
+import threading
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from orders.models import OrderNumberSequence
+from orders.numbers import OrderNumberGenerator
+
+# Numbers are drawn from a day no real order uses, and its sequence is
+# deleted afterwards
+BENCHMARK_DAY = date(2000, 1, 1)
+
+
+class Command(BaseCommand):
+    help = "Generate order numbers from many threads and check they are unique"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--count", type=int, default=1_000_000, help="Order numbers to generate"
+        )
+        parser.add_argument(
+            "--threads", type=int, default=8, help="Threads generating numbers"
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=2,
+            help="Generators the threads are spread over, each standing in for a "
+            "separate process with its own blocks",
+        )
+        parser.add_argument(
+            "--block-size",
+            type=int,
+            default=1000,
+            help="Sequence values reserved per database round trip",
+        )
+
+    def handle(self, *args, **options):
+        count, threads = options["count"], options["threads"]
+        generators = [
+            OrderNumberGenerator(options["block_size"], today=lambda: BENCHMARK_DAY)
+            for _ in range(options["processes"])
+        ]
+        results = [[] for _ in range(threads)]
+        errors = []
+
+        def work(index):
+            generate = generators[index % len(generators)]
+            numbers = results[index]
+            try:
+                for _ in range(count // threads + (index < count % threads)):
+                    numbers.append(generate())
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        OrderNumberSequence.objects.filter(day=BENCHMARK_DAY).delete()
+        workers = [threading.Thread(target=work, args=(i,)) for i in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        OrderNumberSequence.objects.filter(day=BENCHMARK_DAY).delete()
+
+        if errors:
+            raise CommandError(f"Generation failed: {errors[0]!r}")
+        generated = sum(len(numbers) for numbers in results)
+        if len({number for numbers in results for number in numbers}) != generated:
+            raise CommandError("Duplicate order numbers were generated")
+        if any(numbers != sorted(numbers) for numbers in results):
+            raise CommandError("Order numbers went backwards within a thread")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated {generated} unique order numbers in {elapsed:.2f}s "
+                f"({generated / elapsed:,.0f}/s) on {threads} threads"
+            )
+        )
@@ -0,0 +1,37 @@
+from datetime import date
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from orders.invoices import INVOICE_BATCH_SIZE, invoice_orders, stream_invoice_zip
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the invoices of the orders created in a date range, in "
+        "parallel, into a zip archive"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="Zip archive to write")
+        parser.add_argument(
+            "--start-date", type=date.fromisoformat, help="First day (YYYY-MM-DD)"
+        )
+        parser.add_argument(
+            "--end-date", type=date.fromisoformat, help="Last day (YYYY-MM-DD)"
+        )
+        parser.add_argument("--status", help="Only orders with this status")
+
+    def handle(self, *args, **options):
+        orders = invoice_orders(options["start_date"], options["end_date"])
+        if options["status"]:
+            orders = orders.filter(status=options["status"])
+        count = orders.count()
+        with Path(options["output"]).open("wb") as output:
+            for chunk in stream_invoice_zip(
+                orders.iterator(chunk_size=INVOICE_BATCH_SIZE)
+            ):
+                output.write(chunk)
+        self.stdout.write(
+            self.style.SUCCESS(f"Wrote {count} invoices to {options['output']}")
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from orders.rollups import rebuild_sales_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the dashboard sales rollups from the order history"
+
+    def handle(self, *args, **options):
+        rows = rebuild_sales_rollups()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} sales rollup rows"))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from orders.analytics import take_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Snapshot delivered order lines into NumPy arrays for the product and "
+        "customer reports. Run it periodically; reports show figures as of the "
+        "latest snapshot"
+    )
+
+    def handle(self, *args, **options):
+        snapshot = take_snapshot()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Snapshot of {len(snapshot.orders['day'])} orders and "
+                f"{len(snapshot.lines['day'])} order lines taken"
+            )
+        )
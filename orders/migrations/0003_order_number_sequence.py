@@ -0,0 +1,29 @@
+# Generated by Django 5.0.8 on 2026-10-18 17:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0002_order_payment_intent_id"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrderNumberSequence",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(unique=True)),
+                ("last_value", models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
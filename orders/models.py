@@ -2,7 +2,7 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django_extensions.db.models import TimeStampedModel
 from users.models import User, Address
-from products.models import Product
+from products.models import Product, ProductVariant
 from decimal import Decimal
 
 User = get_user_model()
@@ -51,6 +51,14 @@ class Order(TimeStampedModel):
 
     class Meta:
         ordering = ["-created"]
+        indexes = [
+            models.Index(fields=["-created", "-id"]),
+            # Admin lists filtered by status; total_amount makes it covering
+            # for the revenue sums over a status and date range
+            models.Index(fields=["status", "-created", "-id", "total_amount"]),
+            # A customer's order history
+            models.Index(fields=["user", "-created", "-id"]),
+        ]
 
     def __str__(self):
         return f"Order #{self.order_number}"
@@ -67,6 +75,10 @@ class Order(TimeStampedModel):
 class OrderItem(TimeStampedModel):
     order = models.ForeignKey(Order, related_name="items", on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    # The variant whose stock the line took, so cancelling can hand it back
+    variant = models.ForeignKey(
+        ProductVariant, on_delete=models.SET_NULL, null=True, blank=True
+    )
     quantity = models.PositiveIntegerField(default=1)
     price = models.DecimalField(
         max_digits=10, decimal_places=2
@@ -81,3 +93,44 @@ class OrderItem(TimeStampedModel):
     @property
     def subtotal(self):
         return Decimal(self.quantity) * self.price
+
+
+class OrderNumberSequence(models.Model):
+    """Last order number handed out for a day, see orders.numbers"""
+
+    day = models.DateField(unique=True)
+    last_value = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.day}: {self.last_value}"
+
+
+class SalesRollup(models.Model):
+    """
+    Orders and revenue of one status and payment method over a day, a month
+    or all time, kept up to date by orders.rollups
+    """
+
+    class PeriodChoices(models.TextChoices):
+        DAY = "day", "Day"
+        MONTH = "month", "Month"
+        ALL = "all", "All time"
+
+    period = models.CharField(max_length=5, choices=PeriodChoices.choices)
+    # First day of the period
+    start = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.StatusChoices.choices)
+    payment_method = models.CharField(max_length=20)
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["period", "start", "status", "payment_method"],
+                name="unique_sales_rollup",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.period} {self.start} {self.status} {self.payment_method}"
@@ -0,0 +1,87 @@
+"""
+Order numbers.
+
+Order numbers look like ORD-20250131-0000042: the day followed by that day's
+sequence number, so they sort by date and are unique without retries or
+lookups. Each process reserves a block of the day's sequence with one
+UPDATE on its OrderNumberSequence row and hands numbers out of it from
+memory, so the database is only touched once every ORDER_NUMBER_BLOCK_SIZE
+orders. Numbers increase within a process; blocks left unused when a
+process exits show up as gaps.
+
+Blocks are committed on their own, so no rollback can hand one out twice.
+That isn't possible inside another transaction (ATOMIC_REQUESTS), where a
+single number is taken in that transaction instead.
+"""
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OrderNumberSequence
+
+BLOCK_SIZE = getattr(settings, "ORDER_NUMBER_BLOCK_SIZE", 100)
+
+# ORD-YYYYMMDD-NNNNNNN fills Order.order_number (max_length=20)
+SEQUENCE_DIGITS = 7
+
+
+def format_order_number(day, value):
+    return f"ORD-{day:%Y%m%d}-{value:0{SEQUENCE_DIGITS}d}"
+
+
+class OrderNumberGenerator:
+    def __init__(self, block_size=BLOCK_SIZE, today=timezone.localdate):
+        self.block_size = block_size
+        self.today = today
+        self.lock = threading.Lock()
+        self.day = None
+        self.next_value = self.last_value = 0
+
+    def reserve_block(self, day):
+        """Claim the next block_size values of the day's sequence"""
+        # Durable: a block must never be handed out again because an outer
+        # transaction rolled back. Raises RuntimeError inside one.
+        with transaction.atomic(durable=True):
+            last_value = advance_sequence(day, self.block_size)
+        self.day = day
+        self.next_value = last_value - self.block_size + 1
+        self.last_value = last_value
+
+    def __call__(self):
+        with self.lock:
+            day = self.today()
+            if day != self.day or self.next_value > self.last_value:
+                try:
+                    self.reserve_block(day)
+                except RuntimeError:
+                    # Inside a transaction (ATOMIC_REQUESTS, a view wrapped
+                    # in atomic()): take just this number in it, so that a
+                    # rollback gives it back with the order it was for
+                    return format_order_number(day, advance_sequence(day, 1))
+            value = self.next_value
+            self.next_value += 1
+        return format_order_number(day, value)
+
+
+def advance_sequence(day, count):
+    """
+    Move the day's sequence on by count values and return the last one. Run
+    in a transaction, so the update and the read go together.
+    """
+    sequence = OrderNumberSequence.objects.filter(day=day)
+    if not sequence.update(last_value=F("last_value") + count):
+        # The day's first order
+        OrderNumberSequence.objects.bulk_create(
+            [OrderNumberSequence(day=day)], ignore_conflicts=True
+        )
+        sequence.update(last_value=F("last_value") + count)
+    last_value = sequence.values_list("last_value", flat=True).get()
+    if last_value >= 10**SEQUENCE_DIGITS:
+        raise OverflowError(f"Order numbers for {day} are exhausted")
+    return last_value
+
+
+generate_order_number = OrderNumberGenerator()
@@ -0,0 +1,98 @@
+"""
+Turning a cart into an order.
+
+Every checkout path (cash on delivery, Stripe and Razorpay) goes through
+place_order_from_cart. Cart lines are loaded with their products and variants
+in one query; stock is taken with inventory.stock.take_stock (one conditional
+UPDATE per table), or straight from the cart's checkout holds when they
+cover the lines, the order items are bulk-created and the ordered lines
+removed, all in a single transaction. change_order_status keeps stock in step
+when orders are cancelled (or revived).
+"""
+from decimal import Decimal
+
+from cart.models import CartItem
+from cart.summary import invalidate_cart_summary
+from inventory.stock import claim_stock, return_stock, stock_transaction, take_stock
+
+from .models import Order, OrderItem
+from .numbers import generate_order_number
+
+DELIVERY_CHARGE = Decimal("50.00")
+
+
+class OrderPlacementError(Exception):
+    pass
+
+
+class EmptyCartError(OrderPlacementError):
+    def __init__(self):
+        super().__init__("Your cart is empty!")
+
+
+def unit_price(cart_item):
+    return (cart_item.variant or cart_item.product).selling_price
+
+
+def place_order_from_cart(cart, delivery_charge=DELIVERY_CHARGE, **order_fields):
+    """
+    Create an order for everything in the cart and empty it. order_fields are
+    passed to Order (user, addresses, payment details...); an order number
+    is generated unless one is given.
+    """
+    lines = list(cart.items.select_related("product", "variant"))
+    if not lines:
+        raise EmptyCartError()
+    if "order_number" not in order_fields:
+        order_fields["order_number"] = generate_order_number()
+
+    with stock_transaction():
+        # Stock held for this cart at checkout becomes the order's
+        claim_stock(
+            cart.reservations.all(),
+            [(line.product_id, line.variant_id, line.quantity) for line in lines],
+        )
+        order = Order.objects.create(
+            total_amount=sum(unit_price(line) * line.quantity for line in lines),
+            delivery_charge=delivery_charge,
+            **order_fields,
+        )
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(
+                    order=order,
+                    product=line.product,
+                    variant=line.variant,
+                    quantity=line.quantity,
+                    price=unit_price(line),
+                )
+                for line in lines
+            ]
+        )
+        # Only the ordered lines; anything added meanwhile stays in the cart
+        CartItem.objects.filter(id__in=[line.id for line in lines]).delete()
+
+    invalidate_cart_summary(cart.id)
+    return order
+
+
+def change_order_status(order, status):
+    """
+    Move an order to another status. Cancelling hands its stock back and
+    reviving a cancelled order takes it again, raising OutOfStockError when
+    that is no longer possible.
+    """
+    cancelled = Order.StatusChoices.CANCELLED
+    with stock_transaction():
+        # Read under the lock, so two cancellations can't both return stock
+        previous = Order.objects.select_for_update().values_list(
+            "status", flat=True
+        ).get(pk=order.pk)
+        if (previous == cancelled) != (status == cancelled):
+            lines = order.items.values_list("product_id", "variant_id", "quantity")
+            if status == cancelled:
+                return_stock(lines)
+            else:
+                take_stock(lines)
+        order.status = status
+        order.save()
@@ -0,0 +1,157 @@
+"""
+Sales rollups for the admin dashboard.
+
+SalesRollup rows hold the order count and revenue (Order.total_amount) of
+every status and payment method per day, per month and for all time. Saving
+or deleting an order moves its contribution between rows with two atomic
+increments (see orders.signals), so the dashboard reads a bounded number of
+rows however long the order history gets.
+
+Order.objects.update() and bulk_create() send no signals; run the
+rebuild_sales_rollups command after changing orders that way.
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Order, SalesRollup
+
+Period = SalesRollup.PeriodChoices
+ALL_TIME_START = date(1970, 1, 1)
+# The fields a contribution is made of, in contribution() order
+ROLLUP_FIELDS = ("created", "status", "payment_method", "total_amount")
+# Money counts as earned once the order is delivered
+REVENUE_STATUS = Order.StatusChoices.DELIVERED
+
+
+def contribution(order):
+    """(created, status, payment method, amount) an order adds to the rollups"""
+    return (
+        order.created,
+        order.status,
+        order.payment_method,
+        Decimal(order.total_amount),
+    )
+
+
+def periods(day):
+    return [
+        (Period.DAY, day),
+        (Period.MONTH, day.replace(day=1)),
+        (Period.ALL, ALL_TIME_START),
+    ]
+
+
+def apply_contribution(created, status, payment_method, amount, sign):
+    keys = periods(timezone.localdate(created))
+    if sign > 0:
+        SalesRollup.objects.bulk_create(
+            [
+                SalesRollup(
+                    period=period,
+                    start=start,
+                    status=status,
+                    payment_method=payment_method,
+                )
+                for period, start in keys
+            ],
+            ignore_conflicts=True,
+        )
+    in_periods = Q()
+    for period, start in keys:
+        in_periods |= Q(period=period, start=start)
+    SalesRollup.objects.filter(
+        in_periods, status=status, payment_method=payment_method
+    ).update(
+        order_count=F("order_count") + sign, revenue=F("revenue") + sign * amount
+    )
+
+
+@transaction.atomic(savepoint=False)
+def record_order_change(previous, current):
+    """Move an order's contribution; either side is None for inserts/deletes"""
+    if previous == current:
+        return
+    if previous is not None:
+        apply_contribution(*previous, sign=-1)
+    if current is not None:
+        apply_contribution(*current, sign=1)
+
+
+@transaction.atomic
+def rebuild_sales_rollups():
+    """Recompute every rollup row from the orders, returns the row count"""
+    daily = (
+        Order.objects.annotate(day=TruncDate("created"))
+        .values_list("day", "status", "payment_method")
+        .annotate(order_count=Count("id"), revenue=Sum("total_amount"))
+        .order_by()
+    )
+    totals = defaultdict(lambda: [0, Decimal("0.00")])
+    for day, status, payment_method, order_count, revenue in daily.iterator():
+        for period, start in periods(day):
+            total = totals[period, start, status, payment_method]
+            total[0] += order_count
+            total[1] += revenue
+
+    SalesRollup.objects.all().delete()
+    SalesRollup.objects.bulk_create(
+        [
+            SalesRollup(
+                period=period,
+                start=start,
+                status=status,
+                payment_method=payment_method,
+                order_count=order_count,
+                revenue=revenue,
+            )
+            for (period, start, status, payment_method), (
+                order_count,
+                revenue,
+            ) in totals.items()
+        ],
+        batch_size=1000,
+    )
+    return len(totals)
+
+
+def dashboard_sales(today):
+    """
+    Status counts, today's and this year's monthly revenue and revenue per
+    payment method, from at most a few dozen rollup rows
+    """
+    rows = SalesRollup.objects.filter(
+        Q(period=Period.ALL)
+        | Q(period=Period.DAY, start=today)
+        | Q(period=Period.MONTH, start__year=today.year)
+    ).values_list(
+        "period", "start", "status", "payment_method", "order_count", "revenue"
+    )
+    status_counts = dict.fromkeys(Order.StatusChoices.values, 0)
+    monthly_revenue = [Decimal("0.00")] * 12
+    today_revenue = Decimal("0.00")
+    revenue_by_payment_method = defaultdict(Decimal)
+    for period, start, status, payment_method, order_count, revenue in rows:
+        if period == Period.ALL:
+            status_counts[status] = status_counts.get(status, 0) + order_count
+        if status != REVENUE_STATUS:
+            continue
+        if period == Period.ALL:
+            revenue_by_payment_method[payment_method] += revenue
+        elif period == Period.MONTH:
+            monthly_revenue[start.month - 1] += revenue
+        else:
+            today_revenue += revenue
+    return {
+        "status_counts": status_counts,
+        "today_revenue": today_revenue,
+        "monthly_revenue": monthly_revenue,
+        "revenue_by_payment_method": dict(
+            sorted(revenue_by_payment_method.items(), key=lambda item: -item[1])
+        ),
+    }
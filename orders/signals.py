@@ -0,0 +1,37 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Order
+from .rollups import ROLLUP_FIELDS, contribution, record_order_change
+
+
+@receiver(pre_save, sender=Order)
+def remember_rollup_contribution(
+    sender, instance, raw=False, update_fields=None, **kwargs
+):
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and not set(update_fields) & set(ROLLUP_FIELDS):
+        return
+    # What the stored row contributes, before this save changes it
+    instance._rollup_previous = (
+        Order.objects.filter(pk=instance.pk).values_list(*ROLLUP_FIELDS).first()
+    )
+    if instance._rollup_previous is None:
+        del instance._rollup_previous
+
+
+@receiver(post_save, sender=Order)
+def update_sales_rollups(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return  # fixtures are counted by the rebuild_sales_rollups command
+    if created:
+        record_order_change(None, contribution(instance))
+    elif hasattr(instance, "_rollup_previous"):
+        previous = instance.__dict__.pop("_rollup_previous")
+        record_order_change(previous, contribution(instance))
+
+
+@receiver(post_delete, sender=Order)
+def remove_from_sales_rollups(sender, instance, **kwargs):
+    record_order_change(contribution(instance), None)
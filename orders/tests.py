@@ -0,0 +1,586 @@
+import re
+import shutil
+import tempfile
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from cart.models import Cart, CartItem
+from categories.models import Category
+from inventory.models import StockReservation
+from inventory.stock import OutOfStockError, reserve_cart
+from products.models import Product, ProductVariant
+from users.models import Address, User
+
+from .analytics import cents, load_snapshot, take_snapshot
+from .invoice_layout import render_invoice
+from .invoices import invoice_data, invoice_orders
+from .models import Order, OrderItem, OrderNumberSequence, SalesRollup
+from .numbers import OrderNumberGenerator, generate_order_number
+from .placement import place_order_from_cart
+from .rollups import dashboard_sales
+
+
+class OrderPlacementTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="shopper@example.com", password="password"
+        )
+        self.client.force_login(self.user)
+        self.address = Address.objects.create(
+            user=self.user,
+            phone="9999999999",
+            address="1 Market Street",
+            city="Pune",
+            postal_code="411001",
+        )
+        self.category = Category.objects.create(
+            name="Fruits", slug="fruits", image="categories/fruits.png"
+        )
+        self.cart = Cart.objects.create(user=self.user)
+
+    def create_product(self, index, stock=10):
+        return Product.objects.create(
+            name=f"Product {index}",
+            description="Description",
+            original_price="12.00",
+            selling_price="10.00",
+            category=self.category,
+            stock=stock,
+            stock_unit=Product.StockUnitChoices.UNIT,
+            sku=f"SKU-{index}",
+            slug=f"product-{index}",
+        )
+
+    def place_order(self):
+        return place_order_from_cart(
+            self.cart,
+            user=self.user,
+            shipping_address=self.address,
+            order_number="ORD-1",
+        )
+
+    def test_large_cart_is_placed_in_a_handful_of_statements(self):
+        products = [self.create_product(index) for index in range(50)]
+        CartItem.objects.bulk_create(
+            [CartItem(cart=self.cart, product=p, quantity=2) for p in products]
+        )
+
+        # Order numbers come from a block reserved ahead of time
+        generate_order_number()
+        # session, user, cart, address, lines, then inside a savepoint: held
+        # stock, stock check, stock update, order insert, sales rollup insert
+        # and increment, order items insert and cart line delete
+        with self.assertNumQueries(15):
+            response = self.client.post(
+                reverse("cart:place_order"), {"shipping_address": self.address.id}
+            )
+        self.assertEqual(response.status_code, 200)
+
+        order = Order.objects.get()
+        self.assertEqual(order.items.count(), 50)
+        self.assertEqual(order.total_amount, Decimal("1000.00"))
+        self.assertEqual(order.grand_total, Decimal("1050.00"))
+        self.assertEqual(set(Product.objects.values_list("stock", flat=True)), {8})
+        self.assertFalse(self.cart.items.exists())
+        self.assertEqual(self.cart.total_items, 0)
+
+    def test_variant_lines_use_variant_price_and_stock(self):
+        product = self.create_product(1)
+        variant = ProductVariant.objects.create(
+            product=product,
+            size=ProductVariant.SizeChoices.LARGE,
+            stock=3,
+            stock_unit=Product.StockUnitChoices.UNIT,
+            selling_price="15.00",
+            sku="SKU-1-L",
+        )
+        CartItem.objects.create(
+            cart=self.cart, product=product, variant=variant, quantity=3
+        )
+
+        order = self.place_order()
+        self.assertEqual(order.items.get().price, Decimal("15.00"))
+        variant.refresh_from_db()
+        product.refresh_from_db()
+        self.assertEqual((variant.stock, product.stock), (0, 10))
+
+    def test_out_of_stock_leaves_everything_untouched(self):
+        plenty, scarce = self.create_product(1), self.create_product(2, stock=1)
+        CartItem.objects.create(cart=self.cart, product=plenty, quantity=2)
+        CartItem.objects.create(cart=self.cart, product=scarce, quantity=2)
+
+        with self.assertRaisesMessage(OutOfStockError, "Only 1 of Product 2"):
+            self.place_order()
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.cart.items.count(), 2)
+
+        plenty.refresh_from_db()
+        self.assertEqual(plenty.stock, 10)
+
+    def test_order_takes_over_checkout_reservations(self):
+        product = self.create_product(1, stock=3)
+        CartItem.objects.create(cart=self.cart, product=product, quantity=3)
+        reserve_cart(self.cart)
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 0)
+
+        # The holds cover the cart, so stock isn't handed back and taken again
+        with mock.patch("inventory.stock.take") as take:
+            self.place_order()
+        take.assert_not_called()
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_cancelling_gives_stock_back(self):
+        product = self.create_product(1, stock=5)
+        variant = ProductVariant.objects.create(
+            product=product,
+            size=ProductVariant.SizeChoices.LARGE,
+            stock=2,
+            stock_unit=Product.StockUnitChoices.UNIT,
+            selling_price="15.00",
+            sku="SKU-1-L",
+        )
+        CartItem.objects.create(cart=self.cart, product=product, quantity=3)
+        CartItem.objects.create(
+            cart=self.cart, product=product, variant=variant, quantity=2
+        )
+        order = self.place_order()
+
+        def stock():
+            product.refresh_from_db()
+            variant.refresh_from_db()
+            return product.stock, variant.stock
+
+        self.assertEqual(stock(), (2, 0))
+        url = reverse("orders:cancel", args=[order.id])
+        self.assertEqual(self.client.post(url).status_code, 200)
+        self.assertEqual(stock(), (5, 2))
+        # Only pending orders can be cancelled, so stock comes back once
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertEqual(stock(), (5, 2))
+
+        admin = User.objects.create_superuser(
+            email="admin@example.com", password="password"
+        )
+        self.client.force_login(admin)
+        status_url = reverse("users:admin.orders.update_status", args=[order.id])
+        self.client.post(status_url, {"status": "processing"})
+        self.assertEqual(stock(), (2, 0))
+        self.client.post(status_url, {"status": "cancelled"})
+        self.client.post(status_url, {"status": "cancelled"})
+        self.assertEqual(stock(), (5, 2))
+
+        # A cancelled order can't be revived once its stock is gone
+        Product.objects.update(stock=1)
+        self.client.post(status_url, {"status": "pending"})
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.StatusChoices.CANCELLED)
+        self.assertEqual(stock(), (1, 2))
+
+
+class OrderNumberTests(TestCase):
+    def test_numbers_are_unique_and_sortable_across_processes(self):
+        today = date(2025, 1, 31)
+        first = OrderNumberGenerator(block_size=3, today=lambda: today)
+        second = OrderNumberGenerator(block_size=3, today=lambda: today)
+
+        numbers = [first() for _ in range(4)] + [second() for _ in range(2)]
+        self.assertEqual(
+            numbers,
+            [
+                "ORD-20250131-0000001",
+                "ORD-20250131-0000002",
+                "ORD-20250131-0000003",
+                "ORD-20250131-0000004",
+                "ORD-20250131-0000007",
+                "ORD-20250131-0000008",
+            ],
+        )
+
+        today = date(2025, 2, 1)
+        self.assertEqual(first(), "ORD-20250201-0000001")
+        self.assertEqual(second(), "ORD-20250201-0000004")
+
+
+class OrderNumberTransactionTests(TransactionTestCase):
+    """TestCase's own transaction hides durable blocks' real behaviour"""
+
+    def setUp(self):
+        self.today = date(2025, 1, 31)
+        self.generate = OrderNumberGenerator(block_size=3, today=lambda: self.today)
+
+    def last_value(self):
+        return OrderNumberSequence.objects.get(day=self.today).last_value
+
+    def generate_and_roll_back(self):
+        with self.assertRaises(ZeroDivisionError):
+            with transaction.atomic():
+                number = self.generate()
+                1 / 0
+        return number
+
+    def test_blocks_are_committed_on_their_own(self):
+        self.assertEqual(self.generate(), "ORD-20250131-0000001")
+        self.assertEqual(self.generate_and_roll_back(), "ORD-20250131-0000002")
+        self.assertEqual(self.last_value(), 3)
+        self.assertEqual(self.generate(), "ORD-20250131-0000003")
+
+    def test_numbers_are_taken_in_the_surrounding_transaction(self):
+        # No block can be reserved in a transaction; one number is taken in
+        # it and given back when it rolls back
+        self.assertEqual(self.generate_and_roll_back(), "ORD-20250131-0000001")
+        self.assertFalse(OrderNumberSequence.objects.exists())
+        with transaction.atomic():
+            self.assertEqual(self.generate(), "ORD-20250131-0000001")
+        self.assertEqual(self.last_value(), 1)
+
+        # Outside a transaction blocks are reserved again
+        self.assertEqual(self.generate(), "ORD-20250131-0000002")
+        self.assertEqual(self.last_value(), 4)
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="shopper@example.com", password="password"
+        )
+        self.address = Address.objects.create(
+            user=self.user, phone="1", address="Street", city="Pune", postal_code="1"
+        )
+
+    def create_order(self, n, **fields):
+        return Order.objects.create(
+            user=self.user,
+            shipping_address=self.address,
+            order_number=f"ORD-{n}",
+            total_amount=fields.pop("total_amount", "100.00"),
+            **fields,
+        )
+
+    def rows(self):
+        return set(
+            SalesRollup.objects.exclude(order_count=0).values_list(
+                "period", "start", "status", "payment_method", "order_count", "revenue"
+            )
+        )
+
+    def test_rollups_follow_order_transitions(self):
+        first = self.create_order(1)
+        second = self.create_order(2, total_amount="40.00", payment_method="stripe")
+        self.create_order(3, status=Order.StatusChoices.PROCESSING)
+
+        first.status = Order.StatusChoices.DELIVERED
+        first.save()
+        second.status = Order.StatusChoices.DELIVERED
+        second.save(update_fields=["status"])
+        # Fields outside the rollups don't touch them
+        with self.assertNumQueries(1):
+            second.save(update_fields=["notes"])
+
+        sales = dashboard_sales(timezone.localdate())
+        self.assertEqual(
+            sales["status_counts"],
+            {"pending": 0, "processing": 1, "shipped": 0, "delivered": 2, "cancelled": 0},
+        )
+        self.assertEqual(sales["today_revenue"], Decimal("140.00"))
+        self.assertEqual(
+            sales["monthly_revenue"][timezone.localdate().month - 1], Decimal("140.00")
+        )
+        self.assertEqual(
+            sales["revenue_by_payment_method"],
+            {"cash_on_delivery": Decimal("100.00"), "stripe": Decimal("40.00")},
+        )
+
+        first.delete()
+        sales = dashboard_sales(timezone.localdate())
+        self.assertEqual(sales["status_counts"]["delivered"], 1)
+        self.assertEqual(sales["today_revenue"], Decimal("40.00"))
+
+    def test_rebuild_matches_incremental_updates(self):
+        for n, status in enumerate(Order.StatusChoices.values * 2):
+            order = self.create_order(n, total_amount=f"{10 + n}.00")
+            order.status = status
+            order.save()
+        Order.objects.filter(order_number="ORD-0").update(
+            created=timezone.now() - timedelta(days=400)
+        )
+        # Bulk updates bypass the signals, the rebuild catches up
+        Order.objects.filter(order_number="ORD-1").update(
+            status=Order.StatusChoices.DELIVERED
+        )
+        incremental = self.rows()
+
+        out = StringIO()
+        call_command("rebuild_sales_rollups", stdout=out)
+        self.assertIn("Rebuilt", out.getvalue())
+        rebuilt = self.rows()
+        self.assertNotEqual(rebuilt, incremental)
+        self.assertEqual(
+            dashboard_sales(timezone.localdate())["status_counts"],
+            {
+                status: Order.objects.filter(status=status).count()
+                for status in Order.StatusChoices.values
+            },
+        )
+        self.assertEqual(
+            len([row for row in rebuilt if row[0] == SalesRollup.PeriodChoices.DAY]),
+            len(
+                {
+                    (timezone.localdate(order.created), order.status)
+                    for order in Order.objects.all()
+                }
+            ),
+        )
+        for order in Order.objects.all():
+            order.save()  # no change, no effect
+        self.assertEqual(self.rows(), rebuilt)
+
+    def test_dashboard_reads_a_constant_number_of_queries(self):
+        admin = User.objects.create_superuser(
+            email="admin@example.com", password="password", name="Admin", phone="1"
+        )
+        self.client.force_login(admin)
+        for n in range(3):
+            self.create_order(n, status=Order.StatusChoices.DELIVERED)
+        response = self.client.get(reverse("users:admin.index"))
+        self.assertEqual(response.context["today_income"], Decimal("300.00"))
+        self.assertEqual(response.context["pending_orders"], 0)
+
+        with self.assertNumQueries(5):
+            self.client.get(reverse("users:admin.index"))
+        for n in range(3, 30):
+            self.create_order(n)
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse("users:admin.index"))
+        self.assertEqual(response.context["pending_orders"], 27)
+
+
+class OrderAnalyticsTests(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.enterContext(override_settings(ANALYTICS_ROOT=Path(root)))
+        category = Category.objects.create(
+            name="Fruits", slug="fruits", image="categories/fruits.png"
+        )
+        self.products = [
+            Product.objects.create(
+                name=f"Product {n}",
+                description="Description",
+                original_price="12.00",
+                selling_price="10.00",
+                category=category,
+                stock=10,
+                stock_unit=Product.StockUnitChoices.UNIT,
+                sku=f"SKU-{n}",
+                slug=f"product-{n}",
+            )
+            for n in range(3)
+        ]
+        self.users = [
+            User.objects.create_user(email=f"shopper{n}@example.com", password="pw")
+            for n in range(2)
+        ]
+        self.today = timezone.localdate()
+        for n in range(12):
+            user = self.users[n % 2]
+            order = Order.objects.create(
+                user=user,
+                shipping_address=Address.objects.create(
+                    user=user, phone="1", address="Street", city="Pune", postal_code="1"
+                ),
+                order_number=f"ORD-{n}",
+                total_amount=f"{n + 1}.25",
+                status="pending" if n % 4 == 3 else "delivered",
+            )
+            Order.objects.filter(id=order.id).update(
+                created=timezone.now() - timedelta(days=n % 5)
+            )
+            for product in self.products[: n % 3 + 1]:
+                OrderItem.objects.create(
+                    order=order, product=product, quantity=n + 1, price="2.10"
+                )
+
+    def expected(self, start, end):
+        orders = Order.objects.filter(status="delivered")
+        if start:
+            orders = orders.filter(created__date__gte=start)
+        if end:
+            orders = orders.filter(created__date__lte=end)
+        products = (
+            OrderItem.objects.filter(order__in=orders)
+            .values_list("product_id")
+            .annotate(sold=Sum("quantity"), sales=Sum(F("price") * F("quantity")))
+        )
+        customers = orders.values_list("user_id").annotate(
+            orders=Count("id"), spent=Sum("total_amount")
+        )
+        return (
+            {(pk, sold, cents(sales)) for pk, sold, sales in products},
+            {(pk, count, cents(spent)) for pk, count, spent in customers},
+        )
+
+    def test_snapshot_totals_match_the_order_tables(self):
+        self.assertIsNone(load_snapshot())
+        out = StringIO()
+        call_command("snapshot_order_analytics", stdout=out)
+        self.assertIn("Snapshot of 9 orders", out.getvalue())
+        snapshot = load_snapshot()
+
+        for start, end in [
+            (None, None),
+            (self.today - timedelta(days=2), self.today),
+            (self.today - timedelta(days=3), self.today - timedelta(days=3)),
+            (self.today + timedelta(days=1), None),
+        ]:
+            with self.subTest(start=start, end=end):
+                products = snapshot.product_sales(start, end)
+                customers = snapshot.customer_sales(start, end)
+                self.assertEqual(
+                    (set(products), set(customers)), self.expected(start, end)
+                )
+                self.assertEqual(products, sorted(products, key=lambda row: -row[1]))
+                self.assertEqual(customers, sorted(customers, key=lambda row: -row[2]))
+
+    def test_new_snapshots_replace_old_ones(self):
+        first = take_snapshot()
+        Order.objects.filter(status="pending").update(status="delivered")
+        second = take_snapshot()
+
+        self.assertIs(load_snapshot(), second)
+        self.assertEqual(len(second.orders["day"]), 12)
+        self.assertEqual(len(first.orders["day"]), 9)
+        self.assertEqual(
+            len([path for path in settings.ANALYTICS_ROOT.iterdir() if path.is_dir()]),
+            1,
+        )
+
+
+class InvoiceTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.admin = User.objects.create_superuser(
+            email="admin@example.com", password="password"
+        )
+        self.client.force_login(self.admin)
+        category = Category.objects.create(
+            name="Fruits", slug="fruits", image="categories/fruits.png"
+        )
+        product = Product.objects.create(
+            name="Apple",
+            description="Description",
+            original_price="12.00",
+            selling_price="10.00",
+            category=category,
+            stock=10,
+            stock_unit=Product.StockUnitChoices.UNIT,
+            sku="SKU-1",
+            slug="apple",
+        )
+        address = Address.objects.create(
+            user=self.admin, phone="1", address="Street", city="Pune", postal_code="1"
+        )
+        self.orders = []
+        for n in range(5):
+            order = Order.objects.create(
+                user=self.admin,
+                shipping_address=address,
+                order_number=f"ORD-{n}",
+                total_amount="10.00",
+                status="delivered" if n % 2 else "pending",
+            )
+            OrderItem.objects.create(
+                order=order, product=product, quantity=1, price="10.00"
+            )
+            self.orders.append(order)
+
+    def stored(self):
+        return sorted((Path(settings.MEDIA_ROOT) / "invoices").glob("*/*.pdf"))
+
+    @override_settings(INVOICE_WORKERS=0)
+    def test_delivered_invoices_are_rendered_once(self):
+        delivered, pending = self.orders[1], self.orders[0]
+        url = reverse("users:admin.orders.pdf", args=[delivered.id])
+        with mock.patch(
+            "orders.invoices.render_invoice", wraps=render_invoice
+        ) as render:
+            first = b"".join(self.client.get(url).streaming_content)
+            second = self.client.get(url)
+            self.assertEqual(render.call_count, 1)
+            self.client.get(reverse("users:admin.orders.pdf", args=[pending.id]))
+            self.assertEqual(render.call_count, 2)
+
+        self.assertTrue(first.startswith(b"%PDF"))
+        self.assertEqual(b"".join(second.streaming_content), first)
+        self.assertIn("order_ORD-1.pdf", second["Content-Disposition"])
+        self.assertEqual(len(self.stored()), 1)
+
+        # What the invoice shows changed: it is rendered again
+        delivered.total_amount = "12.00"
+        delivered.save()
+        self.client.get(url)
+        self.assertEqual(len(self.stored()), 2)
+
+    @override_settings(INVOICE_WORKERS=2)
+    def test_bulk_export_renders_in_worker_processes(self):
+        response = self.client.get(
+            reverse("users:admin.orders.invoices"),
+            {"start_date": timezone.localdate().isoformat()},
+        )
+        archive = zipfile.ZipFile(BytesIO(b"".join(response.streaming_content)))
+
+        self.assertEqual(
+            archive.namelist(), [f"order_ORD-{n}.pdf" for n in range(5)]
+        )
+        self.assertTrue(archive.read("order_ORD-3.pdf").startswith(b"%PDF"))
+        self.assertEqual(len(self.stored()), 2)
+
+        output = Path(settings.MEDIA_ROOT) / "invoices.zip"
+        out = StringIO()
+        call_command("export_invoices", output, status="delivered", stdout=out)
+        self.assertIn("Wrote 2 invoices", out.getvalue())
+        self.assertEqual(len(zipfile.ZipFile(output).namelist()), 2)
+
+
+    def test_long_orders_break_across_pages(self):
+        data = invoice_data(invoice_orders().get(id=self.orders[0].id))
+        short = render_invoice(data)
+        data["items"] *= 120
+        data["items"][0][0] = "A product name far too long for its column " * 3
+        long = render_invoice(data)
+
+        pages = re.compile(rb"/Type /Page\b")
+        self.assertEqual(len(pages.findall(short)), 1)
+        self.assertGreater(len(pages.findall(long)), 3)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark_invoices", lines=[1, 40], seconds=0.1, stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+
+
+class OrderNumberBenchmarkTests(TransactionTestCase):
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command(
+            "benchmark_order_numbers", count=5000, threads=1, block_size=100, stdout=out
+        )
+        self.assertIn("Generated 5000 unique order numbers", out.getvalue())
@@ -5,6 +5,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from .models import Order, OrderItem
+from .placement import change_order_status
 from users.models import Address
 
 
@@ -27,9 +28,8 @@ def cancel_order(request, order_id):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # Update order status
-        order.status = Order.StatusChoices.CANCELLED
-        order.save()
+        # Update order status and give its stock back
+        change_order_status(order, Order.StatusChoices.CANCELLED)
 
         return Response({"message": "Order cancelled successfully"})
 
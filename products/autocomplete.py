@@ -0,0 +1,203 @@
+"""
+Search-as-you-type suggestions.
+
+Product names, brands and active categories are kept in sorted in-memory
+arrays, one per kind, and matched by prefix with bisect, so answering a
+keystroke never touches the database. The index is loaded on first use and
+then refreshed incrementally by the signals in products.signals.
+
+Each process keeps its own index, so changes saved in one process only show
+in the others when they reload it. Like core.site_data, every index records
+the version it was loaded under; the version lives in Django's cache and the
+index is reloaded when it changes. rebuild_search_index bumps it after bulk
+loads, which send no signals, and it expires after AUTOCOMPLETE_MAX_AGE
+seconds, so with a per-process cache other processes catch up within that
+time.
+"""
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+
+from categories.models import Category
+
+from .models import Product
+
+AUTOCOMPLETE_VERSION_KEY = "products:autocomplete_version"
+AUTOCOMPLETE_MAX_AGE = getattr(settings, "AUTOCOMPLETE_MAX_AGE", 300)
+
+# Lower sorts first in the suggestion list
+KIND_ORDER = {"category": 0, "brand": 1, "product": 2}
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(text.lower().split())
+
+
+def prefix_keys(label):
+    """Every word-start of a label, so "red apple" matches "red" and "app" """
+    words = normalize(label).split()
+    return {" ".join(words[index:]) for index in range(len(words))}
+
+
+def get_index_version():
+    version = cache.get(AUTOCOMPLETE_VERSION_KEY)
+    if version is None:
+        version = uuid4().hex
+        if not cache.add(
+            AUTOCOMPLETE_VERSION_KEY, version, timeout=AUTOCOMPLETE_MAX_AGE
+        ):
+            version = cache.get(AUTOCOMPLETE_VERSION_KEY, version)
+    return version
+
+
+def bump_index_version():
+    """Have every process reload its index on its next suggestion"""
+    cache.set(AUTOCOMPLETE_VERSION_KEY, uuid4().hex, timeout=AUTOCOMPLETE_MAX_AGE)
+
+
+class PrefixIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.built = False
+        self.version = None
+        # kind -> sorted (key, kind, ident, label, slug), so that a prefix
+        # shared by many products can't crowd out categories and brands
+        self.entries = {kind: [] for kind in KIND_ORDER}
+        self.items = {}  # (kind, ident) -> entries of that item
+        self.brand_products = {}  # brand -> product ids carrying it
+        self.product_brands = {}  # product id -> brand
+
+    def ensure_built(self):
+        version = get_index_version()
+        with self.lock:
+            if not self.built or self.version != version:
+                self.rebuild(version)
+
+    def rebuild(self, version=None):
+        # Read before loading, so changes made meanwhile bump it again
+        version = version or get_index_version()
+        with self.lock:
+            self.entries = {kind: [] for kind in KIND_ORDER}
+            self.items = {}
+            self.brand_products = {}
+            self.product_brands = {}
+            products = Product.objects.filter(is_active=True).values_list(
+                "id", "name", "slug", "brand"
+            )
+            for product_id, name, slug, brand in products.iterator(chunk_size=2000):
+                self._add_product(product_id, name, slug, brand, sort=False)
+            categories = Category.objects.filter(
+                status=Category.StatusChoices.ACTIVE
+            ).values_list("id", "name", "slug")
+            for category_id, name, slug in categories:
+                self._add("category", category_id, name, slug, sort=False)
+            for entries in self.entries.values():
+                entries.sort()
+            self.version = version
+            self.built = True
+
+    def _add(self, kind, ident, label, slug, sort=True):
+        entries = [(key, kind, ident, label, slug) for key in prefix_keys(label)]
+        self.items[(kind, ident)] = entries
+        for entry in entries:
+            if sort:
+                insort(self.entries[kind], entry)
+            else:
+                self.entries[kind].append(entry)
+
+    def _remove(self, kind, ident):
+        entries = self.entries[kind]
+        for entry in self.items.pop((kind, ident), ()):
+            position = bisect_left(entries, entry)
+            if position < len(entries) and entries[position] == entry:
+                del entries[position]
+
+    def _add_product(self, product_id, name, slug, brand, sort=True):
+        self._add("product", product_id, name, slug, sort=sort)
+        if brand:
+            self.product_brands[product_id] = brand
+            products = self.brand_products.setdefault(brand, set())
+            if not products:
+                self._add("brand", brand, brand, "", sort=sort)
+            products.add(product_id)
+
+    def _remove_product(self, product_id):
+        self._remove("product", product_id)
+        brand = self.product_brands.pop(product_id, None)
+        if brand:
+            products = self.brand_products[brand]
+            products.discard(product_id)
+            if not products:
+                del self.brand_products[brand]
+                self._remove("brand", brand)
+
+    def update_product(self, product):
+        if not self.built:
+            return  # picked up by the initial build
+        with self.lock:
+            self._remove_product(product.pk)
+            if product.is_active:
+                self._add_product(product.pk, product.name, product.slug, product.brand)
+
+    def remove_product(self, product_id):
+        if not self.built:
+            return
+        with self.lock:
+            self._remove_product(product_id)
+
+    def update_category(self, category):
+        if not self.built:
+            return
+        with self.lock:
+            self._remove("category", category.pk)
+            if category.status == Category.StatusChoices.ACTIVE:
+                self._add("category", category.pk, category.name, category.slug)
+
+    def remove_category(self, category_id):
+        if not self.built:
+            return
+        with self.lock:
+            self._remove("category", category_id)
+
+    def suggest(self, query, limit=8):
+        """Suggestions whose label has a word starting with the query"""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        self.ensure_built()
+
+        matches = []
+        with self.lock:
+            # Kinds in suggestion order, each scanned for up to limit * 4
+            # items so the best-ranked of them can be picked; lower kinds
+            # are skipped once higher ones fill the list
+            for kind in sorted(KIND_ORDER, key=KIND_ORDER.get):
+                if len(matches) >= limit:
+                    break
+                entries = self.entries[kind]
+                found = {}
+                position = bisect_left(entries, (prefix,))
+                while position < len(entries) and len(found) < limit * 4:
+                    key, _, ident, label, slug = entries[position]
+                    if not key.startswith(prefix):
+                        break
+                    full_match = normalize(label).startswith(prefix)
+                    rank = (KIND_ORDER[kind], not full_match, label.lower())
+                    if ident not in found or rank < found[ident][0]:
+                        found[ident] = (rank, kind, label, slug)
+                    position += 1
+                matches.extend(found.values())
+
+        return [
+            {"kind": kind, "label": label, "slug": slug}
+            for _, kind, label, slug in sorted(matches)[:limit]
+        ]
+
+
+prefix_index = PrefixIndex()
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from products.models import Product, resolve_primary_images
+
+
+class Command(BaseCommand):
+    help = "Backfill the denormalized cover image and thumbnail path on products"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of products resolved and updated per batch",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        products = Product.objects.only("id", "cover_image", "thumbnail").order_by("pk")
+
+        last_pk = 0
+        updated = 0
+        while True:
+            batch = resolve_primary_images(products.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+
+            for product in batch:
+                image = product.primary_image
+                product.cover_image = image
+                product.thumbnail = image.image.name if image else ""
+            Product.objects.bulk_update(batch, ["cover_image", "thumbnail"])
+
+            updated += len(batch)
+            last_pk = batch[-1].pk
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {updated} products"))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from products import autocomplete
+from products.search import InvertedIndex, get_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product full-text search index and autocomplete indexes"
+
+    def handle(self, *args, **kwargs):
+        backend = get_backend()
+        if isinstance(backend, InvertedIndex):
+            # Rebuilding this process's copy would change nothing for the
+            # running workers, which each keep their own
+            self.stderr.write(
+                self.style.WARNING(
+                    "No FTS5 search table: the in-memory search index is built "
+                    "by every process on first use and can't be rebuilt from "
+                    "here. Restart the workers to pick up bulk changes."
+                )
+            )
+        else:
+            backend.rebuild()
+            self.stdout.write(self.style.SUCCESS("Search index rebuilt"))
+        # Bulk loads send no signals to keep the processes' autocomplete
+        # indexes up to date; they reload on their next suggestion
+        autocomplete.bump_index_version()
+        self.stdout.write(self.style.SUCCESS("Autocomplete indexes invalidated"))
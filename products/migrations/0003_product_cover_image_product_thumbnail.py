@@ -0,0 +1,24 @@
+# Generated by Django 5.0.8 on 2026-10-18 17:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_alter_productvariant_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='cover_image',
+            field=models.ForeignKey(blank=True, help_text='Primary image, or the first image if no primary is set', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='products.productimage'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='thumbnail',
+            field=models.CharField(blank=True, default='', help_text='Storage path of the cover image used on product cards', max_length=255),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.0.8 on 2026-10-18 17:40
+
+from django.db import migrations
+from django.db.utils import OperationalError
+
+
+def create_search_table(apps, schema_editor):
+    # FTS5 index used by products.search; other databases fall back to the
+    # in-process inverted index
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                "CREATE VIRTUAL TABLE products_search USING fts5("
+                "name, brand, description, meta_keywords, sku, category, "
+                "tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        except OperationalError:
+            return  # SQLite built without FTS5
+        cursor.execute(
+            "INSERT INTO products_search "
+            "(rowid, name, brand, description, meta_keywords, sku, category) "
+            "SELECT p.id, p.name, COALESCE(p.brand, ''), p.description, "
+            "COALESCE(p.meta_keywords, ''), p.sku, c.name "
+            "FROM products_product p "
+            "INNER JOIN categories_category c ON c.id = p.category_id "
+            "WHERE p.is_active"
+        )
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS products_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("categories", "0003_category_status"),
+        ("products", "0003_product_cover_image_product_thumbnail"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -1,9 +1,14 @@
 from time import strftime
+from django.core.files.storage import default_storage
 from django.db import models
+from django.db.models import F, Prefetch, Window, prefetch_related_objects
+from django.db.models.functions import RowNumber
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django_extensions.db.models import TimeStampedModel
 
 from categories.models import Category
+from core.page_cache import purge_page_tags_on_commit
 from utils.common_utils import generate_file_name
 
 
@@ -13,6 +18,36 @@ def product_image_directory_path(instance, filename):
     )
 
 
+def primary_image_prefetch(lookup="images"):
+    """
+    Prefetch that loads only the primary image (or the first image when no
+    primary is set) of each product, in a single query.
+    """
+    queryset = (
+        ProductImage.objects.annotate(
+            image_rank=Window(
+                RowNumber(),
+                partition_by=F("product_id"),
+                order_by=[F("is_primary").desc(), F("id").asc()],
+            )
+        )
+        .filter(image_rank=1)
+    )
+    return Prefetch(lookup, queryset=queryset, to_attr="primary_images")
+
+
+def resolve_primary_images(products):
+    """Fill in primary_image for a list or queryset of products with one query"""
+    products = list(products)
+    prefetch_related_objects(products, primary_image_prefetch())
+    return products
+
+
+class ProductQuerySet(models.QuerySet):
+    def with_primary_image(self):
+        return self.prefetch_related(primary_image_prefetch())
+
+
 class Product(TimeStampedModel):
     class StockUnitChoices(models.IntegerChoices):
         KG = 1, "kg"
@@ -97,14 +132,40 @@ class Product(TimeStampedModel):
         default=False, help_text=_("Whether this product has different variants")
     )
 
+    # Denormalized cover image, kept in sync by ProductImage.save()/delete()
+    cover_image = models.ForeignKey(
+        "ProductImage",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+        help_text=_("Primary image, or the first image if no primary is set"),
+    )
+    thumbnail = models.CharField(
+        max_length=255,
+        blank=True,
+        default="",
+        help_text=_("Storage path of the cover image used on product cards"),
+    )
+
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         ordering = ["-created"]
         verbose_name = _("Product")
         verbose_name_plural = _("Products")
         indexes = [
-            models.Index(fields=["name"]),
             models.Index(fields=["sku"]),
             models.Index(fields=["slug"]),
+            # Listing sorts, with the primary key as the cursor tie-breaker
+            models.Index(fields=["-created", "-id"]),
+            models.Index(fields=["selling_price", "id"]),
+            models.Index(fields=["name", "id"]),
+            # Featured rails and listings
+            models.Index(fields=["is_active", "top_featured", "-created", "-id"]),
+            # Category listings and similar products
+            models.Index(fields=["category", "-created", "-id"]),
+            models.Index(fields=["category", "is_active"]),
         ]
 
     def __str__(self):
@@ -123,8 +184,53 @@ class Product(TimeStampedModel):
     @property
     def primary_image(self):
         """Returns the primary image or the first image if no primary is set"""
+        if hasattr(self, "primary_images"):
+            # Resolved in bulk by resolve_primary_images / with_primary_image
+            return self.primary_images[0] if self.primary_images else None
+        prefetched = getattr(self, "_prefetched_objects_cache", {})
+        if "images" in prefetched:
+            # Resolve from prefetch_related("images") without extra queries
+            images = sorted(prefetched["images"], key=lambda image: image.pk)
+            primary = [image for image in images if image.is_primary]
+            return (primary or images or [None])[0]
+        if self.cover_image_id:
+            return self.cover_image
         return self.images.filter(is_primary=True).first() or self.images.first()
 
+    @property
+    def thumbnail_url(self):
+        """Cover image URL read from the denormalized thumbnail column"""
+        if self.thumbnail:
+            return default_storage.url(self.thumbnail)
+        return ""
+
+    def refresh_cover_image(self):
+        """Recompute the denormalized cover image and thumbnail path"""
+        image = self.images.order_by("-is_primary", "id").first()
+        self.cover_image = image
+        self.thumbnail = image.image.name if image else ""
+        # Bump modified too, it versions the cached product cards
+        self.modified = timezone.now()
+        Product.objects.filter(pk=self.pk).update(
+            cover_image=self.cover_image,
+            thumbnail=self.thumbnail,
+            modified=self.modified,
+        )
+        # update() sends no post_save, so purge the cached pages showing the
+        # old image here; the search documents don't include images
+        purge_page_tags_on_commit(*self.page_tags())
+
+    def page_tags(self):
+        """Tags of the cached pages the product is shown on (core.page_cache)"""
+        tags = [
+            f"product:{self.pk}",
+            "products",
+            f"category:{self.category_id}:products",
+        ]
+        if self.top_featured:
+            tags.append("products:featured")
+        return tags
+
     @property
     def needs_restock(self):
         """Check if product needs restocking"""
@@ -154,6 +260,16 @@ class ProductImage(TimeStampedModel):
     def __str__(self):
         return f"Image for {self.product.name}"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.product.refresh_cover_image()
+
+    def delete(self, *args, **kwargs):
+        product = self.product
+        result = super().delete(*args, **kwargs)
+        product.refresh_cover_image()
+        return result
+
 
 class ProductVariant(TimeStampedModel):
     class SizeChoices(models.TextChoices):
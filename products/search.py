@@ -0,0 +1,344 @@
+"""
+Full-text product search.
+
+Active products are indexed on name, brand, description, meta keywords, SKU
+and category name. On SQLite with FTS5 the index is the products_search
+virtual table (see migration 0004); on other setups a process-local inverted
+index is built on first use. Both rank matches with BM25 and are kept up to
+date by the signals in products.signals.
+
+The inverted index is meant for development with a single process: every
+worker builds its own copy and only sees the changes saved through it, so
+other workers' edits and bulk loads (which send no signals) leave it stale
+until that worker restarts. Production needs SQLite with FTS5.
+"""
+import logging
+import math
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TABLE = "products_search"
+
+# Column order matches the products_search table and the bm25() weights
+FIELD_WEIGHTS = {
+    "name": 10.0,
+    "brand": 4.0,
+    "description": 1.0,
+    "meta_keywords": 3.0,
+    "sku": 8.0,
+    "category": 2.0,
+}
+
+TOKEN_RE = re.compile(r"\w+")
+
+# Upper bound on vocabulary terms a trailing prefix expands to
+MAX_PREFIX_TERMS = 50
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or "").lower())
+
+
+def product_document(product):
+    """Searchable text of a product, keyed by index column"""
+    return {
+        "name": product.name,
+        "brand": product.brand or "",
+        "description": product.description,
+        "meta_keywords": product.meta_keywords or "",
+        "sku": product.sku,
+        "category": product.category.name,
+    }
+
+
+def active_documents():
+    """Yield (product id, document) for every active product"""
+    rows = Product.objects.filter(is_active=True).values_list(
+        "id", "name", "brand", "description", "meta_keywords", "sku", "category__name"
+    )
+    for product_id, *values in rows.iterator(chunk_size=2000):
+        yield product_id, {
+            field: value or "" for field, value in zip(FIELD_WEIGHTS, values)
+        }
+
+
+class FTS5Backend:
+    """BM25-ranked search over the SQLite FTS5 products_search table"""
+
+    def match_expression(self, tokens):
+        # Quote every term so user input can't inject FTS5 syntax, and treat
+        # the last term as a prefix so partially typed words still match
+        terms = ['"%s"' % token for token in tokens]
+        terms[-1] += "*"
+        return " ".join(terms)
+
+    def search(self, tokens, offset, limit):
+        weights = ", ".join(str(weight) for weight in FIELD_WEIGHTS.values())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s "
+                f"ORDER BY bm25({SEARCH_TABLE}, {weights}), rowid LIMIT %s OFFSET %s",
+                [self.match_expression(tokens), limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def count(self, tokens):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT count(*) FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s",
+                [self.match_expression(tokens)],
+            )
+            return cursor.fetchone()[0]
+
+    def index(self, product_id, document):
+        columns = ", ".join(FIELD_WEIGHTS)
+        placeholders = ", ".join(["%s"] * (len(FIELD_WEIGHTS) + 1))
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [product_id])
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, {columns}) VALUES ({placeholders})",
+                [product_id, *document.values()],
+            )
+
+    def remove(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [product_id])
+
+    def rebuild(self):
+        columns = ", ".join(FIELD_WEIGHTS)
+        placeholders = ", ".join(["%s"] * (len(FIELD_WEIGHTS) + 1))
+        rows = [
+            [product_id, *document.values()]
+            for product_id, document in active_documents()
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, {columns}) VALUES ({placeholders})",
+                rows,
+            )
+
+
+class InvertedIndex:
+    """Process-local inverted index with field-weighted BM25 ranking"""
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.built = False
+        self.postings = defaultdict(dict)  # term -> {product id: weighted tf}
+        self.doc_terms = {}  # product id -> terms, for removal
+        self.doc_lengths = {}
+        self.total_length = 0.0
+        self.vocabulary = []  # sorted terms, for prefix lookups
+        self.vocabulary_stale = False
+        self.last_ranking = (None, [])  # count() and search() share a ranking
+
+    def ensure_built(self):
+        if not self.built:
+            self.rebuild()
+
+    def rebuild(self):
+        with self.lock:
+            self.postings.clear()
+            self.doc_terms.clear()
+            self.doc_lengths.clear()
+            self.total_length = 0.0
+            for product_id, document in active_documents():
+                self._add(product_id, document)
+            self.changed()
+            self.built = True
+
+    def changed(self):
+        self.vocabulary_stale = True
+        self.last_ranking = (None, [])
+
+    def _add(self, product_id, document):
+        frequencies = defaultdict(float)
+        for field, text in document.items():
+            for token in tokenize(text):
+                frequencies[token] += FIELD_WEIGHTS[field]
+        for term, frequency in frequencies.items():
+            self.postings[term][product_id] = frequency
+        length = sum(frequencies.values())
+        self.doc_terms[product_id] = list(frequencies)
+        self.doc_lengths[product_id] = length
+        self.total_length += length
+
+    def _remove(self, product_id):
+        for term in self.doc_terms.pop(product_id, ()):
+            postings = self.postings[term]
+            postings.pop(product_id, None)
+            if not postings:
+                del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(product_id, 0.0)
+
+    def index(self, product_id, document):
+        if not self.built:
+            return  # picked up by the initial build
+        with self.lock:
+            self._remove(product_id)
+            self._add(product_id, document)
+            self.changed()
+
+    def remove(self, product_id):
+        if not self.built:
+            return
+        with self.lock:
+            self._remove(product_id)
+            self.changed()
+
+    def prefix_terms(self, prefix):
+        if self.vocabulary_stale:
+            self.vocabulary = sorted(self.postings)
+            self.vocabulary_stale = False
+        terms = []
+        position = bisect_left(self.vocabulary, prefix)
+        while (
+            position < len(self.vocabulary)
+            and len(terms) < MAX_PREFIX_TERMS
+            and self.vocabulary[position].startswith(prefix)
+        ):
+            terms.append(self.vocabulary[position])
+            position += 1
+        return terms
+
+    def ranked(self, tokens):
+        self.ensure_built()
+        with self.lock:
+            key, ranking = self.last_ranking
+            if key == tokens:
+                return ranking
+            ranking = self._rank(tokens)
+            self.last_ranking = (list(tokens), ranking)
+            return ranking
+
+    def _rank(self, tokens):
+        # Every term must match; the last one is matched as a prefix
+        groups = [[token] for token in tokens[:-1] if token in self.postings]
+        if len(groups) < len(tokens) - 1:
+            return []
+        groups.append(self.prefix_terms(tokens[-1]))
+
+        # Intersect starting from the rarest terms to keep candidate sets small
+        groups.sort(key=lambda terms: sum(len(self.postings[t]) for t in terms))
+
+        candidates = None
+        for terms in groups:
+            matched = set()
+            for term in terms:
+                matched.update(self.postings.get(term, ()))
+            candidates = matched if candidates is None else candidates & matched
+            if not candidates:
+                return []
+
+        total_docs = len(self.doc_lengths)
+        average_length = self.total_length / total_docs
+        norms = {
+            product_id: self.k1 * (
+                1 - self.b + self.b * self.doc_lengths[product_id] / average_length
+            )
+            for product_id in candidates
+        }
+        scores = dict.fromkeys(candidates, 0.0)
+        for terms in groups:
+            for term in terms:
+                postings = self.postings[term]
+                idf = math.log(
+                    1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5)
+                )
+                boost = idf * (self.k1 + 1)
+                for product_id in candidates.intersection(postings):
+                    frequency = postings[product_id]
+                    scores[product_id] += boost * frequency / (frequency + norms[product_id])
+        return sorted(scores, key=lambda product_id: (-scores[product_id], product_id))
+
+    def search(self, tokens, offset, limit):
+        return self.ranked(tokens)[offset:offset + limit]
+
+    def count(self, tokens):
+        return len(self.ranked(tokens))
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        if (
+            connection.vendor == "sqlite"
+            and SEARCH_TABLE in connection.introspection.table_names()
+        ):
+            _backend = FTS5Backend()
+        else:
+            if not settings.DEBUG:
+                logger.warning(
+                    "No %s table, searching a process-local index that other "
+                    "workers' changes don't reach",
+                    SEARCH_TABLE,
+                )
+            _backend = InvertedIndex()
+    return _backend
+
+
+def index_product(product):
+    if product.is_active:
+        get_backend().index(product.pk, product_document(product))
+    else:
+        get_backend().remove(product.pk)
+
+
+def remove_product(product_id):
+    get_backend().remove(product_id)
+
+
+def rebuild_index():
+    get_backend().rebuild()
+
+
+class SearchResults:
+    """
+    Lazy, ranked search results that can be handed to a Paginator. Only the
+    requested page of products is loaded from the database.
+    """
+
+    def __init__(self, query, queryset=None, backend=None):
+        self.tokens = tokenize(query)
+        self.queryset = queryset if queryset is not None else Product.objects.all()
+        self.backend = backend or get_backend()
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self.backend.count(self.tokens) if self.tokens else 0
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        if not self.tokens:
+            return []
+        start = key.start or 0
+        stop = key.stop if key.stop is not None else self.count()
+        ids = self.backend.search(self.tokens, start, stop - start)
+        products = self.queryset.in_bulk(ids)
+        return [products[product_id] for product_id in ids if product_id in products]
+
+
+def search_products(query, queryset=None):
+    return SearchResults(query, queryset)
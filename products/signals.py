@@ -0,0 +1,57 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from categories.models import Category
+from core.page_cache import purge_page_tags_on_commit
+
+from . import autocomplete, search
+from .models import Product
+
+
+@receiver(post_save, sender=Product)
+def index_saved_product(sender, instance, raw=False, **kwargs):
+    if raw:
+        return  # fixtures are indexed by the rebuild_search_index command
+    search.index_product(instance)
+    autocomplete.prefix_index.update_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_deleted_product(sender, instance, **kwargs):
+    search.remove_product(instance.pk)
+    autocomplete.prefix_index.remove_product(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def purge_product_pages(sender, instance, **kwargs):
+    # Listings the product is in shift when it is added, removed or re-sorted
+    purge_page_tags_on_commit(*instance.page_tags())
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created=False, raw=False, **kwargs):
+    if created or raw:
+        return
+    # The category name is part of every product document in it
+    for product in instance.product_set.select_related("category"):
+        search.index_product(product)
+
+
+@receiver(post_save, sender=Category)
+def update_category_suggestions(sender, instance, raw=False, **kwargs):
+    if not raw:
+        autocomplete.prefix_index.update_category(instance)
+
+
+@receiver(post_delete, sender=Category)
+def remove_category_suggestions(sender, instance, **kwargs):
+    autocomplete.prefix_index.remove_category(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def purge_category_pages(sender, instance, **kwargs):
+    purge_page_tags_on_commit(
+        "categories", f"category:{instance.pk}", f"category:{instance.pk}:products"
+    )
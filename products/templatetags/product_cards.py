@@ -0,0 +1,48 @@
+"""
+Cached product cards.
+
+{% product_card product "includes/product.html" "active" %} renders a card
+template once per product version and serves it from the cache afterwards.
+The version covers the product's modified time, whether it is in stock and
+the shop currency, so saving a product only re-renders its own cards. The
+cached HTML is shared by everyone: the per-user wishlist class is left as a
+token and filled in when the card is served.
+"""
+import hashlib
+
+from django import template
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+CARD_TIMEOUT = 60 * 60 * 24
+WISHLISTED_TOKEN = "__wishlisted_class__"
+
+
+def card_key(template_name, product, currency):
+    version = f"{product.modified.isoformat()}:{product.stock > 0}:{currency}"
+    digest = hashlib.md5(f"{template_name}:{version}".encode()).hexdigest()
+    return f"product-card:{product.pk}:{digest}"
+
+
+@register.simple_tag(takes_context=True)
+def product_card(context, product, template_name, wishlisted_class):
+    site_settings = context.get("settings")
+    currency = getattr(site_settings, "currency", "")
+    key = card_key(template_name, product, currency)
+    html = cache.get(key)
+    if html is None:
+        html = render_to_string(
+            template_name,
+            {
+                "product": product,
+                "settings": site_settings,
+                "wishlisted_class": WISHLISTED_TOKEN,
+            },
+        )
+        cache.set(key, html, CARD_TIMEOUT)
+    if not getattr(product, "is_wishlisted", False):
+        wishlisted_class = ""
+    return mark_safe(html.replace(WISHLISTED_TOKEN, wishlisted_class))
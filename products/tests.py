@@ -1,3 +1,474 @@
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from categories.models import Category
+from core.models import SiteSettings
+from core.page_cache import purge_page_tags
+from offers.models import Offer
+from users.models import User
+from wishlist.models import Wishlist
+from . import search
+from .templatetags import product_cards
+from .models import Product, ProductImage, resolve_primary_images
+
+
+class PrimaryImageTests(TestCase):
+    def setUp(self):
+        SiteSettings.load()
+        self.category = Category.objects.create(
+            name="Fruits", slug="fruits", image="categories/fruits.png"
+        )
+
+    def create_product(self, index, images=("a", "b"), primary=None):
+        product = Product.objects.create(
+            name=f"Product {index}",
+            description="Description",
+            original_price="10.00",
+            selling_price="8.00",
+            category=self.category,
+            stock=5,
+            stock_unit=Product.StockUnitChoices.UNIT,
+            top_featured=True,
+            sku=f"SKU-{index}",
+            slug=f"product-{index}",
+        )
+        for name in images:
+            ProductImage.objects.create(
+                product=product,
+                image=f"products/{index}-{name}.png",
+                is_primary=(name == primary),
+            )
+        return product
+
+    def test_resolve_primary_images(self):
+        with_primary = self.create_product(1, primary="b")
+        without_primary = self.create_product(2)
+        without_images = self.create_product(3, images=())
+
+        with self.assertNumQueries(1):
+            products = resolve_primary_images(
+                [with_primary, without_primary, without_images]
+            )
+            names = [
+                p.primary_image.image.name if p.primary_image else None
+                for p in products
+            ]
+        self.assertEqual(names, ["products/1-b.png", "products/2-a.png", None])
+
+    def test_cover_image_follows_image_changes(self):
+        product = self.create_product(1)
+        product.refresh_from_db()
+        self.assertEqual(product.thumbnail, "products/1-a.png")
+
+        primary = ProductImage.objects.create(
+            product=product, image="products/1-c.png", is_primary=True
+        )
+        product.refresh_from_db()
+        self.assertEqual(product.cover_image, primary)
+        self.assertEqual(product.thumbnail_url, "/media/products/1-c.png")
+
+        primary.delete()
+        product.refresh_from_db()
+        self.assertEqual(product.thumbnail, "products/1-a.png")
+
+        product.images.all().delete()
+        product.refresh_cover_image()
+        product.refresh_from_db()
+        self.assertIsNone(product.cover_image)
+        self.assertEqual(product.thumbnail, "")
+
+    def test_backfill_cover_images(self):
+        self.create_product(1, primary="b")
+        self.create_product(2)
+        Product.objects.update(cover_image=None, thumbnail="")
+
+        call_command("backfill_cover_images", batch_size=1, stdout=StringIO())
+        self.assertEqual(
+            dict(Product.objects.values_list("sku", "thumbnail")),
+            {"SKU-1": "products/1-b.png", "SKU-2": "products/2-a.png"},
+        )
+
+    def test_listing_query_count_is_constant(self):
+        for index in range(3):
+            self.create_product(index, primary="a")
+        # products (+ category lookup for the category listing), with no
+        # COUNT under cursor pagination; the shared context is served from
+        # the site data cache
+        budgets = {
+            reverse("products:index"): 1,
+            reverse("products:featured"): 1,
+            reverse("products:category", args=[self.category.slug]): 2,
+        }
+        # Budgets are for rendering, so the page cache is purged before each
+        listings = [
+            "products",
+            "products:featured",
+            f"category:{self.category.pk}:products",
+        ]
+        self.client.get(reverse("products:index"))
+        for url, budget in budgets.items():
+            purge_page_tags(*listings)
+            with self.assertNumQueries(budget):
+                self.client.get(url)
+
+        for index in range(3, 12):
+            self.create_product(index, primary="a")
+        for url, budget in budgets.items():
+            purge_page_tags(*listings)
+            with self.assertNumQueries(budget):
+                self.client.get(url)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        SiteSettings.load()
+        self.fruits = Category.objects.create(
+            name="Fruits", slug="fruits", image="categories/fruits.png"
+        )
+        self.dairy = Category.objects.create(
+            name="Dairy", slug="dairy", image="categories/dairy.png"
+        )
+        self.apple = self.create_product("Red Apple", self.fruits, brand="Orchard")
+        self.juice = self.create_product(
+            "Orange Juice", self.fruits, description="Made from apples and oranges"
+        )
+        self.milk = self.create_product("Whole Milk", self.dairy, brand="Amul")
+
+    def create_product(self, name, category, **kwargs):
+        slug = name.lower().replace(" ", "-")
+        return Product.objects.create(
+            name=name,
+            description=kwargs.pop("description", "Fresh produce"),
+            original_price="10.00",
+            selling_price="8.00",
+            category=category,
+            stock=5,
+            stock_unit=Product.StockUnitChoices.UNIT,
+            sku=f"SKU-{slug}",
+            slug=slug,
+            **kwargs,
+        )
+
+    def assert_backend_results(self, backend):
+        def names(query):
+            results = search.SearchResults(query, backend=backend)
+            return [product.name for product in results[0:results.count()]]
+
+        # Name matches outrank description matches, last term is a prefix
+        self.assertEqual(names("apple"), ["Red Apple", "Orange Juice"])
+        self.assertEqual(names("ORCH"), ["Red Apple"])
+        self.assertEqual(names("dairy milk"), ["Whole Milk"])
+        self.assertEqual(names("SKU-whole-milk"), ["Whole Milk"])
+        self.assertEqual(names('"milk" OR *'), [])
+        self.assertEqual(names("banana"), [])
+
+        # Incremental updates from product and category signals
+        self.milk.name = "Skimmed Milk"
+        self.milk.save()
+        self.assertEqual(names("skimmed"), ["Skimmed Milk"])
+        self.dairy.name = "Cheese Counter"
+        self.dairy.save()
+        self.assertEqual(names("cheese"), ["Skimmed Milk"])
+        self.apple.is_active = False
+        self.apple.save()
+        self.assertEqual(names("apple"), ["Orange Juice"])
+        self.juice.delete()
+        self.assertEqual(names("apple"), [])
+
+    def test_fts5_backend(self):
+        backend = search.get_backend()
+        self.assertIsInstance(backend, search.FTS5Backend)
+        self.assert_backend_results(backend)
+
+    def test_inverted_index_backend(self):
+        backend = search.InvertedIndex()
+        with mock.patch.object(search, "_backend", backend):
+            self.assert_backend_results(backend)
+
+    def test_rebuild_command_leaves_the_in_memory_index_alone(self):
+        backend = search.InvertedIndex()
+        stdout, stderr = StringIO(), StringIO()
+        with mock.patch.object(search, "_backend", backend):
+            call_command("rebuild_search_index", stdout=stdout, stderr=stderr)
+        self.assertIn("can't be rebuilt from here", stderr.getvalue())
+        self.assertNotIn("Search index rebuilt", stdout.getvalue())
+        self.assertFalse(backend.built)
+
+        with mock.patch.object(search.FTS5Backend, "rebuild") as rebuild:
+            call_command("rebuild_search_index", stdout=stdout, stderr=stderr)
+        rebuild.assert_called_once_with()
+        self.assertIn("Search index rebuilt", stdout.getvalue())
+
+    def test_search_view_paginates_over_get(self):
+        for index in range(25):
+            self.create_product(f"Green Apple {index}", self.fruits)
+
+        response = self.client.get(reverse("core:search"), {"query": "apple"})
+        self.assertEqual(response.status_code, 200)
+        page = response.context["products"]
+        self.assertEqual(page.paginator.count, 27)
+        self.assertEqual(len(page), 20)
+
+        response = self.client.get(
+            reverse("core:search"), {"query": "apple", "page": 2}
+        )
+        self.assertEqual(len(response.context["products"]), 7)
+
+        response = self.client.post(reverse("core:search"), {"query": "red apple"})
+        self.assertRedirects(
+            response, reverse("core:search") + "?query=red+apple"
+        )
+
+
+class ProductCardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        SiteSettings.load()
+        category = Category.objects.create(
+            name="Fruits", slug="fruits", image="categories/fruits.png"
+        )
+        self.products = [
+            Product.objects.create(
+                name=f"Product {index}",
+                description="Description",
+                original_price="10.00",
+                selling_price="8.00",
+                category=category,
+                stock=5,
+                stock_unit=Product.StockUnitChoices.UNIT,
+                sku=f"SKU-{index}",
+                slug=f"product-{index}",
+            )
+            for index in range(3)
+        ]
+        renderer = mock.patch.object(
+            product_cards, "render_to_string", wraps=product_cards.render_to_string
+        )
+        self.render = renderer.start()
+        self.addCleanup(renderer.stop)
+
+    def rendered_cards(self):
+        self.render.reset_mock()
+        response = self.client.get(reverse("products:index"))
+        return response, self.render.call_count
+
+    def test_cards_are_rendered_once_per_product_version(self):
+        # Signed in, so whole pages don't come from the anonymous page cache
+        user = User.objects.create_user(email="shopper@example.com", password="pw")
+        self.client.force_login(user)
+        _, rendered = self.rendered_cards()
+        self.assertEqual(rendered, 3)
+        _, rendered = self.rendered_cards()
+        self.assertEqual(rendered, 0)
+
+        product = self.products[0]
+        product.selling_price = "7.00"
+        product.save()
+        response, rendered = self.rendered_cards()
+        self.assertEqual(rendered, 1)
+        self.assertContains(response, "7.00")
+
+        Product.objects.filter(pk=self.products[1].pk).update(stock=0)
+        response, rendered = self.rendered_cards()
+        self.assertEqual(rendered, 1)
+        self.assertContains(response, "(Out of Stock)", count=1)
+
+    def test_wishlist_state_is_filled_in_per_user(self):
+        self.rendered_cards()
+        user = User.objects.create_user(email="shopper@example.com", password="pw")
+        Wishlist.objects.create(user=user, product=self.products[0])
+        self.client.force_login(user)
+
+        response, rendered = self.rendered_cards()
+        self.assertEqual(rendered, 0)
+        self.assertContains(response, "wishlist-btn liked", count=1)
+        self.assertNotContains(response, product_cards.WISHLISTED_TOKEN)
+
+        self.client.logout()
+        response, _ = self.rendered_cards()
+        self.assertNotContains(response, "wishlist-btn liked")
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        SiteSettings.load()
+        self.fruits, self.dairy = [
+            Category.objects.create(
+                name=name, slug=name, image=f"categories/{name}.png"
+            )
+            for name in ("fruits", "dairy")
+        ]
+        self.apple = self.create_product("Apple", self.fruits)
+        self.milk = self.create_product("Milk", self.dairy)
+
+    def create_product(self, name, category):
+        return Product.objects.create(
+            name=name,
+            description="Description",
+            original_price="10.00",
+            selling_price="8.00",
+            category=category,
+            stock=5,
+            stock_unit=Product.StockUnitChoices.UNIT,
+            sku=f"SKU-{name}",
+            slug=name.lower(),
+        )
+
+    def category_url(self, category):
+        return reverse("products:category", args=[category.slug])
+
+    def assertCached(self, url):
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_anonymous_pages_are_cached_until_a_dependency_changes(self):
+        urls = [
+            reverse("products:index"),
+            self.category_url(self.fruits),
+            self.category_url(self.dairy),
+            reverse("offers:list"),
+            reverse("categories:all_categories"),
+        ]
+        for url in urls:
+            self.client.get(url)
+            self.assertCached(url)
+
+        self.apple.selling_price = "6.50"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.apple.save()
+
+        self.assertContains(self.client.get(urls[0]), "6.50")
+        self.assertContains(self.client.get(urls[1]), "6.50")
+        # Pages that never showed the apple are left alone
+        for url in urls[2:]:
+            self.assertCached(url)
+
+        offer = Offer.objects.create(
+            title="Dairy week",
+            description="Description",
+            discount_value="10.00",
+            start_date=timezone.now() - timedelta(days=1),
+            end_date=timezone.now() + timedelta(days=1),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            offer.products.add(self.milk)
+        self.assertContains(self.client.get(urls[3]), "Dairy week")
+        self.assertCached(urls[3])
+
+        # Offer pages are tagged with the products they show
+        self.milk.name = "Oat milk"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.milk.save()
+        self.assertContains(self.client.get(urls[3]), "Oat milk")
+
+    def test_new_cover_images_purge_the_product_pages(self):
+        urls = [reverse("products:index"), self.category_url(self.dairy)]
+        for url in urls:
+            self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductImage.objects.create(product=self.apple, image="products/new.png")
+        self.assertContains(self.client.get(urls[0]), "products/new.png")
+        self.assertCached(urls[1])
+
+    def test_signed_in_visitors_bypass_the_cache(self):
+        url = reverse("products:index")
+        self.client.get(url)
+        user = User.objects.create_user(email="shopper@example.com", password="pw")
+        self.client.force_login(user)
+        response = self.client.get(url)
+        self.assertNotIn("ETag", response)
+        self.assertContains(response, "Logout")
+
+    def test_conditional_requests_get_not_modified(self):
+        url = reverse("products:index")
+        response = self.client.get(url)
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+        self.assertIn("Cookie", response["Vary"])
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_product("Pear", self.fruits)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Pear")
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_file_based_cache_backend(self):
+        with tempfile.TemporaryDirectory() as location:
+            backend = {
+                "default": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": location,
+                }
+            }
+            with self.settings(CACHES=backend):
+                url = self.category_url(self.fruits)
+                self.client.get(url)
+                self.assertCached(url)
+                self.apple.name = "Green apple"
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.apple.save()
+                self.assertContains(self.client.get(url), "Green apple")
+
+
+class ProductListPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        SiteSettings.load()
+        category = Category.objects.create(
+            name="Fruits", slug="fruits", image="categories/fruits.png"
+        )
+        for index in range(25):
+            Product.objects.create(
+                name=f"Product {index:02}",
+                description="Description",
+                original_price="10.00",
+                selling_price="8.00",
+                category=category,
+                stock=5,
+                stock_unit=Product.StockUnitChoices.UNIT,
+                sku=f"SKU-{index}",
+                slug=f"product-{index}",
+            )
+
+    def test_show_more_follows_the_cursor_and_keeps_the_sort(self):
+        response = self.client.get(reverse("products:index"), {"sort": "name"})
+        page = response.context["page_obj"]
+        self.assertEqual(page[0].name, "Product 00")
+        self.assertContains(response, page.next_query.replace("&", "&amp;"))
+
+        response = self.client.get(reverse("products:index") + page.next_query)
+        self.assertEqual(response.context["page_obj"][0].name, "Product 10")
+
+    def test_api(self):
+        Product.objects.filter(name="Product 24").update(is_active=False)
+        url = reverse("products:api_list")
+        data = self.client.get(url, {"sort": "price_asc", "count": 1}).json()
+        self.assertEqual(len(data["results"]), 20)
+        self.assertEqual(data["count"], 24)
+        self.assertIsNone(data["previous"])
+
+        params = {"sort": "price_asc", "cursor": data["next"]}
+        data = self.client.get(url, params).json()
+        self.assertEqual(len(data["results"]), 4)
+        self.assertIsNone(data["next"])
+        self.assertNotIn("Product 24", [product["name"] for product in data["results"]])
 
-# Create your tests here.
+        response = self.client.get(url, {"cursor": "garbage"})
+        self.assertEqual(response.status_code, 400)
@@ -5,11 +5,26 @@ from django.db import models
 from django.views.decorators.http import require_GET
 
 from categories.models import Category
+from core.page_cache import CachedPageMixin
+from core.pagination import CursorPaginationMixin, CursorPaginator, InvalidCursor
 from wishlist.models import Wishlist
 from .models import Product, ProductVariant
 
 
-class ProductListView(ListView):
+API_PAGE_SIZE = 20
+
+
+def sort_order(request):
+    sort_param = request.GET.get('sort', 'default')
+    options = ProductListView.SORT_OPTIONS
+    return options.get(sort_param, options['default'])
+
+
+def product_tags(products):
+    return [f"product:{product.pk}" for product in products]
+
+
+class ProductListView(CachedPageMixin, CursorPaginationMixin, ListView):
     model = Product
     template_name = "products/all.html"
     context_object_name = "products"
@@ -26,9 +41,7 @@ class ProductListView(ListView):
         queryset = super().get_queryset()
         
         # Apply sorting
-        sort_param = self.request.GET.get('sort', 'default')
-        order_by = self.SORT_OPTIONS.get(sort_param, self.SORT_OPTIONS['default'])
-        queryset = queryset.order_by(order_by)
+        queryset = queryset.order_by(sort_order(self.request))
 
         # Add wishlist annotation
         if self.request.user.is_authenticated:
@@ -52,8 +65,11 @@ class ProductListView(ListView):
         context["sort"] = self.request.GET.get('sort', 'default')
         return context
 
+    def get_page_tags(self, context):
+        return ["products", *product_tags(context["object_list"])]
+
 
-class FeaturedProductListView(ListView):
+class FeaturedProductListView(CachedPageMixin, CursorPaginationMixin, ListView):
     model = Product
     template_name = "products/all.html"
     context_object_name = "products"
@@ -74,6 +90,9 @@ class FeaturedProductListView(ListView):
         context["title"] = "Featured Products"
         return context
 
+    def get_page_tags(self, context):
+        return ["products:featured", *product_tags(context["object_list"])]
+
 
 class ProductDetailView(DetailView):
     model = Product
@@ -108,15 +127,16 @@ class ProductDetailView(DetailView):
         return context
 
 
-class ProductsByCategoryView(ListView):
+class ProductsByCategoryView(CachedPageMixin, CursorPaginationMixin, ListView):
     model = Product
     template_name = "products/all.html"
     context_object_name = "products"
     paginate_by = 10
 
-    def dispatch(self, request, *args, **kwargs):
+    def get(self, request, *args, **kwargs):
+        # Looked up here rather than in dispatch so cached pages skip it
         self.get_category()
-        return super().dispatch(request, *args, **kwargs)
+        return super().get(request, *args, **kwargs)
 
     def get_category(self):
         self.category = Category.objects.get(slug=self.kwargs["slug"])
@@ -141,6 +161,13 @@ class ProductsByCategoryView(ListView):
         context["title"] = f"List of {self.category.name} Products"
         return context
 
+    def get_page_tags(self, context):
+        return [
+            f"category:{self.category.pk}",
+            f"category:{self.category.pk}:products",
+            *product_tags(context["object_list"]),
+        ]
+
 
 @require_GET
 def get_variant_details(request):
@@ -162,3 +189,39 @@ def get_variant_details(request):
         })
     except ProductVariant.DoesNotExist:
         return JsonResponse({'error': 'Variant not found'}, status=404)
+
+
+@require_GET
+def product_list_api(request):
+    """
+    Active products in the same orders as ProductListView, paginated by
+    cursor
+    """
+    paginator = CursorPaginator(
+        Product.objects.filter(is_active=True).order_by(sort_order(request)),
+        API_PAGE_SIZE,
+    )
+    try:
+        page = paginator.page(request.GET.get("cursor"), request.GET)
+    except InvalidCursor as error:
+        return JsonResponse({"error": str(error)}, status=400)
+
+    data = {
+        "results": [
+            {
+                "id": product.id,
+                "name": product.name,
+                "slug": product.slug,
+                "selling_price": str(product.selling_price),
+                "original_price": str(product.original_price),
+                "stock": product.stock,
+                "thumbnail_url": product.thumbnail_url,
+            }
+            for product in page
+        ],
+        "next": page.next_cursor,
+        "previous": page.previous_cursor,
+    }
+    if request.GET.get("count"):
+        data["count"] = paginator.count
+    return JsonResponse(data)
@@ -27,6 +27,23 @@ $(document).ready(function() {
         }
     });
 
+    var $headerSearch = $('.search120 .ui.search');
+    if ($headerSearch.length && $.fn.search) {
+        $headerSearch.search({
+            apiSettings: {
+                url: $headerSearch.data('suggest-url') + '?q={query}'
+            },
+            fields: {
+                results: 'suggestions',
+                title: 'label',
+                description: 'kind',
+                url: 'url'
+            },
+            minCharacters: 2,
+            showNoResults: false
+        });
+    }
+
     var page = 1;
     $document.on('click', '#load-more', function () {
         var category_id = $('#category').val();
@@ -19,12 +19,14 @@ from users.views.admin_views import (
     admin_product_image_delete,
     update_order_status,
     generate_order_pdf,
+    admin_invoice_export,
     admin_customers,
     admin_customer_detail,
     admin_general_settings,
     admin_payment_settings,
     admin_email_settings,
     admin_reports,
+    admin_report_export,
     admin_product_variants,
     admin_product_variant_add,
     admin_product_variant_edit,
@@ -71,12 +73,14 @@ urlpatterns = [
         name="admin_product_image_delete",
     ),
     path('orders/<int:order_id>/pdf/', generate_order_pdf, name='admin.orders.pdf'),
+    path('orders/invoices/', admin_invoice_export, name='admin.orders.invoices'),
     path('customers/', admin_customers, name='admin.customers'),
     path('customers/<int:user_id>/', admin_customer_detail, name='admin.customer_detail'),
     path('settings/general/', admin_general_settings, name='admin.settings.general'),
     path('settings/payment/', admin_payment_settings, name='admin.settings.payment'),
     path('settings/email/', admin_email_settings, name='admin.settings.email'),
     path('reports/', admin_reports, name='admin.reports'),
+    path('reports/export/<str:file_format>/', admin_report_export, name='admin.reports.export'),
     path('products/<int:product_id>/variants/', admin_product_variants, name='admin_product_variants'),
     path('products/<int:product_id>/variants/add/', admin_product_variant_add, name='admin_product_variant_add'),
     path('products/variants/<int:variant_id>/edit/', admin_product_variant_edit, name='admin_product_variant_edit'),
@@ -18,9 +18,20 @@ class User(AbstractUser):
 
     objects = CustomUserManager()
 
+    class Meta(AbstractUser.Meta):
+        # Newest customers first in the admin customer list
+        indexes = [models.Index(fields=["-date_joined", "-id"])]
+
     def __str__(self):
         return f"{self.name} - {self.email} - {self.phone}"
 
+    @property
+    def wishlist_count(self):
+        """Header badge count, only looked up when a template renders it"""
+        from wishlist.models import get_wishlist_count
+
+        return get_wishlist_count(self.pk)
+
 
 class Address(TimeStampedModel):
     user = models.ForeignKey(
@@ -0,0 +1,196 @@
+"""
+Admin report queries, shared by the report pages and their downloads.
+
+Each report is a values() queryset over delivered orders in the chosen
+date range plus the (field, label) columns shown for it. The product and
+customer reports are answered from the latest order analytics snapshot
+(orders.analytics) for periods that ended before it was taken, as long as it
+is at most REPORT_SNAPSHOT_MAX_AGE old; otherwise from the orders.
+"""
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from core.exports import EXPORT_CHUNK_SIZE
+from orders.analytics import load_snapshot, to_amount
+from orders.models import Order, OrderItem
+from products.models import Product
+from users.models import User
+
+# Rows shown on the report page; downloads carry every row
+REPORT_PREVIEW_ROWS = 100
+REPORT_SNAPSHOT_MAX_AGE = getattr(
+    settings, "REPORT_SNAPSHOT_MAX_AGE", timedelta(days=1)
+)
+
+
+def report_period(start_date=None, end_date=None):
+    """The first and last day of a report from its query string dates"""
+
+    def day(value):
+        try:
+            return parse_date(value or "")
+        except ValueError:
+            return None
+
+    return day(start_date), day(end_date)
+
+
+def start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def delivered_orders(start=None, end=None):
+    orders = Order.objects.filter(status=Order.StatusChoices.DELIVERED)
+    if start:
+        orders = orders.filter(created__gte=start_of_day(start))
+    if end:
+        orders = orders.filter(created__lt=start_of_day(end + timedelta(days=1)))
+    return orders
+
+
+def sales_report(orders):
+    return (
+        orders.annotate(date=TruncDate("created"))
+        .values("date")
+        .annotate(total_orders=Count("id"), total_sales=Sum("total_amount"))
+        .order_by("-date")
+    )
+
+
+def product_report(orders):
+    # Grouped by product like the snapshot, not merely by name
+    return (
+        OrderItem.objects.filter(order__in=orders)
+        .values("product", "product__name")
+        .annotate(
+            total_quantity=Sum("quantity"),
+            total_sales=Sum(F("price") * F("quantity")),
+        )
+        .order_by("-total_quantity")
+    )
+
+
+def customer_report(orders):
+    return (
+        orders.values("user__name", "user__email")
+        .annotate(total_orders=Count("id"), total_spent=Sum("total_amount"))
+        .order_by("-total_spent")
+    )
+
+
+def payment_report(orders):
+    return (
+        orders.values("payment_method")
+        .annotate(total_orders=Count("id"), total_amount=Sum("total_amount"))
+        .order_by("-total_amount")
+    )
+
+
+def with_names(totals, model, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    """Snapshot totals with their leading id swapped for the object's fields"""
+    totals = iter(totals)
+    while chunk := list(islice(totals, chunk_size)):
+        objects = model.objects.only(*fields).in_bulk([row[0] for row in chunk])
+        for pk, *values in chunk:
+            obj = objects.get(pk)
+            yield (*(getattr(obj, field, None) for field in fields), *values)
+
+
+def product_snapshot_report(snapshot, start, end):
+    totals = (
+        (product, quantity, to_amount(sales))
+        for product, quantity, sales in snapshot.product_sales(start, end)
+    )
+    return with_names(totals, Product, ["name"])
+
+
+def customer_snapshot_report(snapshot, start, end):
+    totals = (
+        (user, orders, to_amount(spent))
+        for user, orders, spent in snapshot.customer_sales(start, end)
+    )
+    return with_names(totals, User, ["name", "email"])
+
+
+REPORTS = {
+    "sales": {
+        "title": "Sales Report",
+        "context_name": "daily_sales",
+        "build": sales_report,
+        "columns": [
+            ("date", "Date"),
+            ("total_orders", "Orders"),
+            ("total_sales", "Total Sales"),
+        ],
+    },
+    "products": {
+        "title": "Product Performance",
+        "context_name": "product_sales",
+        "build": product_report,
+        "snapshot": product_snapshot_report,
+        "columns": [
+            ("product__name", "Product Name"),
+            ("total_quantity", "Total Quantity"),
+            ("total_sales", "Total Sales"),
+        ],
+    },
+    "customers": {
+        "title": "Customer Analysis",
+        "context_name": "customer_stats",
+        "build": customer_report,
+        "snapshot": customer_snapshot_report,
+        "columns": [
+            ("user__name", "Customer Name"),
+            ("user__email", "Email"),
+            ("total_orders", "Total Orders"),
+            ("total_spent", "Total Spent"),
+        ],
+    },
+    "payment": {
+        "title": "Payment Methods",
+        "context_name": "payment_stats",
+        "build": payment_report,
+        "columns": [
+            ("payment_method", "Payment Method"),
+            ("total_orders", "Total Orders"),
+            ("total_amount", "Total Amount"),
+        ],
+    },
+}
+
+
+def snapshot_covers(snapshot, end):
+    """
+    Whether the snapshot is recent enough and was taken after the period
+    ending on end (open-ended periods need the orders placed since)
+    """
+    if snapshot is None or end is None:
+        return False
+    return (
+        timezone.now() - snapshot.taken <= REPORT_SNAPSHOT_MAX_AGE
+        and start_of_day(end + timedelta(days=1)) <= snapshot.taken
+    )
+
+
+def report_rows(report_type, start=None, end=None, limit=None):
+    """
+    (rows, as_of): a report's rows as tuples in column order, and the time
+    of the snapshot they come from (None when read from the orders)
+    """
+    report = REPORTS[report_type]
+    snapshot = load_snapshot() if "snapshot" in report else None
+    if snapshot_covers(snapshot, end):
+        rows = report["snapshot"](snapshot, start, end)
+        return islice(rows, limit), snapshot.taken
+
+    fields = [field for field, label in report["columns"]]
+    rows = report["build"](delivered_orders(start, end)).values_list(*fields)
+    if limit is not None:
+        rows = rows[:limit]
+    return rows.iterator(chunk_size=EXPORT_CHUNK_SIZE), None
@@ -1,3 +1,126 @@
-from django.test import TestCase
+import csv
+import io
+import shutil
+import tempfile
+import zipfile
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.http import StreamingHttpResponse
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.exports import stream_xlsx
+from orders.analytics import take_snapshot
+from orders.models import Order
+from users.models import Address, User
+
+
+class ReportExportTests(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.enterContext(override_settings(ANALYTICS_ROOT=Path(root)))
+        self.admin = User.objects.create_superuser(
+            email="admin@example.com", password="password"
+        )
+        self.client.force_login(self.admin)
+        customer = User.objects.create_user(
+            email="shopper@example.com", password="password", name="=HYPERLINK()"
+        )
+        address = Address.objects.create(
+            user=customer, phone="1", address="Street", city="Pune", postal_code="1"
+        )
+        for n, status in enumerate(["delivered", "delivered", "pending"]):
+            Order.objects.create(
+                user=customer,
+                shipping_address=address,
+                order_number=f"ORD-{n}",
+                total_amount="25.00",
+                status=status,
+            )
+
+    def export(self, file_format, **params):
+        return self.client.get(
+            reverse("users:admin.reports.export", args=[file_format]), params
+        )
+
+    def test_csv_export_streams_every_row(self):
+        response = self.export("csv", type="customers")
+
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertIn("customers-report", response["Content-Disposition"])
+        rows = list(csv.reader(io.StringIO(b"".join(response).decode())))
+        self.assertEqual(
+            rows,
+            [
+                ["Customer Name", "Email", "Total Orders", "Total Spent"],
+                # Formula-looking cells are neutralised for spreadsheet apps
+                ["'=HYPERLINK()", "shopper@example.com", "2", "50"],
+            ],
+        )
+
+    def test_customer_report_reads_recent_snapshots_of_past_periods(self):
+        Order.objects.update(created=timezone.now() - timedelta(days=3))
+        url = reverse("users:admin.reports")
+        params = {
+            "type": "customers",
+            "end_date": str(timezone.localdate() - timedelta(days=1)),
+        }
+        live = self.client.get(url, params)
+        self.assertIsNone(live.context["report_as_of"])
+
+        take_snapshot()
+        Order.objects.update(status="delivered")
+        response = self.client.get(url, params)
+
+        self.assertContains(response, "Figures as of")
+        self.assertEqual(
+            response.context["customer_stats"],
+            [
+                {
+                    "user__name": "=HYPERLINK()",
+                    "user__email": "shopper@example.com",
+                    "total_orders": 2,
+                    "total_spent": Decimal("50.00"),
+                }
+            ],
+        )
+        rows = b"".join(self.export("csv", type="customers", end_date="2000-01-01"))
+        self.assertEqual(rows.decode().splitlines()[1:], [])
+
+        # Periods running past the snapshot, or an old snapshot, read the orders
+        response = self.client.get(url, {"type": "customers"})
+        self.assertIsNone(response.context["report_as_of"])
+        self.assertEqual(response.context["customer_stats"][0]["total_orders"], 3)
+        with mock.patch("users.reports.REPORT_SNAPSHOT_MAX_AGE", timedelta(0)):
+            response = self.client.get(url, params)
+        self.assertEqual(response.context["customer_stats"][0]["total_orders"], 3)
+
+    def test_xlsx_export_is_a_workbook(self):
+        response = self.export("xlsx", type="payment")
+
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(response)))
+        self.assertIn("xl/workbook.xml", archive.namelist())
+        sheet = archive.read("xl/worksheets/sheet1.xml").decode()
+        self.assertIn("Payment Method", sheet)
+        self.assertIn("<c><v>2</v></c><c><v>50</v></c>", sheet)
+
+    def test_xlsx_rolls_over_to_new_sheets(self):
+        rows = ([n] for n in range(5))
+        data = b"".join(stream_xlsx(["n"], rows, max_rows=3, chunk_size=2))
+
+        archive = zipfile.ZipFile(io.BytesIO(data))
+        sheets = [name for name in archive.namelist() if "worksheets" in name]
+        self.assertEqual(len(sheets), 3)
+        self.assertIn("<v>4</v>", archive.read(sheets[-1]).decode())
+
+    def test_unknown_reports_and_non_admins_are_refused(self):
+        self.assertEqual(self.export("pdf").status_code, 404)
+        self.assertEqual(self.export("csv", type="refunds").status_code, 404)
+
+        self.client.logout()
+        self.assertEqual(self.export("csv").status_code, 302)
@@ -2,28 +2,32 @@ from django.shortcuts import get_object_or_404, redirect, render
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.utils import timezone
 from django.db.models import Sum, Count
-from django.db.models.functions import ExtractMonth
 from calendar import month_name
-from django.core.paginator import Paginator
 from django.db.models import Q
 from django.contrib import messages
 from django.utils.text import slugify
-from django.http import HttpResponse
-from django.db.models.functions import TruncDate
-from django.db.models import Count, Sum, F
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.platypus import Table, TableStyle
-from io import BytesIO
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.db.models import Count, Sum
 from django.core.exceptions import ValidationError
 
 from categories.models import Category
+from core.exports import streaming_export
 from core.models import CURRENCY_CHOICES
-from orders.models import Order, OrderItem
+from core.pagination import CursorPaginator
+from inventory.stock import OutOfStockError
+from orders.invoices import (
+    INVOICE_BATCH_SIZE,
+    invoice_file,
+    invoice_orders,
+    stream_invoice_zip,
+)
+from orders.models import Order
+from orders.placement import change_order_status
+from orders.rollups import dashboard_sales
 from offers.models import Offer
 from products.models import Product, ProductImage, ProductVariant
 from users.models import User
+from users.reports import REPORT_PREVIEW_ROWS, REPORTS, report_period, report_rows
 from core.models import SiteSettings
 
 
@@ -33,37 +37,23 @@ def is_admin(user):
 
 @login_required
 def admin_dashboard(request):
-    today = timezone.now().date()
-    current_year = today.year
-
-    # Get monthly revenue for current year
-    monthly_revenue = (
-        Order.objects.filter(created__year=current_year, status="completed")
-        .annotate(month=ExtractMonth("created"))
-        .values("month")
-        .annotate(revenue=Sum("total_amount"))
-        .order_by("month")
-    )
-
-    # Create revenue data for all months (including 0 for months with no revenue)
-    revenue_by_month = [0] * 12
-    for item in monthly_revenue:
-        revenue_by_month[item["month"] - 1] = float(item["revenue"] or 0)
-
-    # Get month names
-    month_names = list(month_name)[1:]  # Skip empty string at index 0
+    sales = dashboard_sales(timezone.localdate())
+    status_counts = sales["status_counts"]
 
     context = {
-        "pending_orders": Order.objects.filter(status="pending").count(),
-        "cancelled_orders": Order.objects.filter(status="cancelled").count(),
-        "processing_orders": Order.objects.filter(status="processing").count(),
-        "today_income": Order.objects.filter(
-            created__date=today, status="completed"
-        ).aggregate(Sum("total_amount"))["total_amount__sum"]
-        or 0.00,
-        "recent_orders": Order.objects.order_by("-created")[:10],
-        "month_names": month_names,
-        "monthly_revenue": revenue_by_month,
+        "pending_orders": status_counts[Order.StatusChoices.PENDING],
+        "cancelled_orders": status_counts[Order.StatusChoices.CANCELLED],
+        "processing_orders": status_counts[Order.StatusChoices.PROCESSING],
+        "today_income": sales["today_revenue"],
+        "revenue_by_payment_method": [
+            (method.replace("_", " ").title(), revenue)
+            for method, revenue in sales["revenue_by_payment_method"].items()
+        ],
+        "recent_orders": Order.objects.prefetch_related("items__product").order_by(
+            "-created"
+        )[:10],
+        "month_names": list(month_name)[1:],  # Skip empty string at index 0
+        "monthly_revenue": [float(revenue) for revenue in sales["monthly_revenue"]],
     }
 
     return render(request, "users/admin/index.html", context)
@@ -92,9 +82,8 @@ def admin_orders(request):
         orders = orders.filter(status=status_filter)
 
     # Pagination
-    paginator = Paginator(orders, 10)  # Show 10 orders per page
-    page_number = request.GET.get("page", 1)
-    orders_page = paginator.get_page(page_number)
+    paginator = CursorPaginator(orders, 10)  # Show 10 orders per page
+    orders_page = paginator.get_page(request.GET)
 
     context = {
         "orders": orders_page,
@@ -271,9 +260,8 @@ def admin_products(request):
         products = products.filter(category_id=category_id)
 
     # Pagination
-    paginator = Paginator(products, 10)  # Show 10 products per page
-    page_number = request.GET.get('page', 1)
-    products_page = paginator.get_page(page_number)
+    paginator = CursorPaginator(products, 10)  # Show 10 products per page
+    products_page = paginator.get_page(request.GET)
 
     # Get all categories for the filter dropdown
     categories = Category.objects.filter(status=Category.StatusChoices.ACTIVE)
@@ -387,6 +375,8 @@ def admin_product_edit(request, product_id):
             )
 
         product.save()
+        # Image uploads above may have changed the cover image
+        product.refresh_cover_image()
         messages.success(request, "Product updated successfully!")
         return redirect("users:admin_products")
 
@@ -424,10 +414,9 @@ def admin_product_delete(request, product_id):
 
 @user_passes_test(is_admin)
 def admin_product_image_delete(request, image_id):
+    image = get_object_or_404(ProductImage, id=image_id)
+    product_id = image.product_id
     if request.method == "POST":
-        image = get_object_or_404(ProductImage, id=image_id)
-        product_id = image.product.id
-
         # Don't delete if it's the only image
         if image.product.images.count() > 1:
             # If deleting primary image, make another image primary
@@ -456,9 +445,12 @@ def update_order_status(request, order_id):
     if request.method == "POST":
         new_status = request.POST.get("status")
         if new_status in ["pending", "processing", "shipped", "delivered", "cancelled"]:
-            order.status = new_status
-            order.save()
-            messages.success(request, f"Order status updated to {new_status}")
+            try:
+                # Cancelling returns the order's stock, reviving takes it again
+                change_order_status(order, new_status)
+                messages.success(request, f"Order status updated to {new_status}")
+            except OutOfStockError as e:
+                messages.error(request, str(e))
         else:
             messages.error(request, "Invalid status")
 
@@ -471,106 +463,33 @@ def generate_order_pdf(request, order_id):
         messages.error(request, "You are not authorized to perform this action")
         return redirect("users:admin.orders")
 
-    order = get_object_or_404(
-        Order.objects.select_related("user", "shipping_address").prefetch_related(
-            "items", "items__product"
-        ),
-        id=order_id,
+    order = get_object_or_404(invoice_orders(), id=order_id)
+    return FileResponse(
+        invoice_file(order),
+        as_attachment=True,
+        filename=f"order_{order.order_number}.pdf",
+        content_type="application/pdf",
     )
 
-    # Create a file-like buffer to receive PDF data
-    buffer = BytesIO()
-
-    # Create the PDF object, using the buffer as its "file."
-    p = canvas.Canvas(buffer, pagesize=letter)
-
-    # Draw things on the PDF
-    # Header
-    p.setFont("Helvetica-Bold", 16)
-    p.drawString(50, 750, f"Order Invoice #{order.order_number}")
-
-    # Order Info
-    p.setFont("Helvetica", 12)
-    p.drawString(50, 720, f"Date: {order.created.strftime('%d %b %Y')}")
-    p.drawString(50, 700, f"Status: {order.status.upper()}")
-
-    # Customer Info
-    p.drawString(50, 670, "Customer Information:")
-    p.setFont("Helvetica", 10)
-    p.drawString(70, 650, f"Name: {order.user.name}")
-    p.drawString(70, 635, f"Email: {order.user.email}")
-
-    # Shipping Address
-    p.setFont("Helvetica", 12)
-    p.drawString(50, 605, "Shipping Address:")
-    p.setFont("Helvetica", 10)
-    address_lines = str(order.shipping_address).split("\n")
-    y = 585
-    for line in address_lines:
-        p.drawString(70, y, line)
-        y -= 15
-
-    # Order Items
-    data = [["Item", "Price", "Quantity", "Total"]]
-    for item in order.items.all():
-        data.append(
-            [
-                item.product.name,
-                f"₹{item.price}",
-                str(item.quantity),
-                f"₹{item.subtotal}",
-            ]
-        )
 
-    # Add totals
-    data.append(["", "", "Subtotal:", f"₹{order.total_amount}"])
-    data.append(["", "", "Delivery:", f"₹{order.delivery_charge or 0}"])
-    data.append(["", "", "Grand Total:", f"₹{order.grand_total}"])
-
-    table = Table(data, colWidths=[250, 100, 100, 100])
-    table.setStyle(
-        TableStyle(
-            [
-                ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
-                ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
-                ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                ("FONTSIZE", (0, 0), (-1, 0), 10),
-                ("BOTTOMPADDING", (0, 0), (-1, 0), 12),
-                ("BACKGROUND", (0, 1), (-1, -1), colors.white),
-                ("TEXTCOLOR", (0, 1), (-1, -1), colors.black),
-                ("FONTNAME", (0, 1), (-1, -1), "Helvetica"),
-                ("FONTSIZE", (0, 1), (-1, -1), 9),
-                ("GRID", (0, 0), (-1, -1), 1, colors.black),
-                ("ALIGN", (-1, 0), (-1, -1), "RIGHT"),
-            ]
-        )
+@login_required
+@user_passes_test(is_admin)
+def admin_invoice_export(request):
+    start, end = report_period(
+        request.GET.get("start_date"), request.GET.get("end_date")
     )
-
-    table.wrapOn(p, 50, 50)
-    table.drawOn(p, 50, 350)
-
-    # Footer
-    p.setFont("Helvetica", 8)
-    p.drawString(
-        50, 50, f"Generated on: {timezone.now().strftime('%d %b %Y %H:%M:%S')}"
+    orders = invoice_orders(start, end)
+    status = request.GET.get("status")
+    if status:
+        orders = orders.filter(status=status)
+
+    response = StreamingHttpResponse(
+        stream_invoice_zip(orders.iterator(chunk_size=INVOICE_BATCH_SIZE)),
+        content_type="application/zip",
     )
-
-    # Close the PDF object cleanly
-    p.showPage()
-    p.save()
-
-    # Get the value of the BytesIO buffer and write it to the response
-    pdf = buffer.getvalue()
-    buffer.close()
-
-    # Create the HTTP response
-    response = HttpResponse(content_type="application/pdf")
     response["Content-Disposition"] = (
-        f'attachment; filename="order_{order.order_number}.pdf"'
+        f'attachment; filename="invoices-{start or "start"}-{end or "end"}.zip"'
     )
-    response.write(pdf)
-
     return response
 
 
@@ -593,9 +512,8 @@ def admin_customers(request):
             | Q(phone__icontains=search_query)
         )
 
-    paginator = Paginator(customers, 10)
-    page_number = request.GET.get("page", 1)
-    customers_page = paginator.get_page(page_number)
+    paginator = CursorPaginator(customers, 10, ordering=["-date_joined"])
+    customers_page = paginator.get_page(request.GET)
 
     context = {"customers": customers_page, "search_query": search_query}
     return render(request, "users/admin/customers/index.html", context)
@@ -701,65 +619,48 @@ def admin_reports(request):
     start_date = request.GET.get("start_date")
     end_date = request.GET.get("end_date")
 
-    # Base queryset
-    orders = Order.objects.filter(status="delivered")
-
-    # Apply date filters if provided
-    if start_date:
-        orders = orders.filter(created__gte=start_date)
-    if end_date:
-        orders = orders.filter(created__lte=end_date)
-
     context = {
         "report_type": report_type,
         "start_date": start_date,
         "end_date": end_date,
     }
 
-    if report_type == "sales":
-        # Daily sales report
-        daily_sales = (
-            orders.annotate(date=TruncDate("created"))
-            .values("date")
-            .annotate(total_orders=Count("id"), total_sales=Sum("total_amount"))
-            .order_by("-date")
-        )
-        context["daily_sales"] = daily_sales
-
-    elif report_type == "products":
-        # Product performance report
-        product_sales = (
-            OrderItem.objects.filter(order__in=orders)
-            .values("product__name")
-            .annotate(
-                total_quantity=Sum("quantity"),
-                total_sales=Sum(F("price") * F("quantity"))  # Calculate total sales
-            )
-            .order_by("-total_quantity")
-        )
-        context["product_sales"] = product_sales
-
-    elif report_type == "customers":
-        # Customer analysis report
-        customer_stats = (
-            orders.values("user__name", "user__email")
-            .annotate(total_orders=Count("id"), total_spent=Sum("total_amount"))
-            .order_by("-total_spent")
-        )
-        context["customer_stats"] = customer_stats
-
-    elif report_type == "payment":
-        # Payment method analysis
-        payment_stats = (
-            orders.values("payment_method")
-            .annotate(total_orders=Count("id"), total_amount=Sum("total_amount"))
-            .order_by("-total_amount")
+    report = REPORTS.get(report_type)
+    if report is not None:
+        # Only a preview: the full report is downloaded as CSV or XLSX
+        rows, as_of = report_rows(
+            report_type,
+            *report_period(start_date, end_date),
+            limit=REPORT_PREVIEW_ROWS + 1,
         )
-        context["payment_stats"] = payment_stats
+        fields = [field for field, label in report["columns"]]
+        rows = [dict(zip(fields, row)) for row in rows]
+        context[report["context_name"]] = rows[:REPORT_PREVIEW_ROWS]
+        context["report_truncated"] = len(rows) > REPORT_PREVIEW_ROWS
+        context["report_as_of"] = as_of
+        context["preview_rows"] = REPORT_PREVIEW_ROWS
+        context["export_query"] = request.GET.urlencode()
 
     return render(request, "users/admin/reports/index.html", context)
 
 
+@login_required
+@user_passes_test(is_admin)
+def admin_report_export(request, file_format):
+    report_type = request.GET.get("type", "sales")
+    report = REPORTS.get(report_type)
+    if report is None or file_format not in ("csv", "xlsx"):
+        raise Http404("Unknown report")
+
+    rows, as_of = report_rows(
+        report_type,
+        *report_period(request.GET.get("start_date"), request.GET.get("end_date")),
+    )
+    labels = [label for field, label in report["columns"]]
+    filename = f"{report_type}-report-{timezone.localdate():%Y-%m-%d}"
+    return streaming_export(file_format, filename, labels, rows, report["title"])
+
+
 @login_required
 @user_passes_test(is_admin)
 def admin_product_variants(request, product_id):
@@ -9,13 +9,13 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Q
+from django.db.models import Count, Prefetch, Q
 from django.shortcuts import get_object_or_404
 from django.contrib.auth import update_session_auth_hash
 from django.contrib import messages
 from django.contrib.messages import SUCCESS, ERROR
 
-from orders.models import Order
+from orders.models import Order, OrderItem
 from wishlist.models import Wishlist
 from products.models import Product
 from users.forms import UserLoginForm, UserRegistrationForm
@@ -249,7 +249,13 @@ class OrderListView(LoginRequiredMixin, ListView):
     context_object_name = "orders"
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).order_by("-created")
+        items = OrderItem.objects.select_related("product")
+        return (
+            Order.objects.filter(user=self.request.user)
+            .select_related("user", "shipping_address")
+            .prefetch_related(Prefetch("items", queryset=items))
+            .order_by("-created")
+        )
 
 
 class WishlistView(LoginRequiredMixin, ListView):
@@ -286,11 +292,13 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         # Get orders
         orders = Order.objects.filter(user=user)
         total_orders = orders.count()
-        last_order = orders.first() if orders.exists() else None
-        recent_orders = orders[:5]  # Last 5 orders
+        recent_orders = list(
+            orders.annotate(item_count=Count("items"))[:5]
+        )  # Last 5 orders
+        last_order = recent_orders[0] if recent_orders else None
 
         # Get wishlist count
-        wishlist_count = Wishlist.objects.filter(user=user).count()
+        wishlist_count = user.wishlist_count
 
         # Get address count
         address_count = Address.objects.filter(user=user).count()
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.8 on 2026-10-18 18:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_listing_indexes'),
+        ('wishlist', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='wishlist',
+            index=models.Index(fields=['user', '-created', '-id'], name='wishlist_wi_user_id_bf512d_idx'),
+        ),
+    ]
@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
 from django_extensions.db.models import TimeStampedModel
 from users.models import User
@@ -11,6 +13,36 @@ class Wishlist(TimeStampedModel):
     class Meta:
         unique_together = ("user", "product")
         ordering = ["-created"]
+        indexes = [models.Index(fields=["user", "-created", "-id"])]
 
     def __str__(self):
         return f"{self.user.name}'s wishlist item - {self.product.name}"
+
+
+# The default cache is per process, and another process's changes only
+# adjust its own copy; counts are recounted at least this often (seconds)
+WISHLIST_COUNT_TIMEOUT = getattr(settings, "WISHLIST_COUNT_TIMEOUT", 300)
+
+
+def wishlist_count_key(user_id):
+    return f"wishlist:count:{user_id}"
+
+
+def get_wishlist_count(user_id):
+    """
+    Number of wishlist items of a user, cached and adjusted as the wishlist
+    changes, for up to WISHLIST_COUNT_TIMEOUT seconds
+    """
+    key = wishlist_count_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = Wishlist.objects.filter(user_id=user_id).count()
+        cache.set(key, count, timeout=WISHLIST_COUNT_TIMEOUT)
+    return count
+
+
+def adjust_wishlist_count(user_id, delta):
+    try:
+        cache.incr(wishlist_count_key(user_id), delta)
+    except ValueError:
+        pass  # Not cached yet, counted on the next read
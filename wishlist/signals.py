@@ -0,0 +1,16 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Wishlist, adjust_wishlist_count
+
+
+@receiver(post_save, sender=Wishlist)
+def increment_wishlist_count(sender, instance, created=False, **kwargs):
+    if created:
+        transaction.on_commit(lambda: adjust_wishlist_count(instance.user_id, 1))
+
+
+@receiver(post_delete, sender=Wishlist)
+def decrement_wishlist_count(sender, instance, **kwargs):
+    transaction.on_commit(lambda: adjust_wishlist_count(instance.user_id, -1))
@@ -0,0 +1,78 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from categories.models import Category
+from core.models import SiteSettings
+from products.models import Product
+from users.models import User
+from .models import WISHLIST_COUNT_TIMEOUT, Wishlist
+
+
+class WishlistCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        SiteSettings.load()
+        category = Category.objects.create(
+            name="Fruits", slug="fruits", image="categories/fruits.png"
+        )
+        self.products = [
+            Product.objects.create(
+                name=f"Product {i}",
+                description="Description",
+                original_price="10.00",
+                selling_price="8.00",
+                category=category,
+                stock=5,
+                stock_unit=Product.StockUnitChoices.UNIT,
+                sku=f"SKU-{i}",
+                slug=f"product-{i}",
+            )
+            for i in range(3)
+        ]
+        self.user = User.objects.create_user(
+            email="buyer@example.com", password="secret", name="Buyer", phone="9999999999"
+        )
+        self.client.force_login(self.user)
+
+    def toggle(self, product):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse("users:toggle_wishlist"), {"product_id": product.id}
+            )
+
+    def test_count_is_cached_and_kept_up_to_date(self):
+        Wishlist.objects.create(user=self.user, product=self.products[0])
+        self.assertEqual(self.user.wishlist_count, 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.user.wishlist_count, 1)
+
+        self.toggle(self.products[1])
+        self.toggle(self.products[2])
+        self.toggle(self.products[0])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.user.wishlist_count, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Wishlist.objects.filter(user=self.user).delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.user.wishlist_count, 0)
+
+    def test_count_is_recounted_after_the_timeout(self):
+        self.assertEqual(self.user.wishlist_count, 0)
+        # Added in another process, whose cache this one doesn't share
+        with mock.patch("wishlist.signals.adjust_wishlist_count"):
+            Wishlist.objects.create(user=self.user, product=self.products[0])
+        self.assertEqual(self.user.wishlist_count, 0)
+
+        later = time.time() + WISHLIST_COUNT_TIMEOUT + 1
+        with mock.patch("time.time", return_value=later):
+            self.assertEqual(self.user.wishlist_count, 1)
+
+    def test_requests_without_the_badge_skip_the_count(self):
+        # Neither the user nor the wishlist is loaded for a JSON endpoint
+        with self.assertNumQueries(0):
+            self.client.get(reverse("core:search_suggestions"), {"q": ""})